@@ -6,6 +6,9 @@ Usage:
   python3 -m dabarat --workspace <path.dabarat-workspace>
   python3 -m dabarat --add <file.md> [--port PORT]
   python3 -m dabarat --annotate <file.md> --text "..." --comment "..." [--author NAME]
+  python3 -m dabarat --history-prune [--dry-run]
+  python3 -m dabarat --history-recompress
+  python3 -m dabarat --vendor-fetch
   --max-instances N   Limit concurrent server instances (default 5)
 """
 
@@ -656,6 +659,97 @@ def cmd_export_pdf(argv):
         server.shutdown()
 
 
+def _fmt_bytes(n):
+    return f"{n / (1024 * 1024):.1f} MB" if n >= 1024 * 1024 else f"{n / 1024:.1f} KB"
+
+
+def cmd_history_recompress(argv):
+    """Retrain the history blob dictionary and recompress versions.db."""
+    from . import history
+
+    _migrate_config_dir()
+    if not os.path.isfile(history.DB_PATH):
+        print(f"\033[38;2;88;91;112mNo history database at {history.DB_PATH}\033[0m")
+        return
+    if _live_instances():
+        print("\033[38;2;249;226;175m!\033[0m dabarat is running — saves may "
+              "wait on the database until this finishes")
+
+    def progress(done, total):
+        print(f"\r\033[38;2;88;91;112mRecompressing {done}/{total} blobs\033[0m",
+              end="", flush=True)
+
+    report = history.recompress(progress=progress)
+    print()
+    if report["dictionary"]:
+        print(f"\033[38;2;166;227;161m\u2713\033[0m Trained a "
+              f"{_fmt_bytes(report['dictionaryBytes'])} dictionary "
+              f"({report['dictionary']})")
+    else:
+        print("\033[38;2;88;91;112mToo few notes to train a dictionary; "
+              "kept the existing codecs\033[0m")
+    print(f"\033[38;2;166;227;161m\u2713\033[0m Rewrote {report['rewritten']} of "
+          f"{report['blobs']} blobs ({_fmt_bytes(report['bytesSaved'])} smaller)")
+    print(f"\033[38;2;137;180;250m{history.DB_PATH}: {_fmt_bytes(report['dbBefore'])} "
+          f"\u2192 {_fmt_bytes(report['dbAfter'])}\033[0m")
+
+
+def cmd_history_prune(argv):
+    """Apply (or with --dry-run, report) the history retention policy."""
+    from . import history
+    from .server import _read_config
+
+    _migrate_config_dir()
+    if not os.path.isfile(history.DB_PATH):
+        print(f"\033[38;2;88;91;112mNo history database at {history.DB_PATH}\033[0m")
+        return
+    dry_run = "--dry-run" in argv
+    policy = history.retention_policy(_read_config().get("historyRetention"))
+    if not policy["enabled"] and not dry_run:
+        print("\033[38;2;88;91;112mRetention is disabled in config.json "
+              "(historyRetention.enabled)\033[0m")
+        return
+    report = history.prune(policy, dry_run=dry_run)
+    verb = "Would drop" if dry_run else "Dropped"
+    print(f"\033[38;2;137;180;250mPolicy: keep all for {policy['keepAllHours']}h, "
+          f"hourly for {policy['hourlyDays']} days, daily after; thins "
+          f"{', '.join(policy['sources'])} versions (pinned and labelled are kept)\033[0m")
+    print(f"\033[38;2;166;227;161m\u2713\033[0m {verb} {report['versions']} versions "
+          f"across {report['files']} files, {report['blobs']} blobs "
+          f"({report['bytes'] / 1024:.1f} KB{' est.' if dry_run else ''})")
+    for entry in report["top"][:10]:
+        print(f"  \033[38;2;88;91;112m{entry['versions']:>6}  {entry['path']}\033[0m")
+
+
+def cmd_vendor_fetch(argv):
+    """Mirror the page's CDN dependencies for offline use (vendor.py)."""
+    from . import template
+    from . import vendor
+
+    _migrate_config_dir()
+
+    def progress(url):
+        print(f"\r\033[2K\033[38;2;88;91;112mFetching {url[:100]}\033[0m",
+              end="", flush=True)
+
+    report = vendor.fetch(template.cdn_shell(), progress=progress)
+    print("\r\033[2K", end="")
+    for url, error in report["failed"]:
+        print(f"\033[38;2;249;226;175m!\033[0m {url[:100]}: {error}")
+    if not report["build"]:
+        print("\033[38;2;243;139;168m\u2717\033[0m Nothing could be fetched — "
+              "the page keeps loading from the CDNs")
+        sys.exit(1)
+    print(f"\033[38;2;166;227;161m\u2713\033[0m Vendored {report['assets']} "
+          f"assets ({report['files']} files, "
+          f"{report['bytes'] / (1024 * 1024):.1f} MB) into {vendor.VENDOR_DIR}")
+    if report["failed"]:
+        print("\033[38;2;88;91;112mUnfetched files keep their CDN URLs\033[0m")
+    print("\033[38;2;88;91;112mNew windows load them from the dabarat "
+          "server; copy the directory (or set DABARAT_VENDOR_DIR) for "
+          "offline machines\033[0m")
+
+
 def cmd_serve(argv):
     """Start the preview server with one or more files."""
     import subprocess
@@ -839,6 +933,18 @@ def main():
         cmd_export_pdf(sys.argv)
         sys.exit(0)
 
+    if "--history-prune" in sys.argv:
+        cmd_history_prune(sys.argv)
+        sys.exit(0)
+
+    if "--history-recompress" in sys.argv:
+        cmd_history_recompress(sys.argv)
+        sys.exit(0)
+
+    if "--vendor-fetch" in sys.argv:
+        cmd_vendor_fetch(sys.argv)
+        sys.exit(0)
+
     if len(sys.argv) < 2:
         print("Usage:")
         print("  dabarat <file.md> [file2.md ...] [--port PORT] [--author NAME]")
@@ -846,6 +952,9 @@ def main():
         print("  dabarat --add <file.md> [--port PORT]")
         print("  dabarat --export-pdf <file.md> [-o output.pdf] [--theme mocha]")
         print('  dabarat --annotate <file.md> --text "..." --comment "..." [--author NAME]')
+        print("  dabarat --history-prune [--dry-run]")
+        print("  dabarat --history-recompress")
+        print("  dabarat --vendor-fetch")
         print(f"  --max-instances N  (default {MAX_INSTANCES})")
         sys.exit(1)
 
@@ -0,0 +1,133 @@
+"""Copy/insert byte deltas for the version history store (stdlib only).
+
+A delta rebuilds `target` from `base` with two ops: COPY a byte range of
+the base, or INSERT literal bytes. Copies are found at line granularity
+— markdown edits touch a few lines of a long file, so matching whole
+lines finds nearly every reusable run at hash-lookup cost — but are
+addressed by byte offset, so any bytes round-trip exactly.
+
+Wire format: MAGIC, then the zlib-compressed sequence of ops,
+    b"C" varint(offset) varint(length)
+    b"I" varint(length) <length bytes>
+MAGIC is not a valid zlib header, so a build that predates deltas and
+reads every blob with zlib.decompress fails on a delta instead of
+returning its op bytes as the version's text.
+"""
+
+import bisect
+import zlib
+
+MAGIC = b"DLT\x01"
+_COPY, _INSERT = ord("C"), ord("I")
+# A copy op costs a few bytes; a match shorter than this is cheaper (and
+# compresses better) as part of the surrounding literal run
+MIN_COPY_BYTES = 24
+
+
+def _varint(n):
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _read_varint(data, pos):
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return n, pos
+        shift += 7
+
+
+def encode(base, target):
+    """Return the delta (MAGIC + zlib-compressed ops) that turns `base`
+    into `target`."""
+    blines = base.splitlines(keepends=True)
+    tlines = target.splitlines(keepends=True)
+    offsets = [0]
+    for line in blines:
+        offsets.append(offsets[-1] + len(line))
+    where = {}
+    for i, line in enumerate(blines):
+        where.setdefault(line, []).append(i)
+
+    ops = bytearray()
+    literal = []
+    copy_start = copy_len = 0
+
+    def flush_literal():
+        if literal:
+            data = b"".join(literal)
+            ops.extend(b"I" + _varint(len(data)) + data)
+            literal.clear()
+
+    def flush_copy():
+        nonlocal copy_len
+        if copy_len:
+            flush_literal()
+            ops.extend(b"C" + _varint(copy_start) + _varint(copy_len))
+            copy_len = 0
+
+    expect = 0  # base line following the last copied run
+    j = 0
+    while j < len(tlines):
+        positions = where.get(tlines[j])
+        if not positions:
+            flush_copy()
+            literal.append(tlines[j])
+            j += 1
+            continue
+        # Prefer continuing in place (the common case), else the nearest
+        # occurrence at or after it — keeps copies mostly sequential
+        k = bisect.bisect_left(positions, expect)
+        i = positions[k] if k < len(positions) else positions[0]
+        run = 1
+        while (j + run < len(tlines) and i + run < len(blines)
+               and tlines[j + run] == blines[i + run]):
+            run += 1
+        start, length = offsets[i], offsets[i + run] - offsets[i]
+        if length < MIN_COPY_BYTES:
+            flush_copy()
+            literal.extend(tlines[j:j + run])
+        elif copy_len and copy_start + copy_len == start:
+            copy_len += length
+        else:
+            flush_copy()
+            flush_literal()
+            copy_start, copy_len = start, length
+        expect = i + run
+        j += run
+    flush_copy()
+    flush_literal()
+    return MAGIC + zlib.compress(bytes(ops), 6)
+
+
+def apply(base, delta):
+    """Rebuild the target bytes from `base` and an encode() result."""
+    if not delta.startswith(MAGIC):
+        raise ValueError("corrupt delta: missing header")
+    data = zlib.decompress(delta[len(MAGIC):])
+    out = []
+    pos = 0
+    while pos < len(data):
+        op = data[pos]
+        pos += 1
+        if op == _COPY:
+            start, pos = _read_varint(data, pos)
+            length, pos = _read_varint(data, pos)
+            out.append(base[start:start + length])
+        elif op == _INSERT:
+            length, pos = _read_varint(data, pos)
+            out.append(data[pos:pos + length])
+            pos += length
+        else:
+            raise ValueError(f"corrupt delta: unknown op {op:#x} at {pos - 1}")
+    return b"".join(out)
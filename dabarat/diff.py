@@ -1,10 +1,44 @@
-"""Side-by-side diff computation for markdown files (stdlib only)."""
+"""Side-by-side diff computation for markdown files (stdlib only).
 
-import difflib
+Lines are aligned by linediff (patience anchors + Myers), so comparing
+two 20k-line transcripts costs milliseconds. The payload is run-length:
+long unchanged runs collapse into "skip" hunks carrying only a count,
+which the client fetches on demand (expand_lines), so the response size
+follows the size of the change rather than the size of the files.
+
+Results are cached by the SHA-256 of both contents (cached_diff) — the
+digest history already stores blobs under — so flipping between versions
+in the history panel re-diffs nothing and re-reads no blob. Large
+results are served paged (page): an index of render windows first, then
+each window's hunks as the viewer scrolls to it.
+"""
+
+import collections
+import hashlib
 import re
+import threading
+
+from . import linediff
 
 # Reuse frontmatter extraction regex from frontmatter module
 _FM_RE = re.compile(r'\A\ufeff?---[ \t]*\r?\n(.*?\r?\n)---[ \t]*\r?\n', re.DOTALL)
+_FENCE_RE = re.compile(r'[ \t]{0,3}(```|~~~)')
+
+_TOKEN_RE = re.compile(r'\w+|\s+|[^\w\s]')
+
+CONTEXT_LINES = 3   # unchanged lines kept visible around each change
+MIN_SKIP_LINES = 8  # shorter unchanged runs are sent in full
+PAGE_ROWS = 400     # side-by-side rows per render window
+INLINE_BYTES = 256 * 1024  # larger diffs are sent as a window index
+MAX_SPAN_LINE = 2000    # longer changed lines are marked whole, not by word
+MIN_SHARED_RATIO = 0.3  # below this token overlap a pair is a rewrite
+_SPAN_CACHE_MAX = 4096  # line pairs
+_span_cache = collections.OrderedDict()  # (left digest, right digest) → spans
+_span_lock = threading.Lock()
+DIFF_CACHE_BYTES = 32 * 1024 * 1024
+_diff_cache = collections.OrderedDict()  # (left sha256, right sha256) → (result, size)
+_diff_cache_size = 0
+_diff_lock = threading.Lock()
 
 
 def _strip_frontmatter(content):
@@ -18,76 +52,222 @@ def _strip_frontmatter(content):
     return m.group(1), content[m.end():]
 
 
-def compute_side_by_side(left_lines, right_lines):
-    """Compute paired side-by-side diff arrays.
+def _cut_points(lines):
+    """cuts[p] is True where a collapse may start or end before line p.
+
+    Each side of a skip renders as separate markdown, so a cut must fall
+    after a blank line and outside a code fence — otherwise the block it
+    splits would render as two broken halves.
+    """
+    cuts = [True] * (len(lines) + 1)
+    in_fence = False
+    for p, line in enumerate(lines, 1):
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+        cuts[p] = p == len(lines) or (not in_fence and not line.strip())
+    return cuts
+
+
+def _equal_hunks(left_lines, cuts, i1, i2, j1):
+    """Hunks for an unchanged run left[i1:i2] (right starts at j1)."""
+    head = i1
+    if i1 > 0:  # keep context after the preceding change
+        head = min(i1 + CONTEXT_LINES, i2)
+        while head < i2 and not cuts[head]:
+            head += 1
+    tail = i2
+    if i2 < len(left_lines):  # keep context before the next change
+        tail = max(i2 - CONTEXT_LINES, head)
+        while tail > head and not cuts[tail]:
+            tail -= 1
+    if tail - head < MIN_SKIP_LINES:
+        return [{'op': 'equal', 'lines': left_lines[i1:i2]}]
+    hunks = []
+    if head > i1:
+        hunks.append({'op': 'equal', 'lines': left_lines[i1:head]})
+    hunks.append({'op': 'skip', 'count': tail - head,
+                  'left': head, 'right': j1 + (head - i1)})
+    if i2 > tail:
+        hunks.append({'op': 'equal', 'lines': left_lines[tail:i2]})
+    return hunks
+
+
+def _line_digest(line):
+    return hashlib.blake2b(line.encode('utf-8', 'surrogatepass'),
+                           digest_size=16).digest()
+
+
+def _word_spans(left, right):
+    """Changed character ranges of a paired line, as flat offset arrays.
+
+    Lines are diffed as word/space/punctuation tokens; a run replaced by
+    as many tokens is narrowed, token by token, to the characters that
+    differ. Returns
+    ([s0, e0, s1, e1, ...], [...]) for left and right, or ([], []) when
+    the pair is a wholesale rewrite (the block highlight already says it).
+    """
+    if len(left) > MAX_SPAN_LINE or len(right) > MAX_SPAN_LINE:
+        return [], []
+    a, b = _TOKEN_RE.findall(left), _TOKEN_RE.findall(right)
+    a_at, b_at = [0], [0]
+    for tok in a:
+        a_at.append(a_at[-1] + len(tok))
+    for tok in b:
+        b_at.append(b_at[-1] + len(tok))
+    ops = linediff.opcodes(a, b)
+    shared = sum(i2 - i1 for tag, i1, i2, _, _ in ops
+                 if tag == 'equal' and not a[i1].isspace())
+    words = max(sum(1 for t in a if not t.isspace()),
+                sum(1 for t in b if not t.isspace()), 1)
+    if shared / words < MIN_SHARED_RATIO:
+        return [], []
+    left_spans, right_spans = [], []
+
+    def mark(ls, le, rs, re_):
+        if le > ls:
+            left_spans.extend((ls, le))
+        if re_ > rs:
+            right_spans.extend((rs, re_))
+
+    for tag, i1, i2, j1, j2 in ops:
+        if tag == 'equal':
+            continue
+        if i2 - i1 != j2 - j1:
+            mark(a_at[i1], a_at[i2], b_at[j1], b_at[j2])
+            continue
+        # Token for token: narrow each to the characters that differ
+        for k in range(i2 - i1):
+            ls, le = a_at[i1 + k], a_at[i1 + k + 1]
+            rs, re_ = b_at[j1 + k], b_at[j1 + k + 1]
+            while ls < le and rs < re_ and left[ls] == right[rs]:
+                ls += 1
+                rs += 1
+            while le > ls and re_ > rs and left[le - 1] == right[re_ - 1]:
+                le -= 1
+                re_ -= 1
+            mark(ls, le, rs, re_)
+    return left_spans, right_spans
+
+
+def word_spans(left, right):
+    """_word_spans, cached per (left hash, right hash) — the same edited
+    pair recurs across every version of a file that carries it."""
+    key = (_line_digest(left), _line_digest(right))
+    with _span_lock:
+        spans = _span_cache.get(key)
+        if spans is not None:
+            _span_cache.move_to_end(key)
+            return spans
+    spans = _word_spans(left, right)
+    with _span_lock:
+        _span_cache[key] = spans
+        while len(_span_cache) > _SPAN_CACHE_MAX:
+            _span_cache.popitem(last=False)
+    return spans
+
+
+def compute_hunks(left_lines, right_lines):
+    """Compute a run-length side-by-side diff.
 
     Returns dict with:
-      left  — list of {line: str, type: 'equal'|'delete'|'change'|'empty'}
-      right — list of {line: str, type: 'equal'|'insert'|'change'|'empty'}
+      hunks — list of
+        {op: 'equal', lines: [str]}                 shown on both sides
+        {op: 'change', left: [str], right: [str],   a side may be empty
+         spans: {left: [[int]], right: [[int]]}}    see below
+        {op: 'skip', count: int, left: int, right: int}
+                                                    collapsed unchanged run
+                                                    starting at those lines
+      windows — [{from, to, rows}] render windows over hunks (_windows)
+      lines — {left: int, right: int} body line totals
       stats — {added: int, removed: int, changed: int}
 
-    Paired by index: left[i] corresponds to right[i].
-    'empty' entries are padding to keep sides aligned.
+    The client pairs a change's lines by index ('change'), padding the
+    shorter side ('delete'/'insert' against 'empty'), and counts stats
+    the same way. `spans` holds, per paired line, word_spans offsets into
+    that line; the client paints them instead of diffing words itself.
     """
-    sm = difflib.SequenceMatcher(None, left_lines, right_lines, autojunk=False)
-    left_out = []
-    right_out = []
+    cuts = _cut_points(left_lines)
+    hunks = []
     added = removed = changed = 0
-
-    for tag, i1, i2, j1, j2 in sm.get_opcodes():
+    for tag, i1, i2, j1, j2 in linediff.opcodes(left_lines, right_lines):
         if tag == 'equal':
-            for k in range(i2 - i1):
-                left_out.append({'line': left_lines[i1 + k], 'type': 'equal'})
-                right_out.append({'line': right_lines[j1 + k], 'type': 'equal'})
-
-        elif tag == 'delete':
-            for k in range(i2 - i1):
-                left_out.append({'line': left_lines[i1 + k], 'type': 'delete'})
-                right_out.append({'line': '', 'type': 'empty'})
-            removed += i2 - i1
-
-        elif tag == 'insert':
-            for k in range(j2 - j1):
-                left_out.append({'line': '', 'type': 'empty'})
-                right_out.append({'line': right_lines[j1 + k], 'type': 'insert'})
-            added += j2 - j1
-
-        elif tag == 'replace':
-            left_count = i2 - i1
-            right_count = j2 - j1
-            pairs = min(left_count, right_count)
-
-            # Paired changed lines
-            for k in range(pairs):
-                left_out.append({'line': left_lines[i1 + k], 'type': 'change'})
-                right_out.append({'line': right_lines[j1 + k], 'type': 'change'})
-
-            # Leftover on left side (deletions)
-            for k in range(pairs, left_count):
-                left_out.append({'line': left_lines[i1 + k], 'type': 'delete'})
-                right_out.append({'line': '', 'type': 'empty'})
-
-            # Leftover on right side (insertions)
-            for k in range(pairs, right_count):
-                left_out.append({'line': '', 'type': 'empty'})
-                right_out.append({'line': right_lines[j1 + k], 'type': 'insert'})
-
-            changed += pairs
-            removed += max(0, left_count - pairs)
-            added += max(0, right_count - pairs)
-
+            hunks.extend(_equal_hunks(left_lines, cuts, i1, i2, j1))
+            continue
+        hunk = {'op': 'change', 'left': left_lines[i1:i2],
+                'right': right_lines[j1:j2]}
+        pairs = min(i2 - i1, j2 - j1)
+        if pairs:
+            spans = [word_spans(left_lines[i1 + k], right_lines[j1 + k])
+                     for k in range(pairs)]
+            hunk['spans'] = {'left': [l for l, _ in spans],
+                             'right': [r for _, r in spans]}
+        hunks.append(hunk)
+        changed += pairs
+        removed += (i2 - i1) - pairs
+        added += (j2 - j1) - pairs
     return {
-        'left': left_out,
-        'right': right_out,
+        'hunks': hunks,
+        'windows': _windows(hunks, cuts),
+        'lines': {'left': len(left_lines), 'right': len(right_lines)},
         'stats': {'added': added, 'removed': removed, 'changed': changed},
     }
 
 
+def _windows(hunks, cuts):
+    """Group hunks into render windows of about PAGE_ROWS side-by-side rows.
+
+    A window ends only where its markdown is self-contained: after a skip,
+    or after an unchanged hunk that ends at a cut point. Returns
+    [{from, to, rows}] (hunk index range, rows as displayed).
+    """
+    windows = []
+    start = rows = pos = 0  # pos: left line after the current hunk
+    for i, hunk in enumerate(hunks):
+        op = hunk['op']
+        if op == 'skip':
+            pos += hunk['count']
+            rows += 1  # the expander
+            breakable = True
+        elif op == 'equal':
+            pos += len(hunk['lines'])
+            rows += len(hunk['lines'])
+            breakable = cuts[pos]
+        else:
+            pos += len(hunk['left'])
+            rows += max(len(hunk['left']), len(hunk['right']))
+            breakable = False
+        if rows >= PAGE_ROWS and breakable:
+            windows.append({'from': start, 'to': i + 1, 'rows': rows})
+            start, rows = i + 1, 0
+    if start < len(hunks):
+        windows.append({'from': start, 'to': len(hunks), 'rows': rows})
+    return windows
+
+
+def page(result, start=None, end=None):
+    """A prepare_diff result shaped for a paged client.
+
+    With a range, returns {"hunks": hunks[start:end], "from": start} —
+    one window's slice. Without one, returns the result itself when its
+    hunks fit in INLINE_BYTES, else a copy whose body carries only the
+    window index, line totals and stats (the client fetches windows as
+    they scroll into view).
+    """
+    body = result['body']
+    if start is not None:
+        return {'hunks': body['hunks'][start:end], 'from': start}
+    if _result_size(result) <= INLINE_BYTES:
+        return result
+    paged = dict(result)
+    paged['body'] = {k: v for k, v in body.items() if k != 'hunks'}
+    return paged
+
+
 def prepare_diff(left_content, right_content):
     """Prepare a frontmatter-aware side-by-side diff.
 
     Returns dict with:
-      body       — compute_side_by_side result for markdown bodies
+      body       — compute_hunks result for markdown bodies
       fm_left    — raw frontmatter text (or '')
       fm_right   — raw frontmatter text (or '')
       fm_changed — bool
@@ -98,7 +278,7 @@ def prepare_diff(left_content, right_content):
     left_lines = body_left.splitlines(keepends=True)
     right_lines = body_right.splitlines(keepends=True)
 
-    body_diff = compute_side_by_side(left_lines, right_lines)
+    body_diff = compute_hunks(left_lines, right_lines)
 
     return {
         'body': body_diff,
@@ -106,3 +286,64 @@ def prepare_diff(left_content, right_content):
         'fm_right': fm_right,
         'fm_changed': fm_left != fm_right,
     }
+
+
+def content_hash(content):
+    """SHA-256 hex of text — the digest history blobs are stored under."""
+    return hashlib.sha256(content.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def _result_size(result):
+    """Rough in-memory footprint of a prepare_diff result, in bytes."""
+    size = len(result['fm_left']) + len(result['fm_right']) + 256
+    for hunk in result['body']['hunks']:
+        size += 128
+        for key in ('lines', 'left', 'right'):
+            lines = hunk.get(key)
+            if isinstance(lines, list):  # a skip's left/right are line numbers
+                size += sum(len(line) + 56 for line in lines)
+    return size
+
+
+def cached_diff(left_hash, right_hash, load):
+    """prepare_diff for two contents known by hash, through an LRU cache.
+
+    `load()` returns (left_content, right_content) and is only called on
+    a miss, so a cached comparison never reads either side. Returns a
+    shallow copy the caller may add keys to.
+    """
+    global _diff_cache_size
+    key = (left_hash, right_hash)
+    with _diff_lock:
+        hit = _diff_cache.get(key)
+        if hit is not None:
+            _diff_cache.move_to_end(key)
+            return dict(hit[0])
+    result = prepare_diff(*load())
+    size = _result_size(result)
+    if size <= DIFF_CACHE_BYTES // 4:  # one giant diff must not flush the rest
+        with _diff_lock:
+            old = _diff_cache.pop(key, None)
+            if old is not None:
+                _diff_cache_size -= old[1]
+            _diff_cache[key] = (result, size)
+            _diff_cache_size += size
+            while _diff_cache_size > DIFF_CACHE_BYTES:
+                _, (_, dropped) = _diff_cache.popitem(last=False)
+                _diff_cache_size -= dropped
+    return dict(result)
+
+
+def parse_range(spec):
+    """Parse an expand spec "start:count" → (start, count); ValueError if bad."""
+    start, _, count = spec.partition(':')
+    start, count = int(start), int(count)
+    if start < 0 or count < 0:
+        raise ValueError(f"bad range: {spec}")
+    return start, count
+
+
+def expand_lines(left_content, start, count):
+    """Body lines [start, start+count) of the left side — a skip's text."""
+    _, body = _strip_frontmatter(left_content)
+    return body.splitlines(keepends=True)[start:start + count]
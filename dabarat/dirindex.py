@@ -0,0 +1,298 @@
+"""Persistent per-directory metadata index for the home-screen browser.
+
+Every browsed directory gets ~/.dabarat/dirindex/<sha256(dir)[:16]>.json
+mapping each markdown file to the card metadata extracted from it, keyed
+by (st_mtime_ns, size) of the file and of its annotation sidecar. A
+browse still stats every child (one os.scandir pass — the only way to
+notice an edit), but only files whose key moved are re-read; a 2,000-note
+folder with one edited note re-extracts one note.
+
+Version counts are not indexed — they live in versions.db and change
+without the file changing (snapshots of other paths, renames) — so the
+caller adds them per browse.
+
+Cache misses are read on a small shared thread pool (parallel_map), so a
+cold load of a network-mounted or spinning-disk folder costs roughly the
+slowest file rather than the sum of them.
+"""
+
+import concurrent.futures
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from . import annotations
+from . import frontmatter
+from . import recent
+
+INDEX_DIR = os.path.expanduser("~/.dabarat/dirindex")
+INDEX_VERSION = 1
+MD_EXTS = {".md", ".markdown", ".txt", ".mdown", ".mkd"}
+MAX_EXTRACT_BYTES = 1024 * 1024  # file-reading extractions gated at 1 MB
+_MEM_MAX = 20  # directories kept parsed in memory
+# Extraction is I/O-bound (file + sidecar reads, SQLite lookups), so the
+# pool is sized for overlapping waits, not for cores; one pool is shared
+# by every request so concurrent browses cannot multiply it
+MAX_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+
+_mem = {}  # dir_path → index dict, insertion-ordered for eviction
+_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _atomic_write(filepath, data):
+    """Write JSON atomically via temp file + os.replace()."""
+    json_str = json.dumps(data, separators=(",", ":"))
+    dir_name = os.path.dirname(filepath)
+    os.makedirs(dir_name, mode=0o700, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dir_name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json_str)
+        os.replace(tmp, filepath)
+    except Exception:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _index_path(dir_path):
+    digest = hashlib.sha256(dir_path.encode("utf-8", "surrogateescape")).hexdigest()
+    return os.path.join(INDEX_DIR, f"{digest[:16]}.json")
+
+
+def _empty(dir_path):
+    return {"version": INDEX_VERSION, "path": dir_path, "files": {}, "dirs": {}}
+
+
+def _load(dir_path):
+    """Return the index for a directory (memory first, then disk)."""
+    with _lock:
+        index = _mem.get(dir_path)
+    if index is not None:
+        return index
+    try:
+        with open(_index_path(dir_path), encoding="utf-8") as f:
+            index = json.load(f)
+        # The path check guards against a (vanishingly unlikely) digest
+        # collision; the version check retires indexes of older layouts
+        if (not isinstance(index, dict) or index.get("path") != dir_path
+                or index.get("version") != INDEX_VERSION):
+            index = _empty(dir_path)
+    except (OSError, ValueError):
+        index = _empty(dir_path)
+    _remember(dir_path, index)
+    return index
+
+
+def _remember(dir_path, index):
+    with _lock:
+        _mem.pop(dir_path, None)
+        _mem[dir_path] = index
+        while len(_mem) > _MEM_MAX:
+            del _mem[next(iter(_mem))]
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=MAX_WORKERS, thread_name_prefix="dabarat-extract")
+        return _pool
+
+
+def parallel_map(fn, items):
+    """Return [fn(item) for item in items], run on the shared I/O pool.
+
+    Results come back in input order whatever order the reads finish in.
+    fn must not itself call parallel_map (the bounded pool could starve).
+    """
+    items = list(items)
+    if len(items) < 2:
+        return [fn(item) for item in items]
+    return list(_get_pool().map(fn, items))
+
+
+def parallel_iter(fn, items):
+    """Like parallel_map, but yield (position, result) as each finishes."""
+    items = list(items)
+    if len(items) < 2:
+        for i, item in enumerate(items):
+            yield i, fn(item)
+        return
+    pool = _get_pool()
+    futures = {pool.submit(fn, item): i for i, item in enumerate(items)}
+    try:
+        for fut in concurrent.futures.as_completed(futures):
+            yield futures[fut], fut.result()
+    finally:
+        for fut in futures:
+            fut.cancel()  # consumer gave up (client disconnected)
+
+
+def extract(full, size):
+    """Card metadata for one markdown file — everything except versions.
+
+    Small files go through recent.extract_metadata (one read for every
+    text field); oversized ones only get their frontmatter badges.
+    """
+    meta = {}
+    try:
+        ann_data, _ = annotations.read(full)
+        tags = ann_data.get("tags", [])
+        if tags:
+            meta["tags"] = tags
+        ac = len(ann_data.get("annotations", []))
+        if ac:
+            meta["annotationCount"] = ac
+    except Exception:
+        pass
+    if size < MAX_EXTRACT_BYTES:
+        fields = recent.extract_metadata(full)
+        for field in ("badges", "wordCount", "summary", "preview", "previewImage"):
+            if fields[field]:
+                meta[field] = fields[field]
+    else:
+        try:
+            fm, _ = frontmatter.get_frontmatter(full)
+            badges = {k: str(fm[k]) for k in recent.BADGE_KEYS if k in fm}
+            if badges:
+                meta["badges"] = badges
+        except Exception:
+            pass
+    return meta
+
+
+def _subdir_md_count(full):
+    md_count = 0
+    try:
+        for sub in os.listdir(full):
+            if not sub.startswith("."):
+                _, se = os.path.splitext(sub)
+                if se.lower() in MD_EXTS:
+                    md_count += 1
+                if md_count >= 99:
+                    break
+    except Exception:
+        pass
+    return md_count
+
+
+def scan(dir_path):
+    """List a directory for the home browser using the persistent index.
+
+    Returns (signature, entries, stats). `signature` changes whenever any
+    indexed key does, so callers can cache the assembled response on it.
+    Entries are name-sorted (case-insensitive) dirs and markdown files;
+    file entries carry the indexed metadata. Raises PermissionError if the
+    directory itself cannot be listed.
+    """
+    steps = scan_iter(dir_path)
+    _, entries = next(steps)
+    for step in steps:
+        if step[0] == "done":
+            return step[1], entries, step[2]
+    raise AssertionError("scan_iter ended without a done step")
+
+
+def scan_iter(dir_path):
+    """scan() in steps, for progressive rendering.
+
+    Yields ("entries", entries) first — the full sorted listing, with
+    indexed metadata already merged for every index hit — then
+    ("meta", path, meta) for each index miss as its read completes (file
+    card fields, or {"mdCount": n} for a directory), and finally
+    ("done", signature, stats). Each miss's meta is also merged into its
+    entry, so after "done" `entries` matches what scan() returns.
+    PermissionError is raised by the first next(), before anything is
+    yielded.
+    """
+    index = _load(dir_path)
+    old_files, old_dirs = index["files"], index["dirs"]
+    with os.scandir(dir_path) as it:
+        children = [e for e in it if not e.name.startswith(".")]
+    stats = {}
+    for e in children:
+        try:
+            stats[e.name] = e.stat()
+        except OSError:
+            pass
+
+    files, dirs = {}, {}
+    entries = []
+    stale = []  # (entry, stat, key) of index misses
+    for e in sorted(children, key=lambda e: e.name.lower()):
+        name = e.name
+        st = stats.get(name)
+        full = os.path.join(dir_path, name)
+        try:
+            is_dir = e.is_dir()
+        except OSError:
+            is_dir = False
+        if is_dir:
+            # A subdirectory's mtime moves when entries are added/removed,
+            # which is all its markdown count depends on
+            key = [st.st_mtime_ns] if st else [0]
+            entry = {"name": name, "type": "dir", "path": full, "mdCount": 0}
+            cached = old_dirs.get(name)
+            if cached and cached["key"] == key:
+                entry["mdCount"] = cached["mdCount"]
+                dirs[name] = cached
+            else:
+                stale.append((entry, st, key))
+            entries.append(entry)
+            continue
+        _, ext = os.path.splitext(name)
+        if ext.lower() not in MD_EXTS:
+            continue
+        side = stats.get(os.path.basename(annotations.get_path(name)))
+        key = [st.st_mtime_ns if st else 0, st.st_size if st else 0,
+               side.st_mtime_ns if side else 0, side.st_size if side else 0]
+        entry = {"name": name, "type": "file", "path": full}
+        if st:
+            entry["size"] = st.st_size
+            entry["mtime"] = st.st_mtime
+        cached = old_files.get(name)
+        if cached and cached["key"] == key:
+            entry.update(cached["meta"])
+            files[name] = cached
+        else:
+            stale.append((entry, st, key))
+        entries.append(entry)
+    yield "entries", entries
+
+    def read(job):
+        entry, st, _ = job
+        if entry["type"] == "dir":
+            return {"mdCount": _subdir_md_count(entry["path"])}
+        return extract(entry["path"], st.st_size if st else 0)
+
+    for i, meta in parallel_iter(read, stale):
+        entry, _, key = stale[i]
+        entry.update(meta)
+        if entry["type"] == "dir":
+            dirs[entry["name"]] = {"key": key, "mdCount": meta["mdCount"]}
+        else:
+            files[entry["name"]] = {"key": key, "meta": meta}
+        yield "meta", entry["path"], meta
+
+    if stale or files.keys() != old_files.keys() or dirs.keys() != old_dirs.keys():
+        index = {"version": INDEX_VERSION, "path": dir_path,
+                 "files": files, "dirs": dirs}
+        _remember(dir_path, index)
+        try:
+            _atomic_write(_index_path(dir_path), index)
+        except OSError:
+            pass  # the index is a cache — a read-only home just re-extracts
+    signature = hashlib.sha256(json.dumps(
+        [files[n]["key"] for n in sorted(files)]
+        + [dirs[n]["key"] for n in sorted(dirs)]
+        + sorted(files) + sorted(dirs)).encode()).hexdigest()
+    total_words = sum(f["meta"].get("wordCount", 0) for f in files.values())
+    yield "done", signature, {"fileCount": len(files), "totalWords": total_words}
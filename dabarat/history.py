@@ -1,14 +1,20 @@
 """SQLite-backed version history for markdown files (stdlib only).
 
 Every save is a revertible version. Storage is a single database at
-~/.dabarat/versions.db: content-addressed zlib blobs plus a versions table
+~/.dabarat/versions.db: content-addressed blobs (zlib keyframes, or
+deltas against the file's previous blob — see delta.py) plus a versions table
 carrying per-file identity (rename-surviving via aliases), timestamps,
 diff stats, labels, pins, and a source tag (save/restore/external/import).
 
-Append-only: restores add versions, nothing is destroyed. No coalescing —
+Restores add versions rather than rewriting any. Saves never coalesce —
 an explicit save is a user-declared checkpoint; identical consecutive
-content dedups by hash instead. No automatic pruning (measured-first
-policy; pin/label columns exist so future pruning can respect them).
+content dedups by hash instead. Externally-detected changes are queued
+to a background writer (snapshot_external), which keeps only the latest
+pending content per file; commit() flushes a file's queued snapshot
+before recording, so the timeline keeps disk order. The only deletion is retention (prune):
+tiered thinning of the sources the policy names (by default only
+`external` snapshots), never touching pinned or labelled versions or a
+file's newest version.
 
 The pre-SQLite shadow git repo at ~/.dabarat/history/ is imported once on
 first database creation (for every path recoverable from recents and
@@ -18,18 +24,25 @@ Version refs are decimal ids serialized as strings; the API keeps the
 historical field name "hash" so clients treat refs as opaque.
 """
 
+import atexit
+import base64
+import collections
 import datetime
-import difflib
 import hashlib
 import json
 import os
+import re
 import sqlite3
 import subprocess
 import sys
+import threading
 import time
 import zlib
 from contextlib import contextmanager
 
+from . import delta
+from . import linediff
+
 DB_PATH = os.path.expanduser("~/.dabarat/versions.db")
 HISTORY_DIR = os.path.expanduser("~/.dabarat/history")  # legacy git archive
 MAX_VERSION_BYTES = 10 * 1024 * 1024  # files beyond this are saved, not versioned
@@ -42,7 +55,9 @@ CREATE TABLE IF NOT EXISTS meta (
 CREATE TABLE IF NOT EXISTS files (
     id INTEGER PRIMARY KEY,
     current_path TEXT UNIQUE NOT NULL,
-    created_at_us INTEGER NOT NULL
+    created_at_us INTEGER NOT NULL,
+    version_count INTEGER NOT NULL DEFAULT 0,
+    head_version_id INTEGER
 );
 CREATE TABLE IF NOT EXISTS file_aliases (
     file_id INTEGER NOT NULL REFERENCES files(id),
@@ -54,7 +69,9 @@ CREATE TABLE IF NOT EXISTS blobs (
     hash BLOB PRIMARY KEY,
     codec TEXT NOT NULL DEFAULT 'zlib',
     raw_size INTEGER NOT NULL,
-    compressed_content BLOB NOT NULL
+    compressed_content BLOB NOT NULL,
+    base_hash BLOB REFERENCES blobs(hash),
+    depth INTEGER NOT NULL DEFAULT 0
 );
 CREATE TABLE IF NOT EXISTS versions (
     id INTEGER PRIMARY KEY,
@@ -74,19 +91,23 @@ CREATE INDEX IF NOT EXISTS idx_versions_file_time
 CREATE INDEX IF NOT EXISTS idx_versions_time
     ON versions(created_at_us DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_versions_hash ON versions(blob_hash);
+CREATE INDEX IF NOT EXISTS idx_blobs_base ON blobs(base_hash);
 """
 
 
-@contextmanager
-def _db():
-    """Yield a configured connection; commit open work, always close.
+_POOL_MAX = 8  # idle connections kept (matches the card-extraction pool)
+_pool = []      # idle sqlite3 connections for _pool_key
+_pool_key = None  # (DB_PATH, st_dev, st_ino) the idle connections belong to
+_pool_lock = threading.Lock()
 
-    Autocommit mode (isolation_level=None) — write paths take explicit
-    BEGIN IMMEDIATE so the write lock is acquired up front rather than on
-    first DML, and reads never open transactions at all.
-    """
+
+def _connect():
+    """Open and configure a new connection to DB_PATH."""
     os.makedirs(os.path.dirname(DB_PATH), mode=0o700, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH, timeout=5.0, isolation_level=None)
+    # check_same_thread=False: a pooled connection is handed to whichever
+    # request thread checks it out next, but only ever to one at a time
+    conn = sqlite3.connect(DB_PATH, timeout=5.0, isolation_level=None,
+                           check_same_thread=False)
     try:
         conn.execute("PRAGMA foreign_keys = ON")
         conn.execute("PRAGMA busy_timeout = 5000")
@@ -98,25 +119,146 @@ def _db():
         # A backup store must survive power loss, not just process death
         conn.execute("PRAGMA synchronous = FULL")
         _ensure_db(conn)
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+def _db_key():
+    """Identity of the database file, or None if it does not exist yet."""
+    try:
+        st = os.stat(DB_PATH)
+    except OSError:
+        return None
+    return (DB_PATH, st.st_dev, st.st_ino)
+
+
+def _checkout():
+    """An idle pooled connection to the current DB_PATH, or a new one.
+
+    The pool is dropped whenever DB_PATH is repointed or the file behind
+    it is deleted or replaced, so a connection never outlives its file.
+    """
+    global _pool_key
+    key = _db_key()
+    with _pool_lock:
+        if key is None or key != _pool_key:
+            stale, _pool[:] = list(_pool), []
+            _pool_key = None
+        else:
+            stale = []
+            if _pool:
+                return _pool.pop(), key
+    for conn in stale:
+        conn.close()
+    conn = _connect()
+    return conn, key or _db_key()
+
+
+def _checkin(conn, key):
+    global _pool_key
+    with _pool_lock:
+        if _pool_key is None:
+            _pool_key = key
+        if key == _pool_key and len(_pool) < _POOL_MAX:
+            _pool.append(conn)
+            return
+    conn.close()
+
+
+@contextmanager
+def _db():
+    """Yield a configured connection; commit open work, return it to the pool.
+
+    Connections are long-lived: the pragmas and schema setup run once per
+    connection, so a pooled checkout costs one stat of the database file.
+    Autocommit mode (isolation_level=None) — write paths take explicit
+    BEGIN IMMEDIATE so the write lock is acquired up front rather than on
+    first DML, and reads never open transactions at all.
+    """
+    conn, key = _checkout()
+    try:
+        _maybe_import_git(conn)
         yield conn
         if conn.in_transaction:
             conn.commit()
     except Exception:
+        # A failed call's connection is not trusted back into the pool
         if conn.in_transaction:
             conn.rollback()
+        conn.close()
         raise
-    finally:
+    except BaseException:
         conn.close()
+        raise
+    _checkin(conn, key)
+
+
+SCHEMA_VERSION = 4
 
 
 def _ensure_db(conn):
     fresh = not conn.execute(
         "SELECT 1 FROM sqlite_master WHERE type='table' AND name='versions'"
     ).fetchone()
+    # Migrate before the schema script: its indexes may name new columns
+    if not fresh and conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        _migrate(conn)
     conn.executescript(_SCHEMA)
     if fresh:
-        conn.execute("PRAGMA user_version = 1")
-    _maybe_import_git(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def _migrate(conn):
+    """Bring an older database up to SCHEMA_VERSION, in one transaction."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Another process may have migrated while we waited for the lock
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 2:
+            # v2: per-file version_count/head_version_id, kept current by
+            # _insert_version so summaries are a primary-key lookup
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(files)")}
+            if "version_count" not in columns:
+                conn.execute("ALTER TABLE files ADD COLUMN"
+                             " version_count INTEGER NOT NULL DEFAULT 0")
+            if "head_version_id" not in columns:
+                conn.execute("ALTER TABLE files ADD COLUMN head_version_id INTEGER")
+            conn.execute(
+                "UPDATE files SET"
+                " version_count = (SELECT COUNT(*) FROM versions"
+                "  WHERE file_id = files.id),"
+                " head_version_id = (SELECT id FROM versions"
+                "  WHERE file_id = files.id"
+                "  ORDER BY created_at_us DESC, id DESC LIMIT 1)"
+            )
+        if version < 3:
+            # v3: delta blobs (codec 'delta') name the blob they patch
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(blobs)")}
+            if "base_hash" not in columns:
+                conn.execute("ALTER TABLE blobs ADD COLUMN"
+                             " base_hash BLOB REFERENCES blobs(hash)")
+            if "depth" not in columns:
+                conn.execute("ALTER TABLE blobs ADD COLUMN"
+                             " depth INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_blobs_base"
+                         " ON blobs(base_hash)")
+        if version < 4:
+            # v4: delta payloads lead with delta.MAGIC, so pre-delta builds
+            # sharing this file fail on them rather than read op bytes
+            for blob_hash, content in conn.execute(
+                    "SELECT hash, compressed_content FROM blobs"
+                    " WHERE codec = 'delta'").fetchall():
+                if not content.startswith(delta.MAGIC):
+                    conn.execute(
+                        "UPDATE blobs SET compressed_content = ? WHERE hash = ?",
+                        (delta.MAGIC + content, blob_hash))
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
 
 
 def _now_us():
@@ -128,16 +270,8 @@ def _decode(raw):
 
 
 def _diff_stats(old_text, new_text):
-    diff = difflib.unified_diff(
-        old_text.splitlines(), new_text.splitlines(), lineterm=""
-    )
-    added = removed = 0
-    for line in diff:
-        if line.startswith("+") and not line.startswith("+++"):
-            added += 1
-        elif line.startswith("-") and not line.startswith("---"):
-            removed += 1
-    return added, removed
+    """(added, removed) line counts — see linediff.stats."""
+    return linediff.stats(old_text.splitlines(), new_text.splitlines())
 
 
 def _file_id(conn, filepath, create=False):
@@ -176,11 +310,154 @@ def _latest(conn, file_id):
     ).fetchone()
 
 
-def _blob_text(conn, blob_hash):
+KEYFRAME_DEPTH = 16        # max deltas between full blobs — bounds a read
+DELTA_MIN_BYTES = 4096     # below this a full zlib blob is already tiny
+_RAW_CACHE_BYTES = 8 * 1024 * 1024
+_raw_cache = {}  # blob hash → raw bytes; content-addressed, so never stale
+_raw_cache_size = 0
+_raw_cache_lock = threading.Lock()
+
+
+# Small blobs compress poorly on their own (each starts with an empty
+# window); the 'zdict:<id>' codec primes zlib with a preset dictionary
+# trained on the user's own notes (see recompress). zlib only looks back
+# 32KB, so a larger dictionary — or a larger blob — gains nothing.
+ZDICT_MAX_BYTES = 32 * 1024
+ZDICT_SAMPLE_FILES = 2000
+ZDICT_MIN_FILES = 8
+_zdicts = {}  # dictionary id → bytes; ids are content hashes, never stale
+
+
+def _zdict(conn, dict_id):
+    zd = _zdicts.get(dict_id)
+    if zd is None:
+        row = conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (f"zdict.{dict_id}",)
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"compression dictionary {dict_id} missing from meta")
+        zd = _zdicts[dict_id] = base64.b64decode(row[0])
+    return zd
+
+
+def _current_zdict(conn):
+    """(id, bytes) of the dictionary new blobs compress against, or None."""
     row = conn.execute(
-        "SELECT compressed_content FROM blobs WHERE hash = ?", (blob_hash,)
+        "SELECT value FROM meta WHERE key = 'zdict.current'"
     ).fetchone()
-    return _decode(zlib.decompress(row[0])) if row else ""
+    return (row[0], _zdict(conn, row[0])) if row else None
+
+
+def _encode_keyframe(conn, raw):
+    """(codec, compressed) for a full blob — the smaller of plain zlib and,
+    when a trained dictionary exists, zlib primed with it."""
+    best = ("zlib", zlib.compress(raw, 6))
+    current = _current_zdict(conn) if len(raw) <= ZDICT_MAX_BYTES else None
+    if current:
+        comp = zlib.compressobj(level=9, zdict=current[1])
+        data = comp.compress(raw) + comp.flush()
+        if len(data) < len(best[1]):
+            best = (f"zdict:{current[0]}", data)
+    return best
+
+
+def _decode_keyframe(conn, codec, content):
+    if codec == "zlib":
+        return zlib.decompress(content)
+    if codec.startswith("zdict:"):
+        decomp = zlib.decompressobj(zdict=_zdict(conn, codec[len("zdict:"):]))
+        return decomp.decompress(content) + decomp.flush()
+    raise ValueError(f"unknown blob codec {codec!r}")
+
+
+def _remember_raw(blob_hash, raw):
+    global _raw_cache_size
+    if len(raw) > _RAW_CACHE_BYTES // 4:
+        return
+    with _raw_cache_lock:
+        if blob_hash in _raw_cache:
+            return
+        _raw_cache[blob_hash] = raw
+        _raw_cache_size += len(raw)
+        while _raw_cache_size > _RAW_CACHE_BYTES:
+            _raw_cache_size -= len(_raw_cache.pop(next(iter(_raw_cache))))
+
+
+def _blob_raw(conn, blob_hash):
+    """Raw bytes of a blob, following its delta chain to a keyframe.
+
+    Returns None for an unknown hash. Chains are at most KEYFRAME_DEPTH
+    long, and recently rebuilt blobs (typically the previous version of
+    a file being saved again) come from a small in-memory cache.
+    """
+    with _raw_cache_lock:
+        raw = _raw_cache.get(blob_hash)
+    if raw is not None:
+        return raw
+    chain = []  # (hash, delta) from blob_hash back towards the keyframe
+    h = blob_hash
+    while True:
+        with _raw_cache_lock:
+            raw = _raw_cache.get(h)
+        if raw is not None:
+            break
+        row = conn.execute(
+            "SELECT codec, compressed_content, base_hash FROM blobs WHERE hash = ?",
+            (h,),
+        ).fetchone()
+        if row is None:
+            if not chain:
+                return None
+            raise ValueError(f"delta base {h.hex()[:12]} missing from blob store")
+        codec, content, base_hash = row
+        if codec == "delta":
+            chain.append((h, content))
+            h = base_hash
+            continue
+        raw = _decode_keyframe(conn, codec, content)
+        _remember_raw(h, raw)
+        break
+    for h, content in reversed(chain):
+        raw = delta.apply(raw, content)
+        _remember_raw(h, raw)
+    return raw
+
+
+def _blob_text(conn, blob_hash):
+    raw = _blob_raw(conn, blob_hash)
+    return _decode(raw) if raw is not None else ""
+
+
+def _encode_blob(conn, raw, base_hash=None):
+    """(codec, content, base_hash, depth) for raw bytes: a delta against
+    `base_hash` when that is much smaller than the full blob, else a
+    keyframe."""
+    codec, full = _encode_keyframe(conn, raw)
+    row = None
+    if base_hash is not None and len(raw) >= DELTA_MIN_BYTES:
+        row = conn.execute(
+            "SELECT depth FROM blobs WHERE hash = ?", (base_hash,)
+        ).fetchone()
+    if row is not None and row[0] < KEYFRAME_DEPTH:
+        base = _blob_raw(conn, base_hash)
+        patch = delta.encode(base, raw)
+        # A backup store: never keep a delta that does not round-trip
+        if len(patch) * 2 < len(full) and delta.apply(base, patch) == raw:
+            return "delta", patch, base_hash, row[0] + 1
+    return codec, full, None, 0
+
+
+def _store_blob(conn, blob_hash, raw, base_hash=None):
+    """Insert a blob (no-op if present), encoded by _encode_blob."""
+    if conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (blob_hash,)).fetchone():
+        return
+    codec, content, base_hash, depth = _encode_blob(conn, raw, base_hash)
+    conn.execute(
+        "INSERT INTO blobs(hash, codec, raw_size, compressed_content,"
+        " base_hash, depth) VALUES (?, ?, ?, ?, ?, ?)",
+        (blob_hash, codec, len(raw), content, base_hash, depth),
+    )
+    _remember_raw(blob_hash, raw)
 
 
 def _insert_version(conn, file_id, filepath, raw, source, created_at_us=None):
@@ -191,17 +468,24 @@ def _insert_version(conn, file_id, filepath, raw, source, created_at_us=None):
         return latest[0]
     old_text = _blob_text(conn, latest[1]) if latest else ""
     added, removed = _diff_stats(old_text, _decode(raw))
-    conn.execute(
-        "INSERT OR IGNORE INTO blobs(hash, raw_size, compressed_content)"
-        " VALUES (?, ?, ?)",
-        (blob_hash, len(raw), zlib.compress(raw, 6)),
-    )
+    _store_blob(conn, blob_hash, raw, latest[1] if latest else None)
+    created_at_us = created_at_us or _now_us()
     cur = conn.execute(
         "INSERT INTO versions(file_id, blob_hash, created_at_us, source,"
         " added, removed, filepath_at_time) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (file_id, blob_hash, created_at_us or _now_us(), source,
+        (file_id, blob_hash, created_at_us, source,
          added, removed, os.path.abspath(filepath)),
     )
+    # The new row has the highest id, so it becomes head unless it is
+    # backdated (imports) behind the current head
+    conn.execute(
+        "UPDATE files SET version_count = version_count + 1,"
+        " head_version_id = CASE WHEN head_version_id IS NULL"
+        "  OR (SELECT created_at_us FROM versions WHERE id = head_version_id) <= :ts"
+        "  THEN :vid ELSE head_version_id END"
+        " WHERE id = :fid",
+        {"ts": created_at_us, "vid": cur.lastrowid, "fid": file_id},
+    )
     return cur.lastrowid
 
 
@@ -219,6 +503,13 @@ def commit(filepath, content=None, source="save"):
             raw = f.read()
     if len(raw) > MAX_VERSION_BYTES:
         return ""
+    # A queued snapshot of this file predates the caller's content — land
+    # it first so the timeline keeps disk order
+    flush(filepath)
+    return _record(filepath, raw, source)
+
+
+def _record(filepath, raw, source):
     with _db() as conn:
         conn.execute("BEGIN IMMEDIATE")
         file_id = _file_id(conn, filepath, create=True)
@@ -226,16 +517,99 @@ def commit(filepath, content=None, source="save"):
         return str(version_id)
 
 
+# ── Write-behind snapshots ──────────────────────────────────────────────
+# Polling notices external edits on a request thread; versioning them
+# there would put a diff, compression and a FULL-synchronous commit in
+# front of every poll response. Snapshots are queued instead and written
+# by one daemon thread. The queue holds at most one entry per file — a
+# build tool rewriting a note ten times between writer passes yields one
+# version of the latest content, which is all the deduping commit would
+# have kept of an unchanged tail anyway.
+
+WRITE_QUEUE_MAX = 256  # distinct files waiting; beyond this callers write inline
+EXIT_FLUSH_S = 5.0     # how long interpreter exit waits for queued snapshots
+READ_FLUSH_S = 2.0     # how long a history read waits for its file's snapshot
+_queue = collections.OrderedDict()  # abspath → content, oldest first
+_writing = set()  # abspaths the writer has dequeued but not yet committed
+_queue_cond = threading.Condition()
+_writer = None
+
+
 def snapshot_external(filepath, content):
-    """Version externally-detected disk content. Never raises."""
+    """Queue externally-detected disk content for versioning. Never raises.
+
+    Returns immediately; a later snapshot of the same file replaces a
+    still-queued one. When the queue is full the write happens inline,
+    so a flood of changing files slows its pollers instead of growing
+    memory without bound.
+    """
+    global _writer
+    key = os.path.abspath(filepath)
+    with _queue_cond:
+        if key in _queue or len(_queue) < WRITE_QUEUE_MAX:
+            _queue[key] = content
+            if _writer is None or not _writer.is_alive():
+                if _writer is None:
+                    # Daemon threads die mid-queue at exit — drain first
+                    atexit.register(flush, timeout=EXIT_FLUSH_S)
+                _writer = threading.Thread(target=_write_loop,
+                                           name="dabarat-history", daemon=True)
+                _writer.start()
+            _queue_cond.notify_all()
+            return
     try:
-        commit(filepath, content=content, source="external")
+        commit(key, content=content, source="external")
     except Exception:
         pass
 
 
+def _write_loop():
+    while True:
+        with _queue_cond:
+            while not _queue:
+                _queue_cond.wait()
+            key, content = _queue.popitem(last=False)
+            _writing.add(key)
+        try:
+            raw = content.encode("utf-8")
+            if len(raw) <= MAX_VERSION_BYTES:
+                _record(key, raw, "external")
+        except Exception as e:
+            print(f"Warning: history snapshot failed for {key}: {e!r}",
+                  file=sys.stderr)
+        finally:
+            with _queue_cond:
+                _writing.discard(key)
+                _queue_cond.notify_all()
+
+
+def flush(filepath=None, timeout=None):
+    """Wait until queued snapshots are committed. Returns False on timeout.
+
+    With a path, waits only for that file's snapshot; otherwise for the
+    whole queue. Never waits from the writer thread itself.
+    """
+    if threading.current_thread() is _writer:
+        return True
+    key = os.path.abspath(filepath) if filepath is not None else None
+
+    def busy():
+        if key is None:
+            return bool(_queue or _writing)
+        return key in _queue or key in _writing
+
+    with _queue_cond:
+        return _queue_cond.wait_for(lambda: not busy(), timeout)
+
+
 def list_versions(filepath, limit=50):
-    """Return newest-first [{hash, date, message, added, removed, label, pinned, source}]."""
+    """Return newest-first [{hash, date, message, added, removed, label, pinned, source}].
+
+    A queued snapshot of the file is committed first (up to
+    READ_FLUSH_S), so a panel refreshed right after an external edit
+    lists it.
+    """
+    flush(filepath, timeout=READ_FLUSH_S)
     with _db() as conn:
         file_id = _file_id(conn, filepath)
         if file_id is None:
@@ -267,26 +641,65 @@ def list_versions(filepath, limit=50):
 def version_summary(filepath):
     """Version count plus newest version ref, without building row dicts.
 
-    One indexed query instead of list_versions() materializing up to 50
-    entries — this runs on every save and every browse-dir row.
+    Reads the counters _insert_version keeps on the files row — a
+    primary-key lookup however many versions the file has. This runs on
+    every save and every browse-dir row. Like list_versions, it first
+    waits (bounded) for a queued snapshot of the file.
     """
+    flush(filepath, timeout=READ_FLUSH_S)
     with _db() as conn:
         file_id = _file_id(conn, filepath)
         if file_id is None:
             return 0, None
         count, head = conn.execute(
-            "SELECT COUNT(*),"
-            " (SELECT id FROM versions WHERE file_id = :fid"
-            "  ORDER BY created_at_us DESC, id DESC LIMIT 1)"
-            " FROM versions WHERE file_id = :fid",
-            {"fid": file_id},
+            "SELECT version_count, head_version_id FROM files WHERE id = ?",
+            (file_id,),
         ).fetchone()
     return count, (str(head) if head is not None else None)
 
 
+_SUMMARY_CHUNK = 500  # paths per IN (...) list, under SQLite's variable limit
+
+
+def version_summaries(paths):
+    """version_summary for many files at once: {abspath: (count, head)}.
+
+    Paths resolve through files/file_aliases (current path wins, as in
+    _file_id) and the counters come straight off the files rows, so a
+    browse of N files costs a few queries rather than N round trips.
+    Unversioned paths map to (0, None). Queued snapshots of the paths
+    are committed first, within READ_FLUSH_S overall.
+    """
+    wanted = list(dict.fromkeys(os.path.abspath(p) for p in paths))
+    deadline = time.monotonic() + READ_FLUSH_S
+    for path in wanted:
+        if not flush(path, timeout=max(0.0, deadline - time.monotonic())):
+            break
+    out = {p: (0, None) for p in wanted}
+    with _db() as conn:
+        for i in range(0, len(wanted), _SUMMARY_CHUNK):
+            chunk = wanted[i:i + _SUMMARY_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            rows = {}
+            for path, count, head in conn.execute(
+                    "SELECT a.path, f.version_count, f.head_version_id"
+                    " FROM file_aliases a JOIN files f ON f.id = a.file_id"
+                    f" WHERE a.path IN ({marks})", chunk):
+                rows[path] = (count, head)
+            for path, count, head in conn.execute(
+                    "SELECT current_path, version_count, head_version_id"
+                    f" FROM files WHERE current_path IN ({marks})", chunk):
+                rows[path] = (count, head)
+            for path, (count, head) in rows.items():
+                if count:
+                    out[path] = (count, str(head))
+    return out
+
+
 def list_recent_versions(limit=50):
     """Return newest-first versions across every file:
     [{hash, path, name, date, added, removed, label, pinned, source}]."""
+    flush(timeout=READ_FLUSH_S)
     with _db() as conn:
         rows = conn.execute(
             "SELECT v.id, v.created_at_us, v.source, v.added, v.removed,"
@@ -329,12 +742,27 @@ def get_version_content(filepath, ref):
         if file_id is None:
             return None
         row = conn.execute(
-            "SELECT b.compressed_content FROM versions v"
-            " JOIN blobs b ON b.hash = v.blob_hash"
-            " WHERE v.id = ? AND v.file_id = ?",
+            "SELECT blob_hash FROM versions WHERE id = ? AND file_id = ?",
+            (version_id, file_id),
+        ).fetchone()
+        return _blob_text(conn, row[0]) if row else None
+
+
+def get_version_hash(filepath, ref):
+    """SHA-256 hex of a version's content (without reading it), or None.
+
+    Same digest as hashlib.sha256(content.encode()) of the text, so it
+    can key caches shared with live content."""
+    version_id = _version_ref(ref)
+    with _db() as conn:
+        file_id = _file_id(conn, filepath)
+        if file_id is None:
+            return None
+        row = conn.execute(
+            "SELECT blob_hash FROM versions WHERE id = ? AND file_id = ?",
             (version_id, file_id),
         ).fetchone()
-    return _decode(zlib.decompress(row[0])) if row else None
+        return row[0].hex() if row else None
 
 
 def version_change_summary(filepath, ref, max_changed=2, context=1):
@@ -370,24 +798,23 @@ def version_change_summary(filepath, ref, max_changed=2, context=1):
     # diffing a multi-MB document line-by-line is wasted work
     old_lines = old_text.splitlines()[:5000]
     new_lines = new_text.splitlines()[:5000]
+    hunks = linediff.grouped_opcodes(
+        linediff.opcodes(old_lines, new_lines), context)
+    hunk = next(hunks, [])
     lines = []
     changed = 0
-    truncated = False
-    for line in difflib.unified_diff(old_lines, new_lines,
-                                     lineterm="", n=context):
-        if line.startswith(("+++", "---")):
-            continue
-        if line.startswith("@@"):
-            if changed:  # first hunk only
-                truncated = True
-                break
+    truncated = next(hunks, None) is not None  # first hunk only
+    for tag, i1, i2, j1, j2 in hunk:
+        if tag == "equal":
+            lines.extend(" " + line for line in old_lines[i1:i2])
             continue
-        if line.startswith(("+", "-")):
+        # Unified order: a replace lists its removals, then its additions
+        for line in ([f"-{x}" for x in old_lines[i1:i2]]
+                     + [f"+{x}" for x in new_lines[j1:j2]]):
             if changed >= max_changed:
-                truncated = True
-                break
+                return {"lines": lines, "truncated": True}
             changed += 1
-        lines.append(line)
+            lines.append(line)
     return {"lines": lines, "truncated": truncated}
 
 
@@ -426,6 +853,7 @@ def restore(filepath, ref):
 def record_rename(old_path, new_path):
     """Carry file identity across a rename so history follows the document."""
     old_abs, new_abs = os.path.abspath(old_path), os.path.abspath(new_path)
+    flush(old_abs)  # a queued snapshot must not resurrect the old path
     now = _now_us()
     with _db() as conn:
         conn.execute("BEGIN IMMEDIATE")
@@ -477,6 +905,329 @@ def set_label(filepath, ref, label):
         return cur.rowcount > 0
 
 
+# ── Retention ───────────────────────────────────────────────────────────
+
+_HOUR_US = 3600 * 1_000_000
+_DAY_US = 24 * _HOUR_US
+RETENTION_DEFAULTS = {
+    "enabled": True,
+    "keepAllHours": 24,    # everything younger than this is kept
+    "hourlyDays": 30,      # then the newest version per hour, up to this age
+    # then the newest version per day. Only these sources are ever thinned:
+    # external snapshots are the automatic, unbounded ones
+    "sources": ["external"],
+}
+
+
+def retention_policy(overrides=None):
+    """RETENTION_DEFAULTS with valid keys from `overrides` applied (the
+    "historyRetention" object of config.json); bad values are ignored."""
+    policy = dict(RETENTION_DEFAULTS)
+    if not isinstance(overrides, dict):
+        return policy
+    if isinstance(overrides.get("enabled"), bool):
+        policy["enabled"] = overrides["enabled"]
+    for key in ("keepAllHours", "hourlyDays"):
+        value = overrides.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0:
+            policy[key] = value
+    sources = overrides.get("sources")
+    if isinstance(sources, list) and all(
+            src in ("save", "restore", "external", "import") for src in sources):
+        policy["sources"] = sources
+    return policy
+
+
+def _doomed_versions(rows, policy, now_us):
+    """Ids to drop from one file's versions (rows newest-first, as
+    (id, created_at_us, source, pinned, label)). Within each hour/day
+    bucket the newest version survives whatever its source, so thinning
+    never leaves a bucket empty."""
+    keep_all_us = policy["keepAllHours"] * _HOUR_US
+    hourly_us = policy["hourlyDays"] * _DAY_US
+    sources = set(policy["sources"])
+    seen_buckets = set()
+    doomed = []
+    for i, (vid, created_us, source, pinned, label) in enumerate(rows):
+        age = now_us - created_us
+        if age < keep_all_us:
+            continue
+        bucket = (("h", created_us // _HOUR_US) if age < hourly_us
+                  else ("d", created_us // _DAY_US))
+        first_in_bucket = bucket not in seen_buckets
+        seen_buckets.add(bucket)
+        if (i == 0 or first_in_bucket or pinned or label is not None
+                or source not in sources):
+            continue
+        doomed.append(vid)
+    return doomed
+
+
+def _rebase_blob(conn, blob_hash, new_base):
+    """Re-encode a delta blob against `new_base` (or as a keyframe).
+    Returns how many bytes the blob grew by."""
+    raw = _blob_raw(conn, blob_hash)
+    old_size = conn.execute(
+        "SELECT length(compressed_content) FROM blobs WHERE hash = ?",
+        (blob_hash,)).fetchone()[0]
+    codec, content, base_hash, depth = _encode_blob(conn, raw, new_base)
+    conn.execute(
+        "UPDATE blobs SET codec = ?, compressed_content = ?, base_hash = ?,"
+        " depth = ? WHERE hash = ?",
+        (codec, content, base_hash, depth, blob_hash),
+    )
+    return len(content) - old_size
+
+
+def _collect_blobs(conn, hashes):
+    """Delete the given blobs that no version references any more.
+
+    A collected delta's children are rebased onto its own base (a
+    collected keyframe's children become deltas against nothing, i.e.
+    keyframes), then the base itself is considered in turn — so freeing a
+    version can free a whole run of its chain. Returns (count, net bytes
+    freed).
+    """
+    freed = freed_bytes = 0
+    pending = list(dict.fromkeys(hashes))
+    while pending:
+        h = pending.pop()
+        if conn.execute("SELECT 1 FROM versions WHERE blob_hash = ? LIMIT 1",
+                        (h,)).fetchone():
+            continue
+        row = conn.execute(
+            "SELECT base_hash, length(compressed_content) FROM blobs WHERE hash = ?",
+            (h,),
+        ).fetchone()
+        if row is None:
+            continue
+        base_hash, size = row
+        for (child,) in conn.execute(
+                "SELECT hash FROM blobs WHERE base_hash = ?", (h,)).fetchall():
+            freed_bytes -= _rebase_blob(conn, child, base_hash)
+        conn.execute("DELETE FROM blobs WHERE hash = ?", (h,))
+        freed += 1
+        freed_bytes += size
+        if base_hash is not None:
+            pending.append(base_hash)
+    return freed, freed_bytes
+
+
+PRUNE_BATCH = 200  # versions dropped per transaction
+
+
+def _prune_file(conn, file_id, policy, now_us, dry_run, limit=None):
+    """Apply retention to one file, dropping at most `limit` versions
+    (oldest first). Returns (versions, blobs, bytes)."""
+    rows = conn.execute(
+        "SELECT id, created_at_us, source, pinned, label, blob_hash"
+        " FROM versions WHERE file_id = ?"
+        " ORDER BY created_at_us DESC, id DESC",
+        (file_id,),
+    ).fetchall()
+    doomed = _doomed_versions([r[:5] for r in rows], policy, now_us)
+    doomed = set(doomed[-limit:] if limit else doomed)
+    if not doomed:
+        return 0, 0, 0
+    doomed_hashes = {r[5] for r in rows if r[0] in doomed}
+    if dry_run:
+        # Estimate: blobs only the doomed versions reference
+        kept_hashes = {r[5] for r in rows if r[0] not in doomed}
+        blobs = nbytes = 0
+        for h in doomed_hashes - kept_hashes:
+            other = conn.execute(
+                "SELECT 1 FROM versions WHERE blob_hash = ? AND file_id != ? LIMIT 1",
+                (h, file_id)).fetchone()
+            if not other:
+                blobs += 1
+                nbytes += conn.execute(
+                    "SELECT length(compressed_content) FROM blobs WHERE hash = ?",
+                    (h,)).fetchone()[0]
+        return len(doomed), blobs, nbytes
+    # A survivor whose predecessor is going away gets its diff stats
+    # recomputed against the version that will now precede it
+    prev_hash, gap = None, False
+    for vid, _, _, _, _, blob_hash in reversed(rows):  # oldest first
+        if vid in doomed:
+            gap = True
+            continue
+        if gap:
+            added, removed = _diff_stats(
+                _blob_text(conn, prev_hash) if prev_hash else "",
+                _blob_text(conn, blob_hash))
+            conn.execute("UPDATE versions SET added = ?, removed = ? WHERE id = ?",
+                         (added, removed, vid))
+        prev_hash, gap = blob_hash, False
+    marks = ",".join("?" * len(doomed))
+    conn.execute(f"DELETE FROM versions WHERE id IN ({marks})", list(doomed))
+    conn.execute("UPDATE files SET version_count = version_count - ? WHERE id = ?",
+                 (len(doomed), file_id))
+    blobs, nbytes = _collect_blobs(conn, doomed_hashes)
+    return len(doomed), blobs, nbytes
+
+
+def prune(policy=None, dry_run=False, pause_s=0.0):
+    """Apply the retention policy to every file, one transaction per file.
+
+    With dry_run nothing changes and the report says what would go (blob
+    bytes are then an upper-bound estimate: rebasing the survivors'
+    deltas is not modelled). Each transaction drops at most PRUNE_BATCH
+    versions and pause_s sleeps between them, so a background run never
+    holds up saves for long. Returns {"files",
+    "versions", "blobs", "bytes", "dryRun", "top"} where top lists the
+    files losing the most versions.
+    """
+    policy = retention_policy(policy)
+    report = {"files": 0, "versions": 0, "blobs": 0, "bytes": 0,
+              "dryRun": dry_run, "top": []}
+    if not policy["enabled"] and not dry_run:
+        return report
+    now_us = _now_us()
+    with _db() as conn:
+        files = conn.execute(
+            "SELECT id, current_path FROM files WHERE version_count > 1"
+            " ORDER BY version_count DESC").fetchall()
+    for file_id, path in files:
+        dropped = 0
+        while True:
+            with _db() as conn:
+                if not dry_run:
+                    conn.execute("BEGIN IMMEDIATE")
+                versions, blobs, nbytes = _prune_file(
+                    conn, file_id, policy, now_us, dry_run,
+                    limit=None if dry_run else PRUNE_BATCH)
+            dropped += versions
+            report["blobs"] += blobs
+            report["bytes"] += nbytes
+            if pause_s:
+                time.sleep(pause_s)
+            if dry_run or versions < PRUNE_BATCH:
+                break
+        if dropped:
+            report["files"] += 1
+            report["versions"] += dropped
+            report["top"].append({"path": path, "versions": dropped})
+    report["top"] = sorted(report["top"], key=lambda f: -f["versions"])[:20]
+    return report
+
+
+# ── Offline maintenance ─────────────────────────────────────────────────
+
+_ZDICT_TOKEN = re.compile(rb"[^\s]+\s+")
+
+
+def _train_zdict(samples):
+    """Build a preset dictionary from sample blobs.
+
+    Candidates are whole lines (frontmatter keys, recurring headings,
+    boilerplate) and runs of one to three words (the user's vocabulary),
+    each counted once per sample and scored by samples × length. The best
+    are packed into ZDICT_MAX_BYTES with the strongest last, where zlib
+    reaches them with the shortest distances. Returns b"" when nothing
+    recurs.
+    """
+    counts = collections.Counter()
+    for raw in samples:
+        seen = {line for line in raw.splitlines(keepends=True)
+                if 4 <= len(line) <= 256}
+        tokens = _ZDICT_TOKEN.findall(raw)
+        for n in (1, 2, 3):
+            seen.update(b"".join(tokens[i:i + n])
+                        for i in range(len(tokens) - n + 1))
+        counts.update(t for t in seen if len(t) >= 4)
+    picked, size = [], 0
+    for chunk, n in sorted(counts.items(), key=lambda kv: kv[1] * len(kv[0]),
+                           reverse=True):
+        if n < 2:
+            continue
+        if size + len(chunk) <= ZDICT_MAX_BYTES:
+            picked.append(chunk)
+            size += len(chunk)
+    return b"".join(reversed(picked))
+
+
+def recompress(batch=200, progress=None):
+    """Retrain the blob dictionary and rewrite keyframes into their smallest
+    codec, then VACUUM. Delta blobs are left alone (they patch content,
+    not encodings). Safe to interrupt: each batch is its own transaction.
+    Returns a report dict.
+    """
+    def db_bytes(conn):
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        return pages * conn.execute("PRAGMA page_size").fetchone()[0]
+
+    with _db() as conn:
+        before = db_bytes(conn)
+        # One sample per file (its newest small version), so a note saved
+        # a thousand times cannot dominate the dictionary
+        samples = [_blob_raw(conn, h) for (h,) in conn.execute(
+            "SELECT v.blob_hash FROM files f"
+            " JOIN versions v ON v.id = f.head_version_id"
+            " JOIN blobs b ON b.hash = v.blob_hash"
+            " WHERE b.raw_size <= ? ORDER BY v.created_at_us DESC LIMIT ?",
+            (ZDICT_MAX_BYTES, ZDICT_SAMPLE_FILES))]
+        dict_id = None
+        zd = _train_zdict(samples) if len(samples) >= ZDICT_MIN_FILES else b""
+        if zd:
+            dict_id = hashlib.sha256(zd).hexdigest()[:12]
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR IGNORE INTO meta(key, value) VALUES (?, ?)",
+                (f"zdict.{dict_id}", base64.b64encode(zd).decode("ascii")),
+            )
+            conn.execute(
+                "INSERT INTO meta(key, value) VALUES ('zdict.current', ?)"
+                " ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (dict_id,),
+            )
+            conn.execute("COMMIT")
+        hashes = [h for (h,) in conn.execute(
+            "SELECT hash FROM blobs WHERE codec != 'delta'")]
+
+    rewritten = saved = 0
+    for i in range(0, len(hashes), batch):
+        with _db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for h in hashes[i:i + batch]:
+                row = conn.execute(
+                    "SELECT codec, compressed_content FROM blobs WHERE hash = ?",
+                    (h,),
+                ).fetchone()
+                if row is None or row[0] == "delta":
+                    continue
+                raw = _decode_keyframe(conn, row[0], row[1])
+                codec, data = _encode_keyframe(conn, raw)
+                if len(data) < len(row[1]):
+                    conn.execute(
+                        "UPDATE blobs SET codec = ?, compressed_content = ?"
+                        " WHERE hash = ?", (codec, data, h))
+                    rewritten += 1
+                    saved += len(row[1]) - len(data)
+        if progress:
+            progress(min(i + batch, len(hashes)), len(hashes))
+
+    with _db() as conn:
+        # Dictionaries no blob uses any more (superseded by retraining)
+        conn.execute("BEGIN IMMEDIATE")
+        current = _current_zdict(conn)
+        for (key,) in conn.execute(
+                "SELECT key FROM meta WHERE key LIKE 'zdict.%'"
+                " AND key != 'zdict.current'").fetchall():
+            old_id = key[len("zdict."):]
+            if current and old_id == current[0]:
+                continue
+            if not conn.execute("SELECT 1 FROM blobs WHERE codec = ? LIMIT 1",
+                                ("zdict:" + old_id,)).fetchone():
+                conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+        conn.execute("COMMIT")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        after = db_bytes(conn)
+    return {"blobs": len(hashes), "rewritten": rewritten, "bytesSaved": saved,
+            "dictionary": dict_id, "dictionaryBytes": len(zd),
+            "dbBefore": before, "dbAfter": after}
+
+
 # ── Legacy git-repo import ──────────────────────────────────────────────
 
 def _git_candidate_paths():
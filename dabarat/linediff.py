@@ -0,0 +1,249 @@
+"""Line diffs for version stats and change excerpts (stdlib only).
+
+Lines are interned to ints once, so every later comparison is an int
+compare. A diff trims the common prefix and suffix, splits what is left
+on patience anchors — lines that occur exactly once on each side, kept
+in order by a longest increasing subsequence — and repeats inside each
+gap between anchors. Gaps with no anchor left are aligned by Myers'
+greedy O(ND) search. Document edits are local, so the gaps and their
+edit distances stay small even in multi-thousand-line files.
+
+A gap whose edit distance exceeds MAX_EDIT_COST is not searched
+further: opcodes() reports it as one replace block and stats() counts
+its multiset difference. stats() on inputs beyond APPROX_LINES skips
+alignment altogether and returns the multiset difference — exact for
+pure insertions and deletions, an undercount only for lines that moved.
+"""
+
+import bisect
+import collections
+
+MAX_EDIT_COST = 1000    # Myers rounds per gap before giving up on alignment
+APPROX_LINES = 100_000  # old + new lines beyond which stats() approximates
+
+
+def _intern(a, b):
+    ids = {}
+    return ([ids.setdefault(line, len(ids)) for line in a],
+            [ids.setdefault(line, len(ids)) for line in b])
+
+
+def _anchors(a, b, alo, ahi, blo, bhi):
+    """[(i, j)] of lines unique on both sides, longest in-order subset."""
+    where = {}
+    for i in range(alo, ahi):
+        where[a[i]] = -1 if a[i] in where else i
+    seen = {}
+    for j in range(blo, bhi):
+        x = b[j]
+        if where.get(x, -1) >= 0:
+            seen[x] = -1 if x in seen else j
+    pairs = [(where[x], j) for x, j in seen.items() if j >= 0]
+    if not pairs:
+        return []
+    pairs.sort(key=lambda p: p[1])
+    # Patience sort on i: tails[k] is the smallest i ending an increasing
+    # run of length k+1; back links rebuild the longest run
+    tails, tail_at, back = [], [], [None] * len(pairs)
+    for n, (i, _) in enumerate(pairs):
+        k = bisect.bisect_left(tails, i)
+        if k:
+            back[n] = tail_at[k - 1]
+        if k == len(tails):
+            tails.append(i)
+            tail_at.append(n)
+        else:
+            tails[k] = i
+            tail_at[k] = n
+    run = []
+    n = tail_at[-1]
+    while n is not None:
+        run.append(pairs[n])
+        n = back[n]
+    run.reverse()
+    return run
+
+
+def _regions(a, b):
+    """Yield ("match", i, j, size) and ("gap", alo, ahi, blo, bhi) steps.
+
+    Gaps are regions with no common prefix, suffix or unique anchor;
+    steps come in no particular order.
+    """
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        p = 0
+        while alo + p < ahi and blo + p < bhi and a[alo + p] == b[blo + p]:
+            p += 1
+        if p:
+            yield "match", alo, blo, p
+            alo += p
+            blo += p
+        s = 0
+        while ahi - s > alo and bhi - s > blo and a[ahi - s - 1] == b[bhi - s - 1]:
+            s += 1
+        if s:
+            ahi -= s
+            bhi -= s
+            yield "match", ahi, bhi, s
+        if alo == ahi or blo == bhi:
+            if alo < ahi or blo < bhi:
+                yield "gap", alo, ahi, blo, bhi
+            continue
+        anchors = _anchors(a, b, alo, ahi, blo, bhi)
+        if not anchors:
+            yield "gap", alo, ahi, blo, bhi
+            continue
+        pi, pj = alo, blo
+        run_i = run_j = run = 0
+        for i, j in anchors:
+            if i == pi and j == pj and run:
+                run += 1  # adjacent anchors extend one match, no empty gap
+            else:
+                if run:
+                    yield "match", run_i, run_j, run
+                if i > pi or j > pj:
+                    stack.append((pi, i, pj, j))
+                run_i, run_j, run = i, j, 1
+            pi, pj = i + 1, j + 1
+        yield "match", run_i, run_j, run
+        stack.append((pi, ahi, pj, bhi))
+
+
+def _myers(a, b, alo, ahi, blo, bhi, path):
+    """Myers' greedy search over one gap.
+
+    Returns the edit distance (path=False) or the matching blocks
+    [(i, j, size)] (path=True), or None past MAX_EDIT_COST.
+    """
+    n, m = ahi - alo, bhi - blo
+    if not n or not m or set(a[alo:ahi]).isdisjoint(b[blo:bhi]):
+        return [] if path else n + m
+    limit = min(n + m, MAX_EDIT_COST)
+    off = limit + 1
+    v = [0] * (2 * limit + 3)
+    trace = []
+    for d in range(limit + 1):
+        if path:
+            trace.append(v[off - d - 1:off + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[off + k - 1] < v[off + k + 1]):
+                x = v[off + k + 1]
+            else:
+                x = v[off + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            v[off + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, d, n, m, alo, blo) if path else d
+    return None
+
+
+def _backtrack(trace, d, x, y, alo, blo):
+    blocks = []
+    while d > 0:
+        prev = trace[d]  # round d-1's frontier, indexed k + d + 1
+        k = x - y
+        if k == -d or (k != d and prev[k - 1 + d + 1] < prev[k + 1 + d + 1]):
+            px = prev[k + 1 + d + 1]
+            sx = px          # down move: the snake starts at x = px
+        else:
+            px = prev[k - 1 + d + 1]
+            sx = px + 1      # right move
+        if x > sx:
+            blocks.append((alo + sx, blo + sx - k, x - sx))
+        x, y = px, px - (k + 1 if sx == px else k - 1)
+        d -= 1
+    if x:
+        blocks.append((alo, blo, x))
+    return blocks
+
+
+def matching_blocks(a, b):
+    """difflib-style [(i, j, size)] ending with (len(a), len(b), 0)."""
+    a, b = _intern(a, b)
+    blocks = []
+    for step in _regions(a, b):
+        if step[0] == "match":
+            blocks.append(step[1:])
+        else:
+            found = _myers(a, b, *step[1:], path=True)
+            if found:
+                blocks.extend(found)
+    blocks.sort()
+    merged = []
+    for i, j, size in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + size)
+        else:
+            merged.append((i, j, size))
+    merged.append((len(a), len(b), 0))
+    return merged
+
+
+def opcodes(a, b):
+    """difflib.SequenceMatcher.get_opcodes() equivalent for line lists."""
+    ops = []
+    i = j = 0
+    for ai, bj, size in matching_blocks(a, b):
+        if i < ai and j < bj:
+            ops.append(("replace", i, ai, j, bj))
+        elif i < ai:
+            ops.append(("delete", i, ai, j, bj))
+        elif j < bj:
+            ops.append(("insert", i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            ops.append(("equal", ai, i, bj, j))
+    return ops
+
+
+def grouped_opcodes(ops, n=3):
+    """Split opcodes into hunks with `n` lines of context, like difflib."""
+    if not ops:
+        ops = [("equal", 0, 1, 0, 1)]
+    ops = list(ops)
+    tag, i1, i2, j1, j2 = ops[0]
+    if tag == "equal":
+        ops[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    tag, i1, i2, j1, j2 = ops[-1]
+    if tag == "equal":
+        ops[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+    group = []
+    for tag, i1, i2, j1, j2 in ops:
+        if tag == "equal" and i2 - i1 > n * 2:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _multiset_stats(a, b):
+    ca, cb = collections.Counter(a), collections.Counter(b)
+    return sum((cb - ca).values()), sum((ca - cb).values())
+
+
+def stats(a, b):
+    """(added, removed) line counts turning line list `a` into `b`."""
+    if len(a) + len(b) > APPROX_LINES:
+        return _multiset_stats(a, b)
+    a, b = _intern(a, b)
+    matched = 0
+    for step in _regions(a, b):
+        if step[0] == "match":
+            matched += step[3]
+            continue
+        _, alo, ahi, blo, bhi = step
+        d = _myers(a, b, alo, ahi, blo, bhi, path=False)
+        if d is None:
+            added, _ = _multiset_stats(a[alo:ahi], b[blo:bhi])
+            matched += (bhi - blo) - added
+        else:
+            matched += (ahi - alo + bhi - blo - d) // 2
+    return len(b) - matched, len(a) - matched
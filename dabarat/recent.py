@@ -13,6 +13,9 @@ RECENT_FILE = os.path.expanduser("~/.dabarat/recent.json")
 MAX_RECENT = 20
 MAX_FILE_READ = 1 * 1024 * 1024  # 1MB for metadata extraction
 ALLOWED_EXT = {".md", ".markdown", ".txt"}
+# Frontmatter keys surfaced as card badges (home cards show all six; the
+# recent list keeps the first four — description/summary feed the card text)
+BADGE_KEYS = ("type", "model", "version", "status", "description", "summary")
 
 _lock = threading.Lock()
 
@@ -52,19 +55,23 @@ def _validate_entry(entry):
     return True
 
 
-def _extract_summary(filepath, max_chars=200):
-    """Extract first non-header paragraph, stripped of formatting."""
-    try:
-        text = Path(filepath).read_text(encoding="utf-8", errors="ignore")
-    except Exception:
-        return ""
-    # Strip YAML frontmatter
+def _read_text(filepath):
+    return Path(filepath).read_text(encoding="utf-8", errors="ignore")
+
+
+def _strip_frontmatter(text):
+    """Drop a leading YAML block (loose split, as the card helpers always did)."""
     if text.startswith("---"):
         parts = text.split("---", 2)
         if len(parts) >= 3:
-            text = parts[2]
+            return parts[2]
+    return text
+
+
+def _summary_of(body, max_chars=200):
+    """First non-header paragraph of a frontmatter-stripped body."""
     # Strip code blocks
-    text = re.sub(r"```[\s\S]*?```", "", text)
+    text = re.sub(r"```[\s\S]*?```", "", body)
     # Strip HTML tags
     text = re.sub(r"<[^>]+>", "", text)
     # Find first paragraph (non-header, non-list)
@@ -82,19 +89,10 @@ def _extract_summary(filepath, max_chars=200):
     return ""
 
 
-def _extract_preview(filepath, max_chars=500):
-    """Extract first portion of markdown for rendered preview (preserving formatting)."""
-    try:
-        text = Path(filepath).read_text(encoding="utf-8", errors="ignore")
-    except Exception:
-        return ""
-    # Strip YAML frontmatter
-    if text.startswith("---"):
-        parts = text.split("---", 2)
-        if len(parts) >= 3:
-            text = parts[2]
+def _preview_of(body, max_chars=500):
+    """Leading markdown of a frontmatter-stripped body, formatting kept."""
     # Strip HTML tags (images, alignment divs, etc.)
-    text = re.sub(r"<[^>]+>", "", text)
+    text = re.sub(r"<[^>]+>", "", body)
     text = text.strip()
     # Take first N chars, try to break at a paragraph boundary
     if len(text) > max_chars:
@@ -107,6 +105,74 @@ def _extract_preview(filepath, max_chars=500):
     return text.strip()
 
 
+def _preview_image_of(raw, filepath):
+    """First image reference in the raw text, resolved against filepath."""
+    img_match = re.search(r"!\[.*?\]\(([^)]+)\)", raw)
+    if img_match:
+        img_path = img_match.group(1)
+        if not img_path.startswith(("http://", "https://")):
+            img_path = os.path.join(os.path.dirname(filepath), img_path)
+            img_path = browser_image_path(img_path)
+            if os.path.isfile(img_path):
+                return img_path
+            return ""
+        return img_path
+    return ""
+
+
+def extract_metadata(filepath, text=None):
+    """Every home-card field from a single read of the file.
+
+    Returns {summary, preview, wordCount, previewImage, badges}; badges
+    carries the frontmatter keys in BADGE_KEYS as strings. Pass `text`
+    when the caller already holds the content (a save, a tab refresh) and
+    the file is not read at all. An unreadable file yields empty fields.
+    """
+    if text is None:
+        try:
+            text = _read_text(filepath)
+        except Exception:
+            text = ""
+    body = _strip_frontmatter(text)
+    badges = {}
+    try:
+        from . import frontmatter as _fm_mod
+        fm, _ = _fm_mod.parse_frontmatter_text(text)
+        if isinstance(fm, dict):
+            badges = {k: str(fm[k]) for k in BADGE_KEYS if k in fm}
+    except Exception:
+        pass
+    try:
+        preview_image = _preview_image_of(text, filepath)
+    except Exception:
+        preview_image = ""
+    return {
+        "summary": _summary_of(body),
+        "preview": _preview_of(body),
+        "wordCount": len(body.split()),
+        "previewImage": preview_image,
+        "badges": badges,
+    }
+
+
+def _extract_summary(filepath, max_chars=200):
+    """Extract first non-header paragraph, stripped of formatting."""
+    try:
+        text = _read_text(filepath)
+    except Exception:
+        return ""
+    return _summary_of(_strip_frontmatter(text), max_chars)
+
+
+def _extract_preview(filepath, max_chars=500):
+    """Extract first portion of markdown for rendered preview (preserving formatting)."""
+    try:
+        text = _read_text(filepath)
+    except Exception:
+        return ""
+    return _preview_of(_strip_frontmatter(text), max_chars)
+
+
 def load():
     """Load recent entries, filtering stale ones.
 
@@ -134,13 +200,7 @@ def save(entries):
 def _extract_word_count(filepath):
     """Count words in a markdown file."""
     try:
-        text = Path(filepath).read_text(encoding="utf-8", errors="ignore")
-        # Strip frontmatter
-        if text.startswith("---"):
-            parts = text.split("---", 2)
-            if len(parts) >= 3:
-                text = parts[2]
-        return len(text.split())
+        return len(_strip_frontmatter(_read_text(filepath)).split())
     except Exception:
         return 0
 
@@ -173,20 +233,9 @@ def browser_image_path(path):
 def _extract_preview_image(filepath):
     """Extract first image path from markdown, returning absolute path or URL."""
     try:
-        raw = Path(filepath).read_text(encoding="utf-8", errors="ignore")
-        img_match = re.search(r"!\[.*?\]\(([^)]+)\)", raw)
-        if img_match:
-            img_path = img_match.group(1)
-            if not img_path.startswith(("http://", "https://")):
-                img_path = os.path.join(os.path.dirname(filepath), img_path)
-                img_path = browser_image_path(img_path)
-                if os.path.isfile(img_path):
-                    return img_path
-                return ""
-            return img_path
+        return _preview_image_of(_read_text(filepath), filepath)
     except Exception:
-        pass
-    return ""
+        return ""
 
 
 def _count_annotations(filepath):
@@ -210,6 +259,16 @@ def _version_info(filepath):
         return 0, None
 
 
+def _version_infos(filepaths):
+    """{abspath: (count, head)} for many files from one batched lookup."""
+    try:
+        from . import history as _hist_mod
+        return _hist_mod.version_summaries(filepaths)
+    except Exception as e:
+        print(f"Warning: batched version lookup failed: {e!r}", file=sys.stderr)
+        return {}
+
+
 def _count_versions(filepath):
     """Count version history entries for a file."""
     return _version_info(filepath)[0]
@@ -232,12 +291,15 @@ def touch_entry(filepath, content=None):
             entry["mtime"] = os.stat(path).st_mtime
         except Exception:
             pass
+        # The content just saved is exactly what is on disk — extract
+        # from it instead of reading the file back
+        meta = extract_metadata(path, text=content)
         if content is not None:
             entry["wordCount"] = len(content.split())
         entry["annotationCount"] = _count_annotations(path)
         entry["versionCount"], entry["headVersion"] = _version_info(path)
-        entry["summary"] = _extract_summary(path)
-        entry["preview"] = _extract_preview(path)
+        entry["summary"] = meta["summary"]
+        entry["preview"] = meta["preview"]
         save(entries)
 
 
@@ -256,21 +318,12 @@ def add_entry(filepath, content=None, tags=None):
     with _lock:
         entries = load()
         entries = [e for e in entries if e["path"] != path]
-        # First image in the markdown for the card preview (PDF figures
-        # resolve to their SVG/PNG sibling — see browser_image_path)
-        preview_image = _extract_preview_image(path)
-
-        # Extract frontmatter badges
-        fm_badges = {}
-        try:
-            from . import frontmatter as _fm_mod
-            fm, _ = _fm_mod.get_frontmatter(path)
-            if fm:
-                for k in ("type", "model", "version", "status"):
-                    if k in fm:
-                        fm_badges[k] = str(fm[k])
-        except Exception:
-            pass
+        # One read for every card field. The first image (PDF figures
+        # resolve to their SVG/PNG sibling — see browser_image_path) and
+        # the frontmatter badges come from the same pass
+        meta = extract_metadata(path)
+        fm_badges = {k: v for k, v in meta["badges"].items()
+                     if k in BADGE_KEYS[:4]}
 
         # File timestamps for card display (created + last modified)
         try:
@@ -293,9 +346,9 @@ def add_entry(filepath, content=None, tags=None):
             "versionCount": version_count,
             "headVersion": head_version,
             "tags": tags or [],
-            "summary": _extract_summary(path),
-            "preview": _extract_preview(path),
-            "previewImage": preview_image,
+            "summary": meta["summary"],
+            "preview": meta["preview"],
+            "previewImage": meta["previewImage"],
             "frontmatter": fm_badges if fm_badges else None,
         }
         entries = [entry] + entries[: MAX_RECENT - 1]
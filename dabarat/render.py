@@ -0,0 +1,383 @@
+"""Server-side markdown rendering (optional — needs markdown-it-py).
+
+render() produces the HTML the client would build with marked — GFM
+tables, strikethrough, task lists, footnotes in marked-footnote's markup,
+autolinks — plus the heading list the TOC is built from. Headings get
+the client's ids (slugify(textContent) + "-" + index over h1–h4), so
+anchors and scroll spy are unchanged. With Pygments installed, fenced
+code with a known language is highlighted here too, emitting
+highlight.js class names so the theme colours apply; other blocks are
+left for hljs in the browser.
+
+Raw HTML in the markdown is sanitized per token (script-like elements,
+<style> blocks, event-handler attributes and script URLs are dropped); markdown-it's own
+output is escaped and link-validated already. Results are cached by the
+caller's key (file path + change_key) in a byte-bounded LRU;
+prerender() fills it on a background thread, since markdown-it-py runs
+at roughly half a megabyte a second.
+
+Plugins are optional as well: without mdit-py-plugins there are no
+footnotes or task lists, without linkify-it-py no bare-URL links.
+"""
+
+import collections
+import concurrent.futures
+import functools
+import html
+import re
+import sys
+import threading
+from html.parser import HTMLParser
+
+try:
+    from markdown_it import MarkdownIt
+except ImportError:
+    MarkdownIt = None
+
+try:
+    from mdit_py_plugins.footnote import footnote_plugin
+    from mdit_py_plugins.tasklists import tasklists_plugin
+except ImportError:
+    footnote_plugin = tasklists_plugin = None
+
+try:
+    import linkify_it  # noqa: F401 — markdown-it's linkify option needs it
+    _LINKIFY = True
+except ImportError:
+    _LINKIFY = False
+
+try:
+    from pygments import lex
+    from pygments.lexers import get_lexer_by_name
+    from pygments.token import Token
+    from pygments.util import ClassNotFound
+except ImportError:
+    lex = None
+
+AVAILABLE = MarkdownIt is not None
+
+RENDER_CACHE_BYTES = 32 * 1024 * 1024
+_cache = collections.OrderedDict()  # caller key → (result, size)
+_cache_size = 0
+_pending = set()  # keys queued for prerender()
+_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+# Pandoc image attributes — ![alt](fig.pdf){width=100%} — as render.js strips them
+_PANDOC_ATTR_RE = re.compile(r'(!\[[^\]]*\]\([^)\n]*\))\{[^}\n]*\}')
+_HEADING_RE = re.compile(r'<h([1-4])(\s[^>]*)?>(.*?)</h\1>', re.S | re.I)
+_ID_ATTR_RE = re.compile(r'\sid\s*=\s*("[^"]*"|\'[^\']*\'|[^\s>]+)', re.I)
+_TAG_RE = re.compile(r'<[^>]*>')
+_SLUG_RE = re.compile(r'[^\w]+', re.A)  # JS \w is ASCII-only
+
+# Elements dropped with everything inside them. <style> is among them:
+# HTMLParser reads its content as raw text, but inside <svg>/<math> a
+# browser parses it as markup, so nothing in it could be passed through
+_DROP = {"script", "style", "iframe", "object", "embed", "frame", "frameset",
+         "base", "meta", "link", "applet", "noscript",
+         "set", "animate", "animatemotion", "animatetransform"}
+# Dropped tags that have no content to skip (void, or usually left
+# unclosed — SVG animation can write a script URL into any attribute)
+_DROP_TAG_ONLY = {"base", "meta", "link",
+                  "set", "animate", "animatemotion", "animatetransform"}
+_URL_ATTRS = {"href", "src", "action", "formaction", "xlink:href",
+              "poster", "background", "data"}
+_SCRIPT_URL_RE = re.compile(r'^(javascript|vbscript|data(?!:image/(?!svg))):', re.I)
+_CONTROL_RE = re.compile(r'[\x00-\x20]+')
+
+# Pygments token type → highlight.js class suffix(es); the nearest
+# listed ancestor of a token type wins
+_HLJS_CLASSES = {} if lex is None else {
+    Token.Keyword: "keyword",
+    Token.Keyword.Constant: "literal",
+    Token.Keyword.Type: "type",
+    Token.Name.Builtin: "built_in",
+    Token.Name.Function: "title function_",
+    Token.Name.Class: "title class_",
+    Token.Name.Exception: "title class_",
+    Token.Name.Decorator: "meta",
+    Token.Name.Tag: "name",
+    Token.Name.Attribute: "attr",
+    Token.Name.Variable: "variable",
+    Token.Name.Constant: "variable constant_",
+    Token.Name.Label: "symbol",
+    Token.Name.Entity: "symbol",
+    Token.Literal: "literal",
+    Token.Literal.String: "string",
+    Token.Literal.String.Regex: "regexp",
+    Token.Literal.String.Symbol: "symbol",
+    Token.Literal.Number: "number",
+    Token.Literal.Date: "number",
+    Token.Operator: "operator",
+    Token.Operator.Word: "keyword",
+    Token.Punctuation: "punctuation",
+    Token.Comment: "comment",
+    Token.Comment.Preproc: "meta",
+    Token.Comment.Special: "doctag",
+    Token.Generic.Deleted: "deletion",
+    Token.Generic.Inserted: "addition",
+    Token.Generic.Heading: "section",
+    Token.Generic.Subheading: "section",
+    Token.Generic.Emph: "emphasis",
+    Token.Generic.Strong: "strong",
+}
+
+
+def _hljs_class(ttype):
+    while ttype is not None:
+        cls = _HLJS_CLASSES.get(ttype)
+        if cls is not None:
+            return cls
+        ttype = ttype.parent
+    return None
+
+
+@functools.lru_cache(maxsize=64)
+def _lexer(lang):
+    try:
+        return get_lexer_by_name(lang, stripnl=False, ensurenl=False)
+    except ClassNotFound:
+        return None
+
+
+def _highlight(code, lang, attrs):
+    """markdown-it highlight hook: a complete <pre> block, or "" to fall
+    back to plain output (unknown language, or Pygments missing)."""
+    if lex is None or not lang:
+        return ""
+    lexer = _lexer(lang.lower())
+    if lexer is None:
+        return ""
+    out = []
+    run_cls, run = None, []
+    for ttype, text in lex(code, lexer):
+        cls = _hljs_class(ttype)
+        if cls != run_cls and run:
+            out.append(_span(run_cls, "".join(run)))
+            run = []
+        run_cls = cls
+        run.append(text)
+    if run:
+        out.append(_span(run_cls, "".join(run)))
+    lang_cls = html.escape(lang)
+    return f'<pre><code class="hljs language-{lang_cls}">{"".join(out)}</code></pre>'
+
+
+def _span(cls, text):
+    text = html.escape(text, quote=False)
+    if cls is None:
+        return text
+    first, _, rest = cls.partition(" ")
+    return f'<span class="hljs-{first}{" " + rest if rest else ""}">{text}</span>'
+
+
+class _Sanitizer(HTMLParser):
+    """Re-emit an HTML fragment without active content."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.out = []
+        self.dropping = []  # stack of dropped elements still open
+
+    def handle_starttag(self, tag, attrs):
+        self._tag(tag, attrs, "")
+
+    def handle_startendtag(self, tag, attrs):
+        self._tag(tag, attrs, " /")
+
+    def _tag(self, tag, attrs, close):
+        if tag in _DROP:
+            if not close and tag not in _DROP_TAG_ONLY:
+                self.dropping.append(tag)
+            return
+        if self.dropping:
+            return
+        kept = []
+        for name, value in attrs:
+            if name.startswith("on") or name in ("srcdoc", "formaction"):
+                continue
+            if value is None:
+                kept.append(f" {name}")
+                continue
+            # Browsers ignore control characters and spaces inside a scheme
+            if name in _URL_ATTRS and _SCRIPT_URL_RE.match(_CONTROL_RE.sub("", value)):
+                continue
+            kept.append(f' {name}="{html.escape(value)}"')
+        self.out.append(f"<{tag}{''.join(kept)}{close}>")
+
+    def handle_endtag(self, tag):
+        if self.dropping:
+            if tag == self.dropping[-1]:
+                self.dropping.pop()
+            return
+        if tag not in _DROP:
+            self.out.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.out.append(data.replace("<", "&lt;"))
+
+    def handle_entityref(self, name):
+        if not self.dropping:
+            self.out.append(f"&{name};")
+
+    def handle_charref(self, name):
+        if not self.dropping:
+            self.out.append(f"&#{name};")
+
+
+def sanitize(fragment):
+    """`fragment` without scripts, event handlers or script URLs."""
+    parser = _Sanitizer()
+    parser.feed(fragment)
+    parser.close()
+    return "".join(parser.out)
+
+
+def _footnote_ref(self, tokens, idx, options, env):
+    meta = tokens[idx].meta
+    label = html.escape(str(meta.get("label") or meta["id"] + 1))
+    n = meta["id"] + 1
+    sub = f"-{meta['subId']}" if meta.get("subId", -1) > 0 else ""
+    return (f'<sup><a id="footnote-ref-{label}{sub}" href="#footnote-{label}" '
+            f'data-footnote-ref aria-describedby="footnote-label">{n}</a></sup>')
+
+
+def _footnote_block_open(self, tokens, idx, options, env):
+    return ('<section class="footnotes" data-footnotes>\n'
+            '<h2 id="footnote-label" class="sr-only">Footnotes</h2>\n<ol>\n')
+
+
+def _footnote_open(self, tokens, idx, options, env):
+    meta = tokens[idx].meta
+    label = html.escape(str(meta.get("label") or meta["id"] + 1))
+    return f'<li id="footnote-{label}">\n'
+
+
+def _footnote_anchor(self, tokens, idx, options, env):
+    meta = tokens[idx].meta
+    label = html.escape(str(meta.get("label") or meta["id"] + 1))
+    sub = f"-{meta['subId']}" if meta.get("subId", -1) > 0 else ""
+    return (f' <a href="#footnote-ref-{label}{sub}" data-footnote-backref '
+            f'aria-label="Back to reference {label}">↩</a>')
+
+
+def _raw_html(self, tokens, idx, options, env):
+    return sanitize(tokens[idx].content)
+
+
+def _build():
+    md = MarkdownIt("commonmark", {"html": True, "linkify": _LINKIFY,
+                                   "highlight": _highlight})
+    md.enable(["table", "strikethrough"])
+    if _LINKIFY:
+        md.enable("linkify")
+    if footnote_plugin is not None:
+        md.use(footnote_plugin).use(tasklists_plugin)
+        md.add_render_rule("footnote_ref", _footnote_ref)
+        md.add_render_rule("footnote_block_open", _footnote_block_open)
+        md.add_render_rule("footnote_open", _footnote_open)
+        md.add_render_rule("footnote_anchor", _footnote_anchor)
+    md.add_render_rule("html_block", _raw_html)
+    md.add_render_rule("html_inline", _raw_html)
+    return md
+
+
+_md = _build() if AVAILABLE else None
+
+
+def _slugify(text):
+    return _SLUG_RE.sub("-", text.lower()).strip("-")
+
+
+def render(markdown_text):
+    """{"html", "toc": [{"level", "id", "text"}]} for a markdown body
+    (frontmatter already stripped). Raises RuntimeError when
+    markdown-it-py is not installed."""
+    if _md is None:
+        raise RuntimeError("server-side rendering needs markdown-it-py")
+    body = _md.render(_PANDOC_ATTR_RE.sub(r"\1", markdown_text))
+    toc = []
+
+    def number(m):
+        text = html.unescape(_TAG_RE.sub("", m.group(3)))
+        heading_id = f"{_slugify(text)}-{len(toc)}"
+        toc.append({"level": int(m.group(1)), "id": heading_id, "text": text})
+        attrs = _ID_ATTR_RE.sub("", m.group(2) or "")
+        return f'<h{m.group(1)} id="{html.escape(heading_id)}"{attrs}>{m.group(3)}</h{m.group(1)}>'
+
+    return {"html": _HEADING_RE.sub(number, body), "toc": toc}
+
+
+def cached(key):
+    """The cached render() result for `key`, or None."""
+    with _lock:
+        hit = _cache.get(key)
+        if hit is None:
+            return None
+        _cache.move_to_end(key)
+        return hit[0]
+
+
+def _store(key, result):
+    global _cache_size
+    size = len(result["html"]) + sum(len(h["text"]) + 96 for h in result["toc"]) + 256
+    if size > RENDER_CACHE_BYTES // 4:  # one giant document must not flush the rest
+        return
+    with _lock:
+        old = _cache.pop(key, None)
+        if old is not None:
+            _cache_size -= old[1]
+        _cache[key] = (result, size)
+        _cache_size += size
+        while _cache_size > RENDER_CACHE_BYTES:
+            _, (_, dropped) = _cache.popitem(last=False)
+            _cache_size -= dropped
+
+
+def cached_render(key, load):
+    """render() through an LRU cache keyed by `key` (which must name the
+    exact text, e.g. (path, change_key)); `load()` returns the markdown
+    and is only called on a miss."""
+    result = cached(key)
+    if result is None:
+        result = render(load())
+        _store(key, result)
+    return result
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Rendering is CPU-bound Python: one worker, so a burst of
+            # saves queues up instead of contending for the GIL
+            _pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="dabarat-render")
+        return _pool
+
+
+def prerender(key, load, done=None):
+    """Queue cached_render(key, load) on a background thread unless the
+    result is cached or already queued; done() runs once it is stored."""
+    if cached(key) is not None:
+        return
+    with _lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+
+    def job():
+        try:
+            cached_render(key, load)
+        except Exception as e:
+            print(f"Warning: server-side render failed ({e!r})", file=sys.stderr)
+            return
+        finally:
+            with _lock:
+                _pending.discard(key)
+        if done:
+            done()
+
+    _get_pool().submit(job)
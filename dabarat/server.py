@@ -1,22 +1,31 @@
 """HTTP server — serves the HTML shell and API endpoints."""
 
+import collections
 import datetime
+import gzip
 import http.server
 import json
 import mimetypes
 import os
+import queue
 import sys
 import threading
 import time
 import uuid
+import zlib
 from urllib.parse import urlparse, parse_qs, unquote
 
 from . import annotations
 from . import bookmarks
+from . import dirindex
 from . import frontmatter
 from . import history
 from . import recent
+from . import render
+from . import watcher
 from . import workspace
+from . import template
+from . import vendor
 from .template import get_html
 
 # Ceiling on hook-pushed (auto=True) tabs per window; user-opened tabs
@@ -27,9 +36,19 @@ MAX_AUTO_TABS = int(
     or 30)
 
 
-_browse_cache = {}  # keyed by (dirpath, max_mtime, file_count) → response dict
+_browse_cache = {}  # dirpath → (dirindex signature, response dict)
 _browse_cache_lock = threading.Lock()
 _BROWSE_CACHE_MAX = 20
+_STREAM_BATCH = 500  # version records per NDJSON chunk
+
+# JSON bodies at least this large are compressed for clients that accept
+# it; below it the codec header costs about what it saves
+COMPRESS_MIN_BYTES = 2048
+_COMPRESS_LEVEL = 6
+_COMPRESSED_CACHE_BYTES = 16 * 1024 * 1024
+_compressed_cache = collections.OrderedDict()  # (key, coding) → bytes
+_compressed_cache_size = 0
+_compressed_cache_lock = threading.Lock()
 
 _active_workspace_path = None  # Path to the active .dabarat-workspace file
 _active_workspace = None       # Parsed workspace dict (or None)
@@ -45,15 +64,35 @@ _VALID_THEMES = {
 }
 
 
+_config_cache = None  # ((st_mtime_ns, st_size, st_ino), text)
+
+
 def _read_config():
+    """config.json as a fresh dict. The text is re-read only when the
+    file's stat changes (_write_config replaces it, so it always does);
+    every call parses its own copy, so callers may mutate the result."""
+    global _config_cache
     try:
-        with open(_CONFIG_PATH) as f:
-            data = json.loads(f.read(8192))
-            return data if isinstance(data, dict) else {}
+        st = os.stat(_CONFIG_PATH)
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        cached = _config_cache
+        if cached is not None and cached[0] == key:
+            text = cached[1]
+        else:
+            with open(_CONFIG_PATH) as f:
+                text = f.read(8192)
+            _config_cache = (key, text)
+        data = json.loads(text)
+        return data if isinstance(data, dict) else {}
     except (FileNotFoundError, json.JSONDecodeError, OSError):
         return {}
 
 
+def _server_render_enabled():
+    """serverRender is opt-in (config.json) and needs markdown-it-py."""
+    return render.AVAILABLE and _read_config().get("serverRender") is True
+
+
 def _write_config(data):
     import tempfile
     config_dir = os.path.dirname(_CONFIG_PATH)
@@ -77,6 +116,10 @@ def _write_config(data):
 
 def _notify_tabs_changed():
     global _tabs_changed_warned
+    _sync_watcher()
+    with PreviewHandler._tabs_lock:
+        ids = list(PreviewHandler._tabs)
+    _feed_publish("tabs", {"ids": ids})
     cb = _on_tabs_changed
     if cb:
         try:
@@ -90,6 +133,180 @@ def _notify_tabs_changed():
                 print(f"Warning: tab-state persistence failing ({e!r})", file=sys.stderr)
 
 
+# ── Change feed (Server-Sent Events) ────────────────────────────────────
+# The file watcher (one thread per server) observes every open tab and
+# its annotation sidecar; its listener pushes an event only when a key
+# actually changes, so idle windows hold an open stream instead of
+# re-fetching whole documents.
+
+_FEED_HEARTBEAT_S = 15      # comment line keeps proxies/tunnels from idling out
+_FEED_QUEUE_MAX = 256
+
+_feed_subscribers = set()   # one queue.Queue per open /api/events stream
+_feed_lock = threading.Lock()
+
+_watcher = watcher.FileWatcher()
+
+
+def _file_state(filepath):
+    """(change_key, file_missing, stat_error) — from the watcher when it
+    is tracking the path, otherwise from a stat."""
+    return _watcher.state(filepath) or watcher.stat_state(filepath)
+
+
+def _sidecar_mtime(filepath):
+    """Annotation sidecar mtime — same value annotations.read() reports."""
+    try:
+        return os.path.getmtime(annotations.get_path(filepath))
+    except OSError:
+        return 0
+
+
+def _feed_state(filepath):
+    key, missing, error = _file_state(filepath)
+    state = {"changeKey": key, "fileMissing": missing}
+    if error:
+        state["statError"] = error
+    return state
+
+
+def _feed_publish(event, data):
+    """Fan an event out to every subscriber. A subscriber whose queue is
+    full has fallen behind — drop its backlog and tell it to resync
+    rather than block the watcher on one slow client."""
+    with _feed_lock:
+        subscribers = list(_feed_subscribers)
+    for q in subscribers:
+        try:
+            q.put_nowait((event, data))
+        except queue.Full:
+            try:
+                while True:
+                    q.get_nowait()
+            except queue.Empty:
+                pass
+            q.put_nowait(("resync", {}))
+
+
+def _on_files_changed(paths):
+    """Watcher listener: map changed paths back to tabs and publish."""
+    with _feed_lock:
+        if not _feed_subscribers:
+            return
+    with PreviewHandler._tabs_lock:
+        snapshot = [(tid, t["filepath"]) for tid, t in PreviewHandler._tabs.items()]
+    for tid, filepath in snapshot:
+        if filepath in paths:
+            _feed_publish("change", dict(_feed_state(filepath), tab=tid))
+        if annotations.get_path(filepath) in paths:
+            _feed_publish("annotations",
+                          {"tab": tid, "mtime": _sidecar_mtime(filepath)})
+
+
+_watcher.add_listener(_on_files_changed)
+
+
+def _sync_watcher():
+    """Point the watcher at the current tab set (documents + sidecars)."""
+    with PreviewHandler._tabs_lock:
+        filepaths = [t["filepath"] for t in PreviewHandler._tabs.values()]
+    _watcher.set_paths(filepaths + [annotations.get_path(fp) for fp in filepaths])
+
+
+def _feed_subscribe():
+    q = queue.Queue(maxsize=_FEED_QUEUE_MAX)
+    with _feed_lock:
+        _feed_subscribers.add(q)
+    return q
+
+
+def _feed_unsubscribe(q):
+    with _feed_lock:
+        _feed_subscribers.discard(q)
+
+
+def _browse_header(dir_path):
+    return {
+        "path": dir_path,
+        "parent": os.path.dirname(dir_path) if dir_path != "/" else None,
+        "dirname": os.path.basename(dir_path) or dir_path,
+    }
+
+
+def _browse_cache_put(dir_path, signature, result):
+    """Cache a browse-dir result (bounded, thread-safe)."""
+    with _browse_cache_lock:
+        _browse_cache.pop(dir_path, None)
+        if len(_browse_cache) >= _BROWSE_CACHE_MAX:
+            try:
+                oldest = next(iter(_browse_cache))
+                del _browse_cache[oldest]
+            except StopIteration:
+                pass
+        _browse_cache[dir_path] = (signature, result)
+
+
+def _compress(body, coding, cache_key=None):
+    """gzip or zlib-deflate `body`. With a cache_key (which must name the
+    exact body, e.g. a file path plus its change_key) the compressed
+    bytes are kept in a byte-bounded LRU, so re-serving an unchanged
+    multi-MB document skips the compressor."""
+    global _compressed_cache_size
+    key = (cache_key, coding)
+    if cache_key is not None:
+        with _compressed_cache_lock:
+            data = _compressed_cache.get(key)
+            if data is not None:
+                _compressed_cache.move_to_end(key)
+                return data
+    if coding == "gzip":
+        data = gzip.compress(body, _COMPRESS_LEVEL, mtime=0)
+    else:
+        data = zlib.compress(body, _COMPRESS_LEVEL)
+    if cache_key is not None and len(data) <= _COMPRESSED_CACHE_BYTES // 4:
+        with _compressed_cache_lock:
+            old = _compressed_cache.pop(key, None)
+            if old is not None:
+                _compressed_cache_size -= len(old)
+            _compressed_cache[key] = data
+            _compressed_cache_size += len(data)
+            while _compressed_cache_size > _COMPRESSED_CACHE_BYTES:
+                _, evicted = _compressed_cache.popitem(last=False)
+                _compressed_cache_size -= len(evicted)
+    return data
+
+
+def _add_version_info(entries):
+    """Attach versionCount/headVersion to card entries (in place), from
+    one batched history lookup. Returns the entries that gained a count."""
+    infos = recent._version_infos([e["path"] for e in entries])
+    versioned = []
+    for entry in entries:
+        vc, head = infos.get(entry["path"], (0, None))
+        if vc:
+            entry["versionCount"] = vc
+            entry["headVersion"] = head
+            versioned.append(entry)
+    return versioned
+
+
+def _file_card(file_path):
+    """Home-screen card fields for one file, versions excluded (callers
+    batch those through _add_version_info); {"path", "error"} if gone."""
+    if not os.path.isfile(file_path):
+        return {"path": file_path, "error": "file not found"}
+    file_path = os.path.abspath(file_path)
+    entry = {"path": file_path, "name": os.path.basename(file_path)}
+    try:
+        st = os.stat(file_path)
+        entry["size"] = st.st_size
+        entry["mtime"] = st.st_mtime
+    except Exception:
+        pass
+    entry.update(dirindex.extract(file_path, entry.get("size", 0)))
+    return entry
+
+
 class PreviewHandler(http.server.BaseHTTPRequestHandler):
     _tabs = {}
     _tabs_lock = threading.Lock()
@@ -125,6 +342,8 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
                 "content": "",
                 "mtime": 0,
                 "change_key": None,
+                "frontmatter": {},
+                "body": "",
                 "auto": bool(auto),
             }
             if auto:
@@ -170,6 +389,7 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
         failure the previous cache metadata is kept rather than fabricated.
         Returns (mtime, change_key).
         """
+        fm, body = frontmatter.parse_frontmatter_text(content)
         if st is None:
             try:
                 st = os.stat(filepath)
@@ -185,6 +405,8 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
                 mtime, change_key = 0, "0:0"
             if tab:
                 tab["content"] = content
+                tab["frontmatter"] = fm
+                tab["body"] = body
                 tab["mtime"] = mtime
                 tab["change_key"] = change_key
                 tab["auto"] = False  # the user saved it — it is theirs now
@@ -195,9 +417,11 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
         """Re-read the file into the tab cache if it changed on disk.
 
         Change detection uses st_mtime_ns + size (float mtime equality can
-        miss sub-second rewrites). File I/O runs outside the lock; the
-        write-back re-checks the tab still exists. Returns a snapshot dict
-        of the tab, or None if the tab is gone.
+        miss sub-second rewrites). File I/O and the frontmatter parse run
+        outside the lock — once per change, so /api/content serves the
+        cached split instead of re-parsing on every poll; the write-back
+        re-checks the tab still exists. Returns a snapshot dict of the
+        tab, or None if the tab is gone.
         """
         with cls._tabs_lock:
             tab = cls._tabs.get(tab_id)
@@ -207,6 +431,20 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
             change_key = tab.get("change_key")
         file_missing = False
         file_error = None
+        # One stat per request; the open + read is skipped when the file
+        # has not moved on since we cached it. (The watcher's state is not
+        # used here: it lags a write by its debounce and thread wakeup.)
+        if change_key is not None:
+            key, missing, _ = watcher.stat_state(filepath)
+            if missing or key == change_key:
+                with cls._tabs_lock:
+                    tab = cls._tabs.get(tab_id)
+                    if tab is None:
+                        return None
+                    snap = dict(tab)
+                snap["file_missing"] = missing
+                snap["file_error"] = None
+                return snap
         try:
             # fstat + read from one descriptor so content and change_key
             # always describe the same file version (a concurrent atomic
@@ -216,6 +454,7 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
                 new_key = f"{st.st_mtime_ns}:{st.st_size}"
                 content = f.read() if new_key != change_key else None
             if content is not None:
+                fm, body = frontmatter.parse_frontmatter_text(content)
                 with cls._tabs_lock:
                     tab = cls._tabs.get(tab_id)
                     if tab is None:
@@ -225,6 +464,8 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
                     # a different (possibly newer) version wins
                     if tab.get("change_key") == change_key:
                         tab["content"] = content
+                        tab["frontmatter"] = fm
+                        tab["body"] = body
                         tab["mtime"] = st.st_mtime
                         tab["change_key"] = new_key
                         accepted = True
@@ -235,7 +476,8 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
                         accepted = False
                 # Externally-changed content becomes a version the moment
                 # polling observes it — every change to an open file is
-                # revertible no matter who wrote it (dedups by hash)
+                # revertible no matter who wrote it (dedups by hash). The
+                # write is queued: this poll never waits on SQLite
                 if accepted:
                     history.snapshot_external(filepath, content)
         except FileNotFoundError:
@@ -268,14 +510,204 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
         except (json.JSONDecodeError, ValueError):
             return {}
 
-    def _json_response(self, data, status=200):
+    def _json_response(self, data, status=200, headers=None, cache_key=None):
+        """Send `data` as JSON, gzip/deflate-compressed when it is large
+        and the client accepts it. `cache_key` (see _compress) lets an
+        unchanged body reuse its compressed bytes."""
+        body = json.dumps(data, default=str).encode()
+        coding = None
+        if len(body) >= COMPRESS_MIN_BYTES:
+            accepted = self._accepted_encodings()
+            if "gzip" in accepted:
+                coding = "gzip"
+            elif "deflate" in accepted:
+                coding = "deflate"
+            if coding:
+                body = _compress(body, coding, cache_key)
         self.send_response(status)
         self.send_header("Content-Type", "application/json")
         self.send_header("Cache-Control", "no-cache")
         self.send_header("X-Content-Type-Options", "nosniff")
         self.send_header("X-Frame-Options", "DENY")
+        if coding:
+            self.send_header("Content-Encoding", coding)
+        if len(body) >= COMPRESS_MIN_BYTES or coding:
+            self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
-        self.wfile.write(json.dumps(data, default=str).encode())
+        self.wfile.write(body)
+
+    def _not_modified(self, etag):
+        """Answer a matching conditional GET: 304, validator, no body."""
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+    def _etag_matches(self, etag):
+        """If-None-Match check (weak comparison, per RFC 9110 §13.1.2)."""
+        header = self.headers.get("If-None-Match")
+        if not header:
+            return False
+        if header.strip() == "*":
+            return True
+        candidates = [t.strip().removeprefix("W/") for t in header.split(",")]
+        return etag in candidates
+
+    @staticmethod
+    def _content_etag(tab, rendered=False):
+        """Strong validator for an /api/content response.
+
+        change_key alone names the content; the ghost/error flags ride
+        along because they change the response body without changing
+        the key (a deleted file keeps serving its cached version), and
+        so does whether the server-rendered HTML is included.
+        """
+        etag = tab.get("change_key") or "0:0"
+        if tab.get("file_missing"):
+            etag += ";missing"
+        if tab.get("file_error"):
+            etag += ";error=" + tab["file_error"]
+        if rendered:
+            etag += ";rendered"
+        return f'"{etag}"'
+
+    @staticmethod
+    def _render_source(tab):
+        """(cache key, markdown) the client would render for a tab."""
+        text = tab["body"] if tab["frontmatter"] else tab["content"]
+        return (tab["filepath"], tab.get("change_key") or "0:0"), text
+
+    def _serve_change_feed(self):
+        """Stream tab change events as text/event-stream until the client
+        disconnects. Opens with a snapshot of every tab's key so a
+        reconnecting client resyncs without a separate round trip."""
+        q = _feed_subscribe()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("X-Content-Type-Options", "nosniff")
+            self.end_headers()
+            with self._tabs_lock:
+                snapshot = [(tid, t["filepath"]) for tid, t in self._tabs.items()]
+            tabs_state = {
+                tid: dict(_feed_state(filepath),
+                          annotationsMtime=_sidecar_mtime(filepath))
+                for tid, filepath in snapshot
+            }
+            self._write_event("snapshot", {"tabs": tabs_state})
+            while True:
+                try:
+                    event, data = q.get(timeout=_FEED_HEARTBEAT_S)
+                except queue.Empty:
+                    self.wfile.write(b": ping\n\n")
+                    self.wfile.flush()
+                    continue
+                self._write_event(event, data)
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass  # client went away — normal end of a stream
+        finally:
+            _feed_unsubscribe(q)
+
+    def _serve_browse_stream(self, dir_path):
+        """/api/browse-dir?stream=1 — the listing as NDJSON, progressively.
+
+        Record kinds, one JSON object per line: "header" (path, parent,
+        dirname), "entries" (the full sorted listing — stat fields plus
+        whatever the directory index already knew), then "meta" records
+        ({path, ...fields}) merging card fields and version counts into an
+        entry as they are computed, and finally "done" with the folder
+        stats (or "error"). The first card can render after one scandir,
+        however many files still need reading.
+        """
+        steps = dirindex.scan_iter(dir_path)
+        try:
+            _, entries = next(steps)
+        except PermissionError:
+            self._json_response({"error": "permission denied"}, 403)
+            return
+        except Exception as e:
+            self._json_response({"error": str(e)}, 500)
+            return
+        self._start_stream("application/x-ndjson")
+        try:
+            self._write_records(
+                dict(_browse_header(dir_path), kind="header"),
+                {"kind": "entries", "entries": entries})
+            signature = stats = None
+            for step in steps:
+                if step[0] == "meta":
+                    self._write_records(dict(step[2], kind="meta", path=step[1]))
+                else:
+                    _, signature, stats = step
+            with _browse_cache_lock:
+                cached = _browse_cache.get(dir_path)
+            if cached is not None and cached[0] == signature:
+                versioned = cached[1]["entries"]
+            else:
+                versioned = _add_version_info(
+                    [e for e in entries if e["type"] == "file"])
+                _browse_cache_put(dir_path, signature, dict(
+                    _browse_header(dir_path), stats=stats, entries=entries))
+            for i in range(0, len(versioned), _STREAM_BATCH):
+                self._write_version_records(versioned[i:i + _STREAM_BATCH])
+            self._write_records({"kind": "done", "stats": stats})
+        except (BrokenPipeError, ConnectionResetError):
+            steps.close()
+            return
+        except Exception as e:
+            try:
+                self._write_records({"kind": "error", "error": str(e)})
+            except OSError:
+                return
+        self._end_stream()
+
+    def _write_version_records(self, entries):
+        records = [{"kind": "meta", "path": e["path"],
+                    "versionCount": e["versionCount"],
+                    "headVersion": e["headVersion"]}
+                   for e in entries if e.get("versionCount")]
+        if records:
+            self._write_records(*records)
+
+    def _start_stream(self, content_type):
+        """Begin a response whose length is unknown: chunked transfer for
+        HTTP/1.1 clients, close-delimited for HTTP/1.0 ones."""
+        self._chunked = self.request_version == "HTTP/1.1"
+        if self._chunked:
+            self.protocol_version = "HTTP/1.1"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Content-Type-Options", "nosniff")
+        if self._chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+    def _write_records(self, *records):
+        """Send NDJSON records as one chunk."""
+        data = "".join(json.dumps(r, default=str) + "\n" for r in records).encode()
+        if self._chunked:
+            data = b"%x\r\n%s\r\n" % (len(data), data)
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    def _end_stream(self):
+        if self._chunked:
+            try:
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            except OSError:
+                pass
+
+    def _write_event(self, event, data):
+        self.wfile.write(
+            f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode())
+        self.wfile.flush()
 
     def _check_origin(self):
         """Reject POST/PUT/DELETE from foreign origins (CSRF protection)."""
@@ -302,11 +734,27 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
             tab_id = params.get("tab", [None])[0]
             tab = self._refresh_tab(tab_id) if tab_id else None
             if tab:
+                # Opt-in server rendering: the prepared HTML rides along
+                # once cached; a miss renders in the background and
+                # announces itself on the change feed
+                rendered = None
+                if _server_render_enabled():
+                    key, text = self._render_source(tab)
+                    rendered = render.cached(key)
+                    if rendered is None:
+                        render.prerender(key, lambda: text, done=lambda: _feed_publish(
+                            "rendered", {"tab": tab_id, "changeKey": key[1]}))
+                # A client already holding this version gets a bodyless
+                # 304 — no frontmatter parse, no serialization, no decode
+                etag = self._content_etag(tab, rendered is not None)
+                if self._etag_matches(etag):
+                    self._not_modified(etag)
+                    return
                 # content is always the raw file (the editor round-trips it);
                 # body is the frontmatter-stripped markdown for rendering.
-                # Parse from the snapshot itself — a separate file read could
-                # return a different version than the snapshot's content
-                fm, body = frontmatter.parse_frontmatter_text(tab["content"])
+                # Both were split from this exact content when it was cached
+                # (_refresh_tab/_update_tab_content), so they never mix versions
+                fm, body = tab["frontmatter"], tab["body"]
                 response = {
                     "content": tab["content"],
                     "frontmatter": fm,
@@ -319,10 +767,45 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
                     response["fileMissing"] = True
                 if tab.get("file_error"):
                     response["fileError"] = tab["file_error"]
-                self._json_response(response)
+                if rendered is not None:
+                    response["rendered"] = {"html": rendered["html"],
+                                            "changeKey": response["changeKey"]}
+                # The etag names this body for this file, so the
+                # compressed bytes of an unchanged document are reused
+                self._json_response(response, headers={"ETag": etag},
+                                    cache_key=(tab["filepath"], etag))
             else:
                 self._json_response({"error": "tab not found"}, 404)
 
+        elif parsed.path == "/api/events":
+            self._serve_change_feed()
+
+        elif parsed.path == "/api/render":
+            # Headless/PDF use: render now (or from cache) regardless of
+            # the serverRender preference
+            tab_id = params.get("tab", [None])[0]
+            tab = self._refresh_tab(tab_id) if tab_id else None
+            if not tab:
+                self._json_response({"error": "tab not found"}, 404)
+                return
+            if not render.AVAILABLE:
+                self._json_response(
+                    {"error": "server-side rendering needs markdown-it-py"}, 501)
+                return
+            etag = self._content_etag(tab, True)
+            if self._etag_matches(etag):
+                self._not_modified(etag)
+                return
+            key, text = self._render_source(tab)
+            try:
+                result = render.cached_render(key, lambda: text)
+            except Exception as e:
+                self._json_response({"error": str(e)}, 500)
+                return
+            self._json_response(dict(result, changeKey=key[1]),
+                                headers={"ETag": etag},
+                                cache_key=("render",) + key)
+
         elif parsed.path == "/api/mtime":
             # Lightweight change probe (stat only, no file read) — used by
             # edit mode to watch for external modifications while full
@@ -400,6 +883,12 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
         elif parsed.path == "/api/recent":
             try:
                 entries = recent.load()
+                # recent.json only refreshes counts on open/save; external
+                # snapshots since then are picked up here in one query
+                infos = recent._version_infos([e["path"] for e in entries])
+                for entry in entries:
+                    if entry["path"] in infos:
+                        entry["versionCount"], entry["headVersion"] = infos[entry["path"]]
                 self._json_response({"entries": entries})
             except Exception as e:
                 self._json_response({"entries": [], "error": str(e)})
@@ -425,76 +914,17 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
                 self._json_response({"workspaces": [], "error": str(e)})
 
         elif parsed.path == "/api/file-metadata":
-            file_path = params.get("path", [None])[0]
-            if not file_path or not os.path.isfile(file_path):
+            # ?path=a&path=b… batches pinned-file cards into one request,
+            # built concurrently; a single path keeps the flat response
+            paths = [p for p in params.get("path", []) if p]
+            entries = dirindex.parallel_map(_file_card, paths)
+            _add_version_info([e for e in entries if "error" not in e])
+            if len(paths) > 1:
+                self._json_response({"entries": entries})
+            elif not entries or "error" in entries[0]:
                 self._json_response({"error": "file not found"}, 404)
-                return
-            file_path = os.path.abspath(file_path)
-            entry = {"path": file_path, "name": os.path.basename(file_path)}
-            try:
-                st = os.stat(file_path)
-                entry["size"] = st.st_size
-                entry["mtime"] = st.st_mtime
-            except Exception:
-                pass
-            try:
-                tags = annotations.read_tags(file_path)
-                if tags:
-                    entry["tags"] = tags
-            except Exception:
-                pass
-            try:
-                ann_data, _ = annotations.read(file_path)
-                ac = len(ann_data.get("annotations", []))
-                if ac:
-                    entry["annotationCount"] = ac
-            except Exception:
-                pass
-            try:
-                fm, _ = frontmatter.get_frontmatter(file_path)
-                if fm:
-                    badges = {}
-                    for k in ("type", "model", "version", "status", "description", "summary"):
-                        if k in fm:
-                            badges[k] = str(fm[k])
-                    if badges:
-                        entry["badges"] = badges
-            except Exception:
-                pass
-            file_small = entry.get("size", 0) < 1024 * 1024
-            if file_small:
-                try:
-                    wc = recent._extract_word_count(file_path)
-                    if wc:
-                        entry["wordCount"] = wc
-                except Exception:
-                    pass
-                try:
-                    s = recent._extract_summary(file_path)
-                    if s:
-                        entry["summary"] = s
-                except Exception:
-                    pass
-                try:
-                    p = recent._extract_preview(file_path)
-                    if p:
-                        entry["preview"] = p
-                except Exception:
-                    pass
-                try:
-                    img = recent._extract_preview_image(file_path)
-                    if img:
-                        entry["previewImage"] = img
-                except Exception:
-                    pass
-            try:
-                vc, head = recent._version_info(file_path)
-                if vc:
-                    entry["versionCount"] = vc
-                    entry["headVersion"] = head
-            except Exception:
-                pass
-            self._json_response(entry)
+            else:
+                self._json_response(entries[0])
 
         elif parsed.path == "/api/browse-dir":
             dir_path = params.get("path", [None])[0]
@@ -504,143 +934,24 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
             if not os.path.isdir(dir_path):
                 self._json_response({"error": "not a directory"}, 404)
                 return
+            if params.get("stream", ["0"])[0] == "1":
+                self._serve_browse_stream(dir_path)
+                return
             try:
-                md_exts = {".md", ".markdown", ".txt", ".mdown", ".mkd"}
-
-                # Compute max mtime + file count for cache key (count catches deletions)
-                max_mtime = 0.0
-                dir_entry_count = 0
-                try:
-                    for name in os.listdir(dir_path):
-                        if not name.startswith("."):
-                            dir_entry_count += 1
-                            try:
-                                mt = os.path.getmtime(os.path.join(dir_path, name))
-                                if mt > max_mtime:
-                                    max_mtime = mt
-                            except Exception:
-                                pass
-                except Exception:
-                    pass
-
-                cache_key = (dir_path, max_mtime, dir_entry_count)
+                # One scandir pass; only files whose (mtime_ns, size) moved
+                # since the persistent index last saw them are re-read
+                signature, entries, stats = dirindex.scan(dir_path)
                 with _browse_cache_lock:
-                    cached = _browse_cache.get(cache_key)
-                if cached is not None:
-                    self._json_response(cached)
+                    cached = _browse_cache.get(dir_path)
+                if cached is not None and cached[0] == signature:
+                    self._json_response(cached[1])
                     return
 
-                entries = []
-                total_words = 0
-                file_count = 0
-                for name in sorted(os.listdir(dir_path), key=str.lower):
-                    if name.startswith("."):
-                        continue
-                    full = os.path.join(dir_path, name)
-                    if os.path.isdir(full):
-                        md_count = 0
-                        try:
-                            for sub in os.listdir(full):
-                                if not sub.startswith("."):
-                                    _, se = os.path.splitext(sub)
-                                    if se.lower() in md_exts:
-                                        md_count += 1
-                                    if md_count >= 99:
-                                        break
-                        except Exception:
-                            pass
-                        entries.append({"name": name, "type": "dir", "path": full, "mdCount": md_count})
-                    else:
-                        _, ext = os.path.splitext(name)
-                        if ext.lower() in md_exts:
-                            entry = {"name": name, "type": "file", "path": full}
-                            file_count += 1
-                            try:
-                                st = os.stat(full)
-                                entry["size"] = st.st_size
-                                entry["mtime"] = st.st_mtime
-                            except Exception:
-                                pass
-                            # Tags + annotation count
-                            try:
-                                tags = annotations.read_tags(full)
-                                if tags:
-                                    entry["tags"] = tags
-                            except Exception:
-                                pass
-                            try:
-                                ann_data, _ = annotations.read(full)
-                                ac = len(ann_data.get("annotations", []))
-                                if ac:
-                                    entry["annotationCount"] = ac
-                            except Exception:
-                                pass
-                            # Frontmatter badges + description
-                            try:
-                                fm, _ = frontmatter.get_frontmatter(full)
-                                if fm:
-                                    badges = {}
-                                    for k in ("type", "model", "version", "status", "description", "summary"):
-                                        if k in fm:
-                                            badges[k] = str(fm[k])
-                                    if badges:
-                                        entry["badges"] = badges
-                            except Exception:
-                                pass
-                            # Rich metadata: word count, summary, preview, image, versions
-                            # Gate all file-reading extractions behind size check (< 1 MB)
-                            file_small = entry.get("size", 0) < 1024 * 1024
-                            if file_small:
-                                try:
-                                    wc = recent._extract_word_count(full)
-                                    if wc:
-                                        entry["wordCount"] = wc
-                                        total_words += wc
-                                except Exception:
-                                    pass
-                                try:
-                                    s = recent._extract_summary(full)
-                                    if s:
-                                        entry["summary"] = s
-                                except Exception:
-                                    pass
-                                try:
-                                    p = recent._extract_preview(full)
-                                    if p:
-                                        entry["preview"] = p
-                                except Exception:
-                                    pass
-                                try:
-                                    img = recent._extract_preview_image(full)
-                                    if img:
-                                        entry["previewImage"] = img
-                                except Exception:
-                                    pass
-                            try:
-                                vc, head = recent._version_info(full)
-                                if vc:
-                                    entry["versionCount"] = vc
-                                    entry["headVersion"] = head
-                            except Exception:
-                                pass
-                            entries.append(entry)
-
-                result = {
-                    "path": dir_path,
-                    "parent": os.path.dirname(dir_path) if dir_path != "/" else None,
-                    "dirname": os.path.basename(dir_path) or dir_path,
-                    "stats": {"fileCount": file_count, "totalWords": total_words},
-                    "entries": entries,
-                }
-                # Cache result (bounded, thread-safe)
-                with _browse_cache_lock:
-                    if len(_browse_cache) >= _BROWSE_CACHE_MAX:
-                        try:
-                            oldest = next(iter(_browse_cache))
-                            del _browse_cache[oldest]
-                        except StopIteration:
-                            pass
-                    _browse_cache[cache_key] = result
+                _add_version_info([e for e in entries if e["type"] == "file"])
+
+                result = dict(_browse_header(dir_path), stats=stats,
+                              entries=entries)
+                _browse_cache_put(dir_path, signature, result)
                 self._json_response(result)
             except PermissionError:
                 self._json_response({"error": "permission denied"}, 403)
@@ -658,6 +969,15 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
             except Exception as e:
                 self._json_response({"versions": [], "error": str(e)})
 
+        elif parsed.path == "/api/versions/retention":
+            # Dry run: what the background retention pass would drop now
+            policy = history.retention_policy(_read_config().get("historyRetention"))
+            try:
+                report = history.prune(policy, dry_run=True)
+                self._json_response({"policy": policy, "report": report})
+            except Exception as e:
+                self._json_response({"policy": policy, "error": str(e)}, 500)
+
         elif parsed.path == "/api/versions":
             tab_id = params.get("tab", [None])[0]
             filepath = self._tab_filepath(tab_id) if tab_id else None
@@ -741,20 +1061,29 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
             if not os.path.isfile(against_path):
                 self._json_response({"error": "file not found: " + against_path}, 404)
                 return
+            from . import diff
             left_content = tab["content"]
+            left_hash = diff.content_hash(left_content)
+            if self._diff_expand(params, left_content, left_hash):
+                return
             try:
                 with open(against_path, encoding="utf-8") as f:
                     right_content = f.read()
             except Exception as e:
                 self._json_response({"error": str(e)}, 500)
                 return
-            from . import diff
-            result = diff.prepare_diff(left_content, right_content)
+            right_hash = diff.content_hash(right_content)
+            if self._diff_stale(params, left_hash, right_hash):
+                return
+            result = diff.cached_diff(left_hash, right_hash,
+                                      lambda: (left_content, right_content))
+            result["left_hash"] = left_hash
+            result["right_hash"] = right_hash
             result["left_path"] = tab["filepath"]
             result["right_path"] = against_path
             result["left_filename"] = os.path.basename(tab["filepath"])
             result["right_filename"] = os.path.basename(against_path)
-            self._json_response(result)
+            self._send_diff(params, result)
 
         elif parsed.path == "/api/diff-version":
             # Diff a historical version (left) against current content (right)
@@ -768,19 +1097,43 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
             if not ref:
                 self._json_response({"error": "hash required"}, 400)
                 return
+            from . import diff
             try:
-                version_content = history.get_version_content(tab["filepath"], ref)
+                version_hash = history.get_version_hash(tab["filepath"], ref)
             except ValueError as e:
                 self._json_response({"error": str(e)}, 400)
                 return
-            if version_content is None:
+            if version_hash is None:
                 self._json_response({"error": "version not found"}, 404)
                 return
-            from . import diff
-            result = diff.prepare_diff(version_content, tab["content"])
+            if "expand" in params:
+                version_content = history.get_version_content(tab["filepath"], ref)
+                if version_content is None:
+                    self._json_response({"error": "version not found"}, 404)
+                    return
+                self._diff_expand(params, version_content, version_hash)
+                return
+            current = tab["content"]
+            current_hash = diff.content_hash(current)
+            if self._diff_stale(params, version_hash, current_hash):
+                return
+
+            def load():
+                # Cache miss only — a hit never decodes the blob
+                version_content = history.get_version_content(tab["filepath"], ref)
+                if version_content is None:
+                    raise LookupError(ref)  # pruned since the hash lookup
+                return version_content, current
+            try:
+                result = diff.cached_diff(version_hash, current_hash, load)
+            except LookupError:
+                self._json_response({"error": "version not found"}, 404)
+                return
+            result["left_hash"] = version_hash
+            result["right_hash"] = current_hash
             result["left_filename"] = label or f"Version {ref}"
             result["right_filename"] = os.path.basename(tab["filepath"]) + " (current)"
-            self._json_response(result)
+            self._send_diff(params, result)
 
         elif parsed.path == "/api/preview-image":
             # Serve images referenced in home screen cards
@@ -798,7 +1151,7 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
             # previewImage paths via recent._extract_preview_image
             tab_dirs = self._tab_dirs()
             with _browse_cache_lock:
-                browse_dirs = [k[0] for k in _browse_cache]
+                browse_dirs = list(_browse_cache)
             try:
                 recent_dirs = [os.path.dirname(e["path"])
                                for e in recent.load() if e.get("path")]
@@ -825,6 +1178,24 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
                 self.send_error(500)
             return
 
+        elif (parsed.path.startswith("/static/")
+              and template.BUNDLE_NAME_RE.fullmatch(parsed.path[8:])):
+            bundle = template.bundle(parsed.path[8:])
+            if bundle is None:
+                # A page from before a rebuild — 404 rather than the HTML
+                # fallback, which the browser would try to run as script
+                self.send_error(404)
+                return
+            self._serve_bundle(bundle)
+
+        elif parsed.path.startswith("/vendor/"):
+            build, _, rel = unquote(parsed.path[8:]).partition("/")
+            path = vendor.resolve(build, rel)
+            if path is None:
+                self.send_error(404)
+                return
+            self._serve_vendored(path, build, rel)
+
         elif parsed.path != "/" and parsed.path != "":
             # Try to serve static files relative to open tab directories
             rel_path = unquote(parsed.path.lstrip("/"))
@@ -863,6 +1234,134 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
         else:
             self._serve_html_shell()
 
+    def _accepted_encodings(self):
+        """Content codings the client accepts (q > 0) from Accept-Encoding."""
+        accepted = set()
+        for item in self.headers.get("Accept-Encoding", "").split(","):
+            name, _, q = item.strip().partition(";")
+            q = q.strip()
+            if q.startswith("q="):
+                try:
+                    if float(q[2:]) <= 0:
+                        continue
+                except ValueError:
+                    continue
+            if name:
+                accepted.add(name.strip().lower())
+        return accepted
+
+    def _serve_bundle(self, bundle):
+        """A content-hashed static bundle: immutable, pre-compressed."""
+        if self._etag_matches(bundle.etag):
+            self.send_response(304)
+            self.send_header("ETag", bundle.etag)
+            self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+            self.end_headers()
+            return
+        accepted = self._accepted_encodings()
+        data, coding = bundle.data, None
+        if bundle.br is not None and "br" in accepted:
+            data, coding = bundle.br, "br"
+        elif "gzip" in accepted:
+            data, coding = bundle.gzip, "gzip"
+        self.send_response(200)
+        self.send_header("Content-Type", bundle.content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if coding:
+            self.send_header("Content-Encoding", coding)
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("ETag", bundle.etag)
+        self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        self.send_header("X-Content-Type-Options", "nosniff")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _serve_vendored(self, path, build, rel):
+        """A mirrored CDN file (vendor.py): immutable under its build id;
+        scripts and stylesheets are compressed once, via _compress."""
+        etag = f'"{build}"'
+        if self._etag_matches(etag):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+            self.end_headers()
+            return
+        content_type = vendor.CONTENT_TYPES.get(
+            os.path.splitext(path)[1].lower(), "application/octet-stream")
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            self.send_error(404)
+            return
+        coding = None
+        if content_type.startswith("text/") or content_type == "image/svg+xml":
+            if "gzip" in self._accepted_encodings():
+                coding = "gzip"
+                data = _compress(data, coding, cache_key=("vendor", build, rel))
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if coding:
+            self.send_header("Content-Encoding", coding)
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        self.send_header("X-Content-Type-Options", "nosniff")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _diff_stale(self, params, left_hash, right_hash):
+        """409 a follow-up request (window slice, expand) whose
+        `left_hash`/`right_hash` — echoed from the index response — no
+        longer name the contents being compared; its hunk indices and
+        line offsets belong to another diff. A None hash is not checked.
+        True if answered."""
+        for name, current in (("left_hash", left_hash), ("right_hash", right_hash)):
+            sent = params.get(name, [None])[0]
+            if current is not None and sent is not None and sent != current:
+                self._json_response({"error": "diff changed; re-fetch the index",
+                                     "stale": True}, 409)
+                return True
+        return False
+
+    def _diff_expand(self, params, left_content, left_hash):
+        """Answer a diff request's `expand=start:count` (the text of a
+        collapsed unchanged run) from the left side; False if absent.
+        Only the left side is checked for staleness: skip offsets and
+        their text come from it alone."""
+        spec = params.get("expand", [None])[0]
+        if spec is None:
+            return False
+        if self._diff_stale(params, left_hash, None):
+            return True
+        from . import diff
+        try:
+            start, count = diff.parse_range(spec)
+        except ValueError:
+            self._json_response({"error": "expand must be start:count"}, 400)
+            return True
+        self._json_response({"lines": diff.expand_lines(left_content, start, count)})
+        return True
+
+    def _send_diff(self, params, result):
+        """Send a diff result whole, as a window index, or — for
+        `from=&to=` (hunk indices) — as one window's hunks."""
+        from . import diff
+        lo = params.get("from", [None])[0]
+        if lo is None:
+            self._json_response(diff.page(result))
+            return
+        try:
+            start = int(lo)
+            end = int(params.get("to", [None])[0])
+            if start < 0 or end < start:
+                raise ValueError
+        except (TypeError, ValueError):
+            self._json_response({"error": "from/to must be hunk indices"}, 400)
+            return
+        self._json_response(diff.page(result, start, end))
+
     def _serve_html_shell(self):
         with self._tabs_lock:
             first_tab = next(iter(self._tabs.values()), None)
@@ -924,8 +1423,13 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
             if justify is not None and not isinstance(justify, bool):
                 self._json_response({"error": "justify must be a boolean"}, 400)
                 return
+            server_render = body.get("serverRender")
+            if server_render is not None and not isinstance(server_render, bool):
+                self._json_response({"error": "serverRender must be a boolean"}, 400)
+                return
             cfg = _read_config()
-            cfg.update({k: v for k, v in body.items() if k in ("theme", "justify")})
+            cfg.update({k: v for k, v in body.items()
+                        if k in ("theme", "justify", "serverRender")})
             try:
                 _write_config(cfg)
                 self._json_response({"ok": True})
@@ -1668,7 +2172,37 @@ class PreviewHandler(http.server.BaseHTTPRequestHandler):
             self.send_error(404)
 
 
+_RETENTION_DELAY_S = 60             # first pass waits for startup to settle
+_RETENTION_INTERVAL_S = 6 * 60 * 60
+_retention_started = False
+
+
+def _retention_loop():
+    """Background history retention: one incremental pass every few hours
+    under the policy in config.json's "historyRetention" object."""
+    time.sleep(_RETENTION_DELAY_S)
+    while True:
+        try:
+            history.prune(_read_config().get("historyRetention"), pause_s=0.05)
+        except Exception as e:
+            print(f"Warning: history retention pass failed: {e!r}", file=sys.stderr)
+        time.sleep(_RETENTION_INTERVAL_S)
+
+
+def _start_retention():
+    global _retention_started
+    if _retention_started:
+        return
+    _retention_started = True
+    threading.Thread(target=_retention_loop, name="dabarat-retention",
+                     daemon=True).start()
+
+
 def start(port, handler_class=PreviewHandler):
     """Create and return a ThreadingHTTPServer bound to localhost:port."""
     handler_class._server_port = port
-    return http.server.ThreadingHTTPServer(("127.0.0.1", port), handler_class)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), handler_class)
+    _sync_watcher()
+    _watcher.start()
+    _start_retention()
+    return server
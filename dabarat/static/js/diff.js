@@ -1,5 +1,6 @@
 /* ── Diff Mode ───────────────────────────────────────── */
-let diffState = { active: false, leftTabId: null, rightPath: null, versionRef: null };
+let diffState = { active: false, leftTabId: null, rightPath: null, versionRef: null,
+                  url: null, data: null };
 
 function _showDiffView() {
   /* Hide normal content, show diff view */
@@ -22,6 +23,7 @@ let _diffFetchGen = 0;
 
 async function _fetchAndRenderDiff(url) {
   const gen = ++_diffFetchGen;
+  diffState.url = url;
   try {
     const res = await fetch(url);
     const data = await res.json();
@@ -73,6 +75,10 @@ function exitDiffMode() {
   diffState.leftTabId = null;
   diffState.rightPath = null;
   diffState.versionRef = null;
+  diffState.url = null;
+  diffState.data = null;
+  _diffWindowObservers.forEach(o => o.disconnect());
+  _diffWindowObservers = [];
 
   /* Release the document-level mousemove/mouseup listeners the resizer holds */
   if (_diffResizeCtrl) { _diffResizeCtrl.abort(); _diffResizeCtrl = null; }
@@ -97,6 +103,7 @@ function exitDiffMode() {
 }
 
 function renderDiff(data) {
+  diffState.data = data;
   /* Filenames */
   document.getElementById('diff-left-name').textContent = data.left_filename;
   document.getElementById('diff-right-name').textContent = data.right_filename;
@@ -121,16 +128,14 @@ function renderDiff(data) {
     fmBar.innerHTML = '';
   }
 
-  /* Render both panels */
-  const leftPanel = document.getElementById('diff-panel-left');
-  const rightPanel = document.getElementById('diff-panel-right');
-  renderDiffPanel(leftPanel, data.body.left);
-  renderDiffPanel(rightPanel, data.body.right);
+  _renderDiffPanels();
 
   /* Identical files message */
   if (s.added === 0 && s.removed === 0 && s.changed === 0) {
     const msg = '<div class="diff-identical"><i class="ph ph-check-circle"></i>Files are identical</div>';
-    leftPanel.querySelector('.diff-panel-content').innerHTML += msg;
+    /* insertAdjacentHTML, not innerHTML +=, which would drop the skip
+       expanders' click handlers */
+    document.querySelector('#diff-panel-left .diff-panel-content').insertAdjacentHTML('beforeend', msg);
   }
 
   /* Update status bar */
@@ -162,29 +167,207 @@ function renderFrontmatterDiffHtml(fmLeft, fmRight) {
   return html;
 }
 
-function renderDiffPanel(panel, diffLines) {
-  panel.innerHTML = '';
-  const wrapper = document.createElement('div');
-  wrapper.className = 'diff-panel-content';
-
-  /* Reconstruct raw markdown, tracking line types */
-  const rawLines = [];
-  const lineTypes = [];
-  diffLines.forEach(entry => {
-    rawLines.push(entry.line || '');
-    lineTypes.push(entry.type);
+/* Split run-length hunks into per-side {line, type} runs, broken at each
+   collapsed unchanged run: [{left, right}, {skip: hunkIndex}, ...], with
+   hunk indices counted from `offset`. A
+   change pairs its lines by index and pads the shorter side with 'empty'. */
+function _diffSegments(hunks, offset) {
+  const segments = [];
+  let cur = { left: [], right: [] };
+  hunks.forEach((h, idx) => {
+    if (h.op === 'skip') {
+      segments.push(cur, { skip: offset + idx });
+      cur = { left: [], right: [] };
+    } else if (h.op === 'equal') {
+      h.lines.forEach(line => {
+        cur.left.push({ line, type: 'equal' });
+        cur.right.push({ line, type: 'equal' });
+      });
+    } else {
+      const pairs = Math.min(h.left.length, h.right.length);
+      const n = Math.max(h.left.length, h.right.length);
+      for (let k = 0; k < n; k++) {
+        if (k < pairs) {
+          cur.left.push({ line: h.left[k], type: 'change', spans: h.spans?.left[k] });
+          cur.right.push({ line: h.right[k], type: 'change', spans: h.spans?.right[k] });
+        } else if (k < h.left.length) {
+          cur.left.push({ line: h.left[k], type: 'delete' });
+          cur.right.push({ line: '', type: 'empty' });
+        } else {
+          cur.left.push({ line: '', type: 'empty' });
+          cur.right.push({ line: h.right[k], type: 'insert' });
+        }
+      }
+    }
   });
+  segments.push(cur);
+  return segments;
+}
 
-  /* For empty sides, skip rendering */
-  const nonEmpty = lineTypes.filter(t => t !== 'empty');
-  if (nonEmpty.length === 0) {
-    const emptyBlock = document.createElement('div');
-    emptyBlock.className = 'diff-block diff-empty';
-    emptyBlock.style.minHeight = '100%';
-    wrapper.appendChild(emptyBlock);
+/* Large diffs arrive as a window index (body.windows without body.hunks):
+   each window is a placeholder sized by its row count until it nears the
+   viewport, then its hunks are fetched with from=&to= and rendered in
+   place. Small diffs arrive whole and every window renders at once. */
+let _diffWindowObservers = [];
+
+function _renderDiffPanels() {
+  const body = diffState.data.body;
+  const inline = Array.isArray(body.hunks);
+  const last = body.windows.length ? body.windows[body.windows.length - 1].to : 0;
+  if (!inline) body.hunks = new Array(last).fill(null);
+  diffState.loaded = new Set(inline ? body.windows.map((_, w) => w) : []);
+  diffState.loading = new Set();
+
+  _diffWindowObservers.forEach(o => o.disconnect());
+  _diffWindowObservers = [];
+
+  ['left', 'right'].forEach(side => {
+    const panel = document.getElementById('diff-panel-' + side);
+    panel.innerHTML = '';
+    /* Rooted at the panel (the scroll container) so the margin preloads
+       windows just outside its visible area */
+    const observer = inline ? null : new IntersectionObserver(entries => {
+      entries.forEach(entry => {
+        if (entry.isIntersecting) _loadDiffWindow(Number(entry.target.dataset.window));
+      });
+    }, { root: panel, rootMargin: '1200px 0px' });
+    if (observer) _diffWindowObservers.push(observer);
+    const wrapper = document.createElement('div');
+    wrapper.className = 'diff-panel-content';
+
+    /* For empty sides, skip rendering */
+    const hasContent = !inline || body.hunks.some(h => h.op !== 'change' || h[side].length);
+    if (!hasContent) {
+      const emptyBlock = document.createElement('div');
+      emptyBlock.className = 'diff-block diff-empty';
+      emptyBlock.style.minHeight = '100%';
+      wrapper.appendChild(emptyBlock);
+      panel.appendChild(wrapper);
+      return;
+    }
+
+    body.windows.forEach((win, w) => {
+      const el = document.createElement('div');
+      el.className = 'diff-window';
+      el.dataset.window = w;
+      if (!inline) {
+        el.classList.add('diff-window-pending');
+        el.style.height = (win.rows * 1.65) + 'em';
+        observer.observe(el);
+      }
+      wrapper.appendChild(el);
+    });
     panel.appendChild(wrapper);
-    return;
+  });
+  if (inline) body.windows.forEach((_, w) => _renderDiffWindow(w));
+}
+
+function _renderDiffWindow(w) {
+  const body = diffState.data.body;
+  const win = body.windows[w];
+  const segments = _diffSegments(body.hunks.slice(win.from, win.to), win.from);
+  ['left', 'right'].forEach(side => {
+    const el = document.querySelector('#diff-panel-' + side + ' .diff-window[data-window="' + w + '"]');
+    if (!el) return;
+    _diffWindowObservers.forEach(o => o.unobserve(el));
+    el.classList.remove('diff-window-pending');
+    el.style.height = '';
+    el.innerHTML = '';
+    renderDiffPanel(el, segments, side);
+  });
+}
+
+/* Follow-up requests name the contents the index was computed from; the
+   server answers 409 once either side has changed, and the diff is
+   re-fetched rather than mixing hunks of two different comparisons */
+function _diffToken(data) {
+  return '&left_hash=' + encodeURIComponent(data.left_hash || '') +
+    '&right_hash=' + encodeURIComponent(data.right_hash || '');
+}
+
+async function _loadDiffWindow(w) {
+  if (diffState.loaded.has(w) || diffState.loading.has(w)) return;
+  const data = diffState.data;
+  const win = data.body.windows[w];
+  const gen = _diffFetchGen;
+  diffState.loading.add(w);
+  try {
+    const res = await fetch(diffState.url + '&from=' + win.from + '&to=' + win.to +
+      _diffToken(data));
+    const payload = await res.json();
+    if (!diffState.active || gen !== _diffFetchGen || diffState.data !== data) return;
+    if (res.status === 409) {
+      _fetchAndRenderDiff(diffState.url);
+      return;
+    }
+    if (payload.error) {
+      console.error('Diff window error:', payload.error);
+      return;
+    }
+    payload.hunks.forEach((h, k) => { data.body.hunks[payload.from + k] = h; });
+    diffState.loaded.add(w);
+    _renderDiffWindow(w);
+  } catch (e) {
+    console.error('Diff window fetch failed:', e);
+  } finally {
+    if (diffState.data === data) diffState.loading.delete(w);
+  }
+}
+
+function renderDiffPanel(container, segments, side) {
+  segments.forEach(seg => {
+    if (seg.skip === undefined) {
+      _renderDiffLines(container, seg[side], side);
+      return;
+    }
+    const hunk = diffState.data.body.hunks[seg.skip];
+    const skip = document.createElement('button');
+    skip.className = 'diff-skip';
+    skip.innerHTML = '<i class="ph ph-dots-three"></i> ' + hunk.count +
+      ' unchanged line' + (hunk.count === 1 ? '' : 's');
+    skip.title = 'Show unchanged lines';
+    skip.onclick = () => _expandDiffSkip(seg.skip);
+    container.appendChild(skip);
+  });
+
+  /* Syntax highlighting */
+  if (typeof hljs !== 'undefined') {
+    container.querySelectorAll('pre code').forEach(el => hljs.highlightElement(el));
   }
+}
+
+/* Fetch a collapsed run's text and splice it back in as an equal hunk */
+async function _expandDiffSkip(idx) {
+  const data = diffState.data;
+  const hunk = data && data.body.hunks[idx];
+  if (!hunk || hunk.op !== 'skip') return;
+  const gen = _diffFetchGen;
+  try {
+    const res = await fetch(diffState.url + '&expand=' + hunk.left + ':' + hunk.count +
+      _diffToken(data));
+    const payload = await res.json();
+    if (!diffState.active || gen !== _diffFetchGen || diffState.data !== data) return;
+    if (res.status === 409) {
+      _fetchAndRenderDiff(diffState.url);
+      return;
+    }
+    if (payload.error) {
+      console.error('Diff expand error:', payload.error);
+      return;
+    }
+    data.body.hunks[idx] = { op: 'equal', lines: payload.lines };
+    const w = data.body.windows.findIndex(win => win.from <= idx && idx < win.to);
+    if (w >= 0) _renderDiffWindow(w);
+  } catch (e) {
+    console.error('Diff expand failed:', e);
+  }
+}
+
+/* Render one contiguous run of {line, type} entries as markdown blocks */
+function _renderDiffLines(wrapper, diffLines, side) {
+  const rawLines = diffLines.map(entry => entry.line || '');
+  const lineTypes = diffLines.map(entry => entry.type);
+  if (rawLines.length === 0) return;
 
   /* Render full markdown */
   const fullMd = rawLines.join('');
@@ -213,6 +396,10 @@ function renderDiffPanel(panel, diffLines) {
     }
 
     block.appendChild(child);
+    if (dtype === 'change') {
+      _paintWordSpans(block, diffLines.slice(lineIdx - blockLines, lineIdx),
+        side === 'left' ? 'diff-word-del' : 'diff-word-add');
+    }
     wrapper.appendChild(block);
   });
 
@@ -226,13 +413,70 @@ function renderDiffPanel(panel, diffLines) {
     }
     lineIdx++;
   }
+}
 
-  /* Syntax highlighting */
-  if (typeof hljs !== 'undefined') {
-    wrapper.querySelectorAll('pre code').forEach(el => hljs.highlightElement(el));
+/* Wrap the server-computed changed spans of a block's source lines in
+   the rendered block. Rendering only drops markdown syntax (markers,
+   link targets, escapes), so the block's text is walked alongside its
+   source lines: a source character is mapped to the next rendered
+   character when they are equal (any whitespace matches any), and is
+   syntax otherwise. Each span is painted at the rendered range its
+   mapped characters cover — by position, never by searching for the
+   fragment (code blocks are left to hljs). */
+function _paintWordSpans(block, entries, cls) {
+  if (!entries.some(entry => entry.spans && entry.spans.length)) return;
+  const nodes = [];
+  const starts = [];
+  let text = '';
+  const walker = document.createTreeWalker(block, NodeFilter.SHOW_TEXT);
+  for (let n = walker.nextNode(); n; n = walker.nextNode()) {
+    if (n.parentElement.closest('pre')) continue;
+    nodes.push(n);
+    starts.push(text.length);
+    text += n.data;
   }
-
-  panel.appendChild(wrapper);
+  const isSpace = c => c === ' ' || c === '\t' || c === '\n' || c === '\r' || c === '\u00a0';
+  const ranges = [];
+  let t = 0;
+  entries.forEach(entry => {
+    const line = entry.line || '';
+    const at = new Array(line.length).fill(-1);
+    for (let i = 0; i < line.length && t < text.length; i++) {
+      const c = line[i];
+      /* Whitespace the source does not have (between table cells, list items) */
+      let u = t;
+      while (!isSpace(c) && u < text.length && isSpace(text[u])) u++;
+      if (u > t && text[u] === c) t = u;
+      if (text[t] === c || (isSpace(c) && isSpace(text[t]))) at[i] = t++;
+    }
+    const spans = entry.spans || [];
+    for (let k = 0; k < spans.length; k += 2) {
+      let from = -1, to = -1;
+      for (let i = spans[k]; i < spans[k + 1]; i++) {
+        if (at[i] < 0) continue;
+        if (from < 0) from = at[i];
+        to = at[i] + 1;
+      }
+      while (from >= 0 && from < to && isSpace(text[from])) from++;
+      while (to > from && isSpace(text[to - 1])) to--;
+      if (from >= 0 && to > from) ranges.push([from, to]);
+    }
+  });
+  /* Last range first, so splitting never shifts an offset still to paint */
+  ranges.sort((x, y) => y[0] - x[0]);
+  ranges.forEach(([from, to]) => {
+    for (let k = nodes.length - 1; k >= 0; k--) {
+      const a = Math.max(from, starts[k]);
+      const b = Math.min(to, starts[k] + nodes[k].data.length);
+      if (a >= b) continue;
+      const mark = nodes[k].splitText(a - starts[k]);
+      mark.splitText(b - a);
+      const span = document.createElement('span');
+      span.className = cls;
+      mark.replaceWith(span);
+      span.appendChild(mark);
+    }
+  });
 }
 
 function estimateBlockLineCount(rawLines, startIdx, element) {
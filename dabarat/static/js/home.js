@@ -512,22 +512,118 @@ async function _loadWorkspaceView(dirPath) {
   const content = document.getElementById('content');
   if (!content) return;
 
+  /* Streamed: cards render from the stat-only listing, then fill in as the
+     server reads each file (cheap when the directory index is warm) */
+  let files = null;
+  let fileIndex = null;
+  let header = null;
+  const pending = new Map();
+  let patchQueued = false;
+  const flushPatches = () => {
+    patchQueued = false;
+    if (!homeScreenActive || !files) return;
+    pending.forEach((i, path) => {
+      const card = content.querySelector(`.home-card[data-filepath="${CSS.escape(path)}"]`);
+      if (!card) return;
+      const tpl = document.createElement('template');
+      tpl.innerHTML = _buildCard(files[i], i).trim();
+      const fresh = tpl.content.firstElementChild;
+      fresh.style.animation = 'none';
+      card.replaceWith(fresh);
+      _bindHomeCard(fresh);
+    });
+    pending.clear();
+  };
+
   try {
-    const res = await fetch('/api/browse-dir?path=' + encodeURIComponent(dirPath));
-    const data = await res.json();
+    const data = await _browseDirStream(dirPath, {
+      onEntries(head, entries) {
+        header = head;
+        files = entries.filter(e => e.type === 'file');
+        fileIndex = new Map(files.map((e, i) => [e.path, i]));
+        _renderHomeContent(content, files, 'Workspace', {
+          ...head,
+          stats: { fileCount: files.length, totalWords: files.reduce((n, e) => n + (e.wordCount || 0), 0) },
+        });
+      },
+      onMeta(entry) {
+        if (entry.type !== 'file' || !files) return;
+        pending.set(entry.path, fileIndex.get(entry.path));
+        if (!patchQueued) {
+          patchQueued = true;
+          requestAnimationFrame(flushPatches);
+        }
+      },
+    });
     if (data.error) {
       _renderHomeContent(content, [], 'Workspace');
       return;
     }
-
-    if (data.stats) _workspaceStats = data.stats;
-    const files = data.entries.filter(e => e.type === 'file');
-    _renderHomeContent(content, files, 'Workspace', data);
+    flushPatches();
+    if (data.stats) {
+      _workspaceStats = data.stats;
+      const statsEl = content.querySelector('.home-workspace-stats');
+      if (statsEl) statsEl.innerHTML = `${data.stats.fileCount} files &middot; ${data.stats.totalWords.toLocaleString()} words`;
+    }
+    if (!header) _renderHomeContent(content, data.entries.filter(e => e.type === 'file'), 'Workspace', data);
   } catch (e) {
     _renderHomeContent(content, [], 'Workspace');
   }
 }
 
+/* Read /api/browse-dir?stream=1 (NDJSON). Calls onEntries(header, entries)
+   once with the listing, onMeta(entry) after each enrichment record is merged
+   into its entry, and resolves to the same shape as the non-streamed
+   endpoint ({path, parent, dirname, stats, entries}) or {error}. */
+async function _browseDirStream(dirPath, handlers) {
+  const res = await fetch('/api/browse-dir?stream=1&path=' + encodeURIComponent(dirPath));
+  if (!res.ok || !(res.headers.get('Content-Type') || '').includes('ndjson')) return res.json();
+
+  const result = { entries: [] };
+  const byPath = new Map();
+  const handle = (rec) => {
+    if (rec.kind === 'header') {
+      Object.assign(result, { path: rec.path, parent: rec.parent, dirname: rec.dirname });
+    } else if (rec.kind === 'entries') {
+      result.entries = rec.entries;
+      rec.entries.forEach(e => byPath.set(e.path, e));
+      if (handlers.onEntries) handlers.onEntries(result, rec.entries);
+    } else if (rec.kind === 'meta') {
+      const entry = byPath.get(rec.path);
+      if (!entry) return;
+      const { kind, ...fields } = rec;
+      Object.assign(entry, fields);
+      if (handlers.onMeta) handlers.onMeta(entry);
+    } else if (rec.kind === 'done') {
+      result.stats = rec.stats;
+    } else if (rec.kind === 'error') {
+      result.error = rec.error;
+    }
+  };
+
+  const decoder = new TextDecoder();
+  let buf = '';
+  const drain = (final) => {
+    const lines = buf.split('\n');
+    buf = final ? '' : lines.pop();
+    lines.forEach(line => { if (line.trim()) handle(JSON.parse(line)); });
+  };
+  if (res.body && res.body.getReader) {
+    const reader = res.body.getReader();
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buf += decoder.decode(value, { stream: true });
+      drain(false);
+    }
+  } else {
+    buf = await res.text();
+  }
+  buf += decoder.decode();
+  drain(true);
+  return result;
+}
+
 async function _loadRecentView() {
   const content = document.getElementById('content');
   if (!content) return;
@@ -643,26 +739,7 @@ function _renderHomeContent(content, entries, title, browseData, recentWorkspace
   </div>`;
 
   /* Attach card event listeners via delegation (avoids XSS from inline onclick) */
-  content.querySelectorAll('.home-card').forEach(card => {
-    card.addEventListener('click', (e) => {
-      if (e.target.closest('.home-card-remove') || e.target.closest('.home-card-versions')) return;
-      openRecentFile(card.dataset.filepath);
-    });
-  });
-  content.querySelectorAll('.home-card-remove').forEach(btn => {
-    const card = btn.closest('.home-card');
-    btn.addEventListener('click', (e) => {
-      e.stopPropagation();
-      removeRecentFile(card.dataset.filepath, card);
-    });
-  });
-  content.querySelectorAll('.home-card-versions').forEach(btn => {
-    const card = btn.closest('.home-card');
-    btn.addEventListener('click', (e) => {
-      e.stopPropagation();
-      openRecentFile(card.dataset.filepath, { openHistory: true });
-    });
-  });
+  content.querySelectorAll('.home-card').forEach(_bindHomeCard);
 
   /* Attach empty state browse button */
   const browseBtn = content.querySelector('[data-action="browse-pick-dir"]');
@@ -712,6 +789,23 @@ function _renderHomeContent(content, entries, title, browseData, recentWorkspace
   }
 }
 
+function _bindHomeCard(card) {
+  card.addEventListener('click', (e) => {
+    if (e.target.closest('.home-card-remove') || e.target.closest('.home-card-versions')) return;
+    openRecentFile(card.dataset.filepath);
+  });
+  const removeBtn = card.querySelector('.home-card-remove');
+  if (removeBtn) removeBtn.addEventListener('click', (e) => {
+    e.stopPropagation();
+    removeRecentFile(card.dataset.filepath, card);
+  });
+  const versionsBtn = card.querySelector('.home-card-versions');
+  if (versionsBtn) versionsBtn.addEventListener('click', (e) => {
+    e.stopPropagation();
+    openRecentFile(card.dataset.filepath, { openHistory: true });
+  });
+}
+
 /* Day-group label for a card — mirrors the version timeline's separators */
 function _cardDayLabel(e) {
   const ts = e.mtime ? new Date(e.mtime * 1000) : (e.lastOpened ? new Date(e.lastOpened) : null);
@@ -1166,7 +1260,7 @@ async function _loadWorkspaceMultiRoot() {
 
   content.innerHTML = '<div class="home-loading"><div class="skeleton-line w60"></div><div class="skeleton-line w40"></div></div>';
 
-  /* Fan out one browse-dir per folder root + one file-metadata per pinned file */
+  /* Fan out one browse-dir per folder root + one batched file-metadata */
   const folderPromises = (_activeWorkspace.folders || []).map(async (f) => {
     try {
       const res = await fetch('/api/browse-dir?path=' + encodeURIComponent(f.path));
@@ -1177,19 +1271,27 @@ async function _loadWorkspaceMultiRoot() {
     }
   });
 
-  const filePromises = (_activeWorkspace.files || []).map(async (f) => {
+  /* Pinned files: one batched file-metadata request, built server-side in parallel */
+  const pinned = _activeWorkspace.files || [];
+  const _pinnedFallback = (p) => ({ path: p, name: p.split('/').pop(), type: 'file' });
+  const filesPromise = pinned.length ? (async () => {
     try {
-      const res = await fetch('/api/file-metadata?path=' + encodeURIComponent(f.path));
+      const qs = pinned.map(f => 'path=' + encodeURIComponent(f.path)).join('&');
+      const res = await fetch('/api/file-metadata?' + qs);
       const data = await res.json();
-      return { ...data, type: 'file' };
+      const entries = data.entries || [data];
+      return pinned.map((f, i) => {
+        const e = entries[i];
+        return e && !e.error ? { ...e, type: 'file' } : _pinnedFallback(f.path);
+      });
     } catch (e) {
-      return { path: f.path, name: f.path.split('/').pop(), type: 'file' };
+      return pinned.map(f => _pinnedFallback(f.path));
     }
-  });
+  })() : Promise.resolve([]);
 
   const [folderResults, fileResults] = await Promise.all([
     Promise.all(folderPromises),
-    Promise.all(filePromises)
+    filesPromise
   ]);
 
   /* Build sectioned HTML */
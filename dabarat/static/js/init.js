@@ -30,6 +30,7 @@ async function init() {
           tabs[id].body = data.body;
           tabs[id].mtime = data.mtime;
           tabs[id].changeKey = data.changeKey;
+          tabs[id].rendered = data.rendered;
           tabs[id].frontmatter = data.frontmatter || null;
           if (id === activeTabId) {
             currentFrontmatter = tabs[id].frontmatter;
@@ -79,6 +80,7 @@ async function init() {
     sentinel.id = 'dabarat-render-complete';
     document.body.appendChild(sentinel);
   } else {
+    _connectChangeFeed();
     poll();
   }
 }
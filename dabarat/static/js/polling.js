@@ -3,6 +3,109 @@ const POLL_ACTIVE_MS = 500;
 const POLL_TABS_MS = 2000;
 let lastTabsCheck = 0;
 let _editProbeFailures = 0;
+let _pollTimer = null;
+let _pollRunning = false;
+let _pollAgain = false;
+
+/* ── Change feed ──────────────────────────────────────── */
+/* While the /api/events stream is up, the server pushes a tab's
+   changeKey only when the file actually changes; poll() then fetches
+   just the tabs marked dirty instead of every document twice a second.
+   Any stream error drops straight back to plain polling until the
+   EventSource reconnects and its snapshot re-arms the feed. */
+let _feed = null;
+let _feedConnected = false;
+const _feedKeys = {};            // tab id → {changeKey, fileMissing, statError}
+const _feedDirty = new Set();    // tab ids whose content must be refetched
+const _feedAnnDirty = new Set(); // tab ids whose annotations must be refetched
+let _feedTabsDirty = false;
+
+function _feedApply(id, state) {
+  _feedKeys[id] = state;
+  if (tabs[id] && state.changeKey !== tabs[id].changeKey) _feedDirty.add(id);
+  if ('annotationsMtime' in state
+      && state.annotationsMtime !== (lastAnnotationMtimes[id] || 0)) {
+    _feedAnnDirty.add(id);
+  }
+}
+
+function _connectChangeFeed() {
+  if (_feed || typeof EventSource === 'undefined') return;
+  _feed = new EventSource('/api/events');
+  _feed.addEventListener('snapshot', e => {
+    const data = JSON.parse(e.data);
+    for (const [id, state] of Object.entries(data.tabs || {})) _feedApply(id, state);
+    _feedConnected = true;
+    _feedTabsDirty = true;
+    _kickPoll();
+  });
+  _feed.addEventListener('change', e => {
+    const data = JSON.parse(e.data);
+    _feedApply(data.tab, data);
+    _kickPoll();
+  });
+  _feed.addEventListener('annotations', e => {
+    const data = JSON.parse(e.data);
+    if (data.mtime !== (lastAnnotationMtimes[data.tab] || 0)) _feedAnnDirty.add(data.tab);
+    _kickPoll();
+  });
+  _feed.addEventListener('rendered', e => {
+    /* Server-side HTML for the version we hold is ready — refetch it so
+       the next render() (tab switch, theme change) just inserts it */
+    const data = JSON.parse(e.data);
+    if (tabs[data.tab] && data.changeKey === tabs[data.tab].changeKey) {
+      _feedDirty.add(data.tab);
+      _kickPoll();
+    }
+  });
+  _feed.addEventListener('tabs', () => {
+    _feedTabsDirty = true;
+    _kickPoll();
+  });
+  _feed.addEventListener('resync', () => {
+    /* The server dropped our backlog — treat everything as stale */
+    Object.keys(tabs).forEach(id => { _feedDirty.add(id); _feedAnnDirty.add(id); });
+    _feedTabsDirty = true;
+    _kickPoll();
+  });
+  _feed.onerror = () => { _feedConnected = false; };
+}
+
+function _takeFeedTabsDirty() {
+  const due = _feedTabsDirty;
+  _feedTabsDirty = false;
+  return due;
+}
+
+/* Conditional content fetch: sends the tab's last ETag and resolves to
+   null on 304, so an unchanged document costs no body, no JSON decode
+   and no re-render */
+async function _fetchContentIfChanged(id) {
+  const etag = tabs[id] && tabs[id].etag;
+  const res = await fetch('/api/content?tab=' + id,
+                          etag ? { headers: { 'If-None-Match': etag } } : undefined);
+  if (res.status === 304) return null;
+  const data = await res.json();
+  if (!data.error && tabs[id]) {
+    tabs[id].etag = res.headers.get('ETag');
+    tabs[id].rendered = data.rendered;
+  }
+  return data;
+}
+
+/* Run poll() now instead of waiting out the timer (one in flight at a time) */
+function _kickPoll() {
+  if (_pollRunning) { _pollAgain = true; return; }
+  if (_pollTimer) clearTimeout(_pollTimer);
+  _pollTimer = setTimeout(poll, 0);
+}
+
+function _schedulePoll() {
+  const delay = _pollAgain ? 0 : POLL_ACTIVE_MS;
+  _pollAgain = false;
+  if (_pollTimer) clearTimeout(_pollTimer);
+  _pollTimer = setTimeout(poll, delay);
+}
 
 document.addEventListener('visibilitychange', () => {
   if (!document.hidden) {
@@ -12,10 +115,31 @@ document.addEventListener('visibilitychange', () => {
 });
 
 async function poll() {
+  _pollTimer = null;
+  _pollRunning = true;
+  try {
+    await _pollOnce();
+  } finally {
+    _pollRunning = false;
+    _schedulePoll();
+  }
+}
+
+async function _pollOnce() {
   /* Full polling pauses during diff/edit mode, but edit mode keeps a
      lightweight stat-only watch so external changes surface immediately */
   if (diffState.active || editState.active) {
-    if (editState.active && activeTabId && tabs[activeTabId] && !document.hidden) {
+    if (editState.active && activeTabId && tabs[activeTabId] && _feedConnected) {
+      /* The feed already carries the stat probe's answer */
+      const state = _feedKeys[activeTabId];
+      if (state) {
+        _setTabGhost(activeTabId, !!state.fileMissing);
+        _setTabFileError(activeTabId, state.statError || null);
+        if (!state.fileMissing && state.changeKey && state.changeKey !== tabs[activeTabId].changeKey) {
+          _showExternalChangeBanner();
+        }
+      }
+    } else if (editState.active && activeTabId && tabs[activeTabId] && !document.hidden) {
       try {
         const res = await fetch('/api/mtime?tab=' + activeTabId);
         const data = await res.json();
@@ -38,7 +162,8 @@ async function poll() {
     }
     /* Detect tabs added externally (e.g. via --add) even during edit mode */
     const now = Date.now();
-    if (editState.active && now - lastTabsCheck >= POLL_TABS_MS) {
+    if (editState.active
+        && (_feedConnected ? _takeFeedTabsDirty() : now - lastTabsCheck >= POLL_TABS_MS)) {
       lastTabsCheck = now;
       try {
         const res = await fetch('/api/tabs');
@@ -54,12 +179,12 @@ async function poll() {
         if (changed) renderTabBar();
       } catch(e) {}
     }
-    setTimeout(poll, POLL_ACTIVE_MS);
     return;
   }
 
   /* On home screen, only check for new tabs added externally (via --add) */
   if (homeScreenActive) {
+    if (_feedConnected && !_takeFeedTabsDirty()) return;
     try {
       const res = await fetch('/api/tabs');
       const tabList = await res.json();
@@ -75,23 +200,23 @@ async function poll() {
         document.getElementById('status-filepath').textContent = tabs[activeTabId].filepath;
       }
     } catch(e) {}
-    setTimeout(poll, POLL_ACTIVE_MS);
     return;
   }
   const now = Date.now();
 
-  /* Always poll active tab content (fast) */
-  if (activeTabId && tabs[activeTabId]) {
+  /* Active tab content: every tick when polling, only on a pushed change
+     when the feed is up */
+  if (activeTabId && tabs[activeTabId] && (!_feedConnected || _feedDirty.has(activeTabId))) {
+    _feedDirty.delete(activeTabId);
     try {
-      const res = await fetch('/api/content?tab=' + activeTabId);
-      const data = await res.json();
+      const data = await _fetchContentIfChanged(activeTabId);
       _editProbeFailures = 0;
       _hideServerUnreachableBanner();
-      if (!data.error) {
+      if (data && !data.error) {
         _setTabGhost(activeTabId, !!data.fileMissing);
         _setTabFileError(activeTabId, data.fileError || null);
       }
-      if (!data.error && data.changeKey !== tabs[activeTabId].changeKey) {
+      if (data && !data.error && data.changeKey !== tabs[activeTabId].changeKey) {
         tabs[activeTabId].content = data.content;
         tabs[activeTabId].body = data.body;
         tabs[activeTabId].mtime = data.mtime;
@@ -120,39 +245,43 @@ async function poll() {
   /* Keep the toggle's unseen dot in sync with the active tab */
   _updateHistoryDot();
 
-  /* Check for new/removed tabs and poll inactive tab mtimes less frequently */
-  if (now - lastTabsCheck >= POLL_TABS_MS) {
-    lastTabsCheck = now;
-
-    /* Poll inactive tabs */
-    const inactiveIds = Object.keys(tabs).filter(id => id !== activeTabId);
-    if (inactiveIds.length > 0) {
-      await Promise.all(
-        inactiveIds.map(id =>
-          fetch('/api/content?tab=' + id)
-            .then(r => r.json())
-            .then(data => {
-              if (!data.error) _setTabGhost(id, !!data.fileMissing);
-              if (!data.error && data.changeKey !== tabs[id].changeKey) {
-                tabs[id].content = data.content;
-                tabs[id].body = data.body;
-                tabs[id].mtime = data.mtime;
-                tabs[id].changeKey = data.changeKey;
-                tabs[id].frontmatter = data.frontmatter || null;
-                historySeen.markUnseen(tabs[id].filepath);
-                /* The global feed spans files — keep an open one live */
-                if (typeof gutterMode !== 'undefined' && gutterMode === 'versions'
-                    && versionPanelMode === 'global') {
-                  loadGlobalActivity();
-                }
+  /* Check for new/removed tabs and poll inactive tab mtimes less frequently
+     (with the feed up: exactly the tabs it reported, exactly when it did) */
+  const tabsDue = !_feedConnected && now - lastTabsCheck >= POLL_TABS_MS;
+  if (tabsDue) lastTabsCheck = now;
+  const inactiveIds = Object.keys(tabs).filter(
+    id => id !== activeTabId && (tabsDue || _feedDirty.has(id)));
+  inactiveIds.forEach(id => _feedDirty.delete(id));
+
+  /* Poll inactive tabs */
+  if (inactiveIds.length > 0) {
+    await Promise.all(
+      inactiveIds.map(id =>
+        _fetchContentIfChanged(id)
+          .then(data => {
+            if (!data) return;  /* 304 — unchanged */
+            if (!data.error) _setTabGhost(id, !!data.fileMissing);
+            if (!data.error && data.changeKey !== tabs[id].changeKey) {
+              tabs[id].content = data.content;
+              tabs[id].body = data.body;
+              tabs[id].mtime = data.mtime;
+              tabs[id].changeKey = data.changeKey;
+              tabs[id].frontmatter = data.frontmatter || null;
+              historySeen.markUnseen(tabs[id].filepath);
+              /* The global feed spans files — keep an open one live */
+              if (typeof gutterMode !== 'undefined' && gutterMode === 'versions'
+                  && versionPanelMode === 'global') {
+                loadGlobalActivity();
               }
-            })
-            .catch(() => {})
-        )
-      );
-    }
+            }
+          })
+          .catch(() => {})
+      )
+    );
+  }
 
-    /* Check for tabs added/removed externally */
+  /* Check for tabs added/removed externally */
+  if (tabsDue || _takeFeedTabsDirty()) {
     try {
       const res = await fetch('/api/tabs');
       const tabList = await res.json();
@@ -188,8 +317,10 @@ async function poll() {
     } catch(e) {}
   }
 
-  /* Poll annotations for active tab */
-  if (activeTabId) {
+  /* Poll annotations for active tab (a tab never fetched yet always goes) */
+  if (activeTabId && (!_feedConnected || _feedAnnDirty.has(activeTabId)
+                      || !(activeTabId in lastAnnotationMtimes))) {
+    _feedAnnDirty.delete(activeTabId);
     try {
       const res = await fetch('/api/annotations?tab=' + activeTabId);
       const data = await res.json();
@@ -200,6 +331,4 @@ async function poll() {
       }
     } catch(e) {}
   }
-
-  setTimeout(poll, POLL_ACTIVE_MS);
 }
@@ -294,13 +294,19 @@ function render(md) {
   }
   _tocRenderedTabId = renderTabId;
 
+  /* Server-rendered HTML (opt-in serverRender) is used only for the exact
+     version it was rendered from — a local save moves changeKey past it. */
+  const tab = renderTabId ? tabs[renderTabId] : null;
+  const prepared = tab && tab.rendered && tab.rendered.changeKey === tab.changeKey
+    && tabBody(tab) === md ? tab.rendered.html : null;
+
   /* Pandoc image attributes — `![alt](fig.pdf){width=100%}` — are not
      CommonMark; marked would print the brace block as literal text after
      the figure. Strip them so academic sources aimed at a LaTeX build
      preview cleanly. (Outside fenced code only: a line-anchored regex
      could not tell, so this accepts the vanishingly rare false positive
      of an image literal followed by braces inside a code block.) */
-  const html = marked.parse(
+  const html = prepared !== null ? prepared : marked.parse(
     md.replace(/(!\[[^\]]*\]\([^)\n]*\))\{[^}\n]*\}/g, '$1'),
     { gfm: true, breaks: false });
   const content = document.getElementById('content');
@@ -323,9 +329,9 @@ function render(md) {
     wrapper.appendChild(table);
   });
 
-  /* Syntax highlighting */
+  /* Syntax highlighting (blocks the server already highlighted carry .hljs) */
   if (typeof hljs !== 'undefined') {
-    content.querySelectorAll('pre code').forEach(el => {
+    content.querySelectorAll('pre code:not(.hljs)').forEach(el => {
       hljs.highlightElement(el);
     });
   }
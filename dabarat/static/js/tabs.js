@@ -297,6 +297,8 @@ async function fetchTabContent(id) {
     tabs[id].body = data.body;
     tabs[id].mtime = data.mtime;
     tabs[id].changeKey = data.changeKey;
+    tabs[id].rendered = data.rendered;
+    tabs[id].etag = res.headers.get('ETag');
     tabs[id].frontmatter = data.frontmatter || null;
     if (id === activeTabId) {
       currentFrontmatter = tabs[id].frontmatter;
@@ -1,8 +1,36 @@
-"""HTML template assembly — reads static CSS/JS and builds the page shell."""
+"""HTML template assembly — reads static CSS/JS and builds the page shell.
 
+The CSS and JS modules are concatenated into content-hashed bundles
+served at /static/app.<hash>.css, /static/app.<hash>.js and
+/static/palette.<hash>.js (see bundle()), each pre-compressed once. The
+URL changes whenever the content does, so they are cached as immutable:
+reloads, new windows and PDF-export Chrome instances reuse the parsed
+and compiled bundle instead of re-downloading it inside the HTML.
+
+Bundles and shell are built once and cached, keyed by the mtimes of every
+static file (an edited module rebuilds them on the next load) and by the
+vendored-asset build: once `dabarat --vendor-fetch` has mirrored the CDN
+dependencies, their tags point at the local copies (see vendor.py). The shell
+is assembled with sentinel placeholders for the per-request values —
+title, theme, author, justify, port — and split on them, so serving a
+page is a stat sweep plus one join, with no file reads.
+"""
+
+import collections
+import gzip
+import hashlib
 import html
 import json
 import os
+import re
+import threading
+
+from . import vendor
+
+try:
+    import brotli  # optional: br alongside gzip when installed
+except ImportError:
+    brotli = None
 
 _STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
 _JS_DIR = os.path.join(_STATIC_DIR, "js")
@@ -38,24 +66,117 @@ def _concat_modules(directory, modules):
     return "\n\n".join(parts)
 
 
+# Per-request slots; NUL cannot occur in the static sources
+_SLOTS = ("title", "theme", "author", "justify", "port")
+_SLOT_RE = re.compile("\x00(" + "|".join(_SLOTS) + ")\x00")
+
+_shell = None      # (mtime key, [text, slot, ...], {url name: Bundle})
+_shell_lock = threading.Lock()
+
+BUNDLE_NAME_RE = re.compile(r"(app|palette)\.[0-9a-f]{12}\.(js|css)")
+Bundle = collections.namedtuple("Bundle", "content_type data gzip br etag")
+_CONTENT_TYPES = {".js": "text/javascript; charset=utf-8",
+                  ".css": "text/css; charset=utf-8"}
+
+
+def _static_paths():
+    return ([os.path.join(_CSS_DIR, m) for m in _CSS_MODULES]
+            + [os.path.join(_JS_DIR, m) for m in _JS_MODULES]
+            + [os.path.join(_STATIC_DIR, "palette.js")])
+
+
+def _shell_key():
+    """Mtimes of every bundled file plus the vendored-asset build; None
+    if a file cannot be stat'ed."""
+    try:
+        return (tuple(os.stat(p).st_mtime_ns for p in _static_paths()),
+                vendor.stamp())
+    except OSError:
+        return None
+
+
+def _make_bundle(name, text):
+    """(url name, Bundle) for one asset, e.g. ("app.1a2b3c4d5e6f.js", ...)."""
+    data = text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}", Bundle(
+        _CONTENT_TYPES[ext], data,
+        gzip.compress(data, 9, mtime=0),
+        brotli.compress(data) if brotli is not None else None,
+        f'"{digest}"')
+
+
+def _build():
+    """Current (shell parts, bundles), rebuilt when a static file changes."""
+    global _shell
+    key = _shell_key()
+    cached = _shell
+    if cached is not None and key is not None and cached[0] == key:
+        return cached[1], cached[2]
+    with _shell_lock:
+        if _shell is not None and key is not None and _shell[0] == key:
+            return _shell[1], _shell[2]
+        css_name, css = _make_bundle(
+            "app.css", _concat_modules(_CSS_DIR, _CSS_MODULES))
+        js_name, js = _make_bundle(
+            "app.js", _concat_modules(_JS_DIR, _JS_MODULES))
+        palette_name, palette = _make_bundle(
+            "palette.js", _read_static("palette.js"))
+        bundles = {css_name: css, js_name: js, palette_name: palette}
+        parts = _SLOT_RE.split(vendor.localize(_build_shell(
+            *("\x00" + slot + "\x00" for slot in _SLOTS),
+            css_url="/static/" + css_name, js_url="/static/" + js_name,
+            palette_url="/static/" + palette_name)))
+        _shell = (key, parts, bundles)
+        return parts, bundles
+
+
+def bundle(name):
+    """The Bundle served at /static/<name>, or None for a stale/unknown
+    hash (a page built before a rebuild reloads into the new URLs)."""
+    return _build()[1].get(name)
+
+
+def cdn_shell():
+    """The shell as it loads from CDNs, without vendored URLs — what
+    vendor.fetch() mirrors."""
+    return _build_shell("dabarat", '""', '""', "false", "0",
+                        css_url="", js_url="", palette_url="")
+
+
 def get_html(title="dabarat", default_author="Tom", server_theme="", server_justify=False, port=3031):
-    css = _concat_modules(_CSS_DIR, _CSS_MODULES)
-    js = _concat_modules(_JS_DIR, _JS_MODULES)
-    palette_js = _read_static("palette.js")
+    values = {
+        "title": html.escape(title),
+        "theme": json.dumps(server_theme),
+        "author": json.dumps(default_author),
+        "justify": json.dumps(bool(server_justify)),
+        "port": json.dumps(int(port)),
+    }
+    parts, _ = _build()
+    # split() with one group alternates text and slot names
+    return "".join(values[p] if i % 2 else p for i, p in enumerate(parts))
+
 
+def _build_shell(title, server_theme, default_author, server_justify, port,
+                 css_url, js_url, palette_url):
+    """Assemble the page; the arguments are inserted verbatim (already
+    escaped/JSON-encoded by the caller)."""
     return f"""<!DOCTYPE html>
 <html lang="en">
 <head>
 <meta charset="utf-8">
 <meta name="viewport" content="width=device-width, initial-scale=1">
-<title>{html.escape(title)}</title>
+<title>{title}</title>
 <script src="https://cdn.jsdelivr.net/npm/marked/marked.min.js"></script>
 <script src="https://cdn.jsdelivr.net/npm/marked-footnote@1.4.0/dist/index.umd.min.js"></script>
 <script src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.9.0/highlight.min.js"></script>
 <link rel="preconnect" href="https://fonts.googleapis.com">
 <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
 <link href="https://fonts.googleapis.com/css2?family=Cormorant+Garamond:ital,wght@0,400;0,500;0,600;0,700;1,400;1,500&family=DM+Sans:ital,wght@0,400;0,500;0,600;0,700;1,400&family=Victor+Mono:ital,wght@0,400;0,600;1,400&family=Noto+Sans+Hebrew:wght@400..700&family=Noto+Serif+Hebrew:wght@400..700&display=swap" rel="stylesheet">
-<script src="https://unpkg.com/@phosphor-icons/web@2.1.1"></script>
+<link rel="stylesheet" href="https://unpkg.com/@phosphor-icons/web@2.1.1/src/regular/style.css">
+<link rel="stylesheet" href="https://unpkg.com/@phosphor-icons/web@2.1.1/src/fill/style.css">
+<link rel="stylesheet" href="https://unpkg.com/@phosphor-icons/web@2.1.1/src/light/style.css">
 <script src="https://cdn.jsdelivr.net/npm/@twemoji/api@latest/dist/twemoji.min.js"></script>
 <script src="https://cdnjs.cloudflare.com/ajax/libs/vibrant.js/1.0.0/Vibrant.min.js"></script>
 <script type="module">
@@ -82,12 +203,10 @@ def get_html(title="dabarat", default_author="Tom", server_theme="", server_just
                        Table, TableRow, TableCell, TableHeader, Placeholder, Link, Image }};
   }} catch (e) {{ /* Tiptap unavailable — textarea fallback */ }}
 </script>
-<script>(function(){{var v=['ink','vellum','mocha','latte','rose-pine','rose-pine-dawn','tokyo-storm','tokyo-light','_custom'];var p=new URLSearchParams(window.location.search);var qt=p.get('theme');var st={json.dumps(server_theme)};var t=(qt&&v.indexOf(qt)!==-1)?qt:localStorage.getItem('dabarat-theme')||localStorage.getItem('mdpreview-theme')||(st&&v.indexOf(st)!==-1?st:'')||'mocha';if(v.indexOf(t)===-1)t='mocha';document.documentElement.setAttribute('data-theme',t);if(p.get('export')==='1')document.documentElement.dataset.export='1';var dd=p.get('date');if(dd)document.documentElement.dataset.date=dd;if(t==='_custom'){{try{{var a=localStorage.getItem('dabarat-custom-active')||localStorage.getItem('mdpreview-custom-active');if(a){{var th=JSON.parse(localStorage.getItem('dabarat-custom-themes')||localStorage.getItem('mdpreview-custom-themes')||'[]');for(var i=0;i<th.length;i++){{if(th[i].id===a&&th[i].variables){{var s=document.createElement('style');s.id='custom-theme-style';var r='';var vr=th[i].variables;for(var k in vr){{if(vr.hasOwnProperty(k))r+=k+':'+vr[k]+';'}}s.textContent='[data-theme="_custom"]{{'+r+'}}';document.head.appendChild(s);break}}}}}}}}catch(e){{document.documentElement.setAttribute('data-theme','mocha')}}}}}})()</script>
-<style>
-{css}
-</style>
+<script>(function(){{var v=['ink','vellum','mocha','latte','rose-pine','rose-pine-dawn','tokyo-storm','tokyo-light','_custom'];var p=new URLSearchParams(window.location.search);var qt=p.get('theme');var st={server_theme};var t=(qt&&v.indexOf(qt)!==-1)?qt:localStorage.getItem('dabarat-theme')||localStorage.getItem('mdpreview-theme')||(st&&v.indexOf(st)!==-1?st:'')||'mocha';if(v.indexOf(t)===-1)t='mocha';document.documentElement.setAttribute('data-theme',t);if(p.get('export')==='1')document.documentElement.dataset.export='1';var dd=p.get('date');if(dd)document.documentElement.dataset.date=dd;if(t==='_custom'){{try{{var a=localStorage.getItem('dabarat-custom-active')||localStorage.getItem('mdpreview-custom-active');if(a){{var th=JSON.parse(localStorage.getItem('dabarat-custom-themes')||localStorage.getItem('mdpreview-custom-themes')||'[]');for(var i=0;i<th.length;i++){{if(th[i].id===a&&th[i].variables){{var s=document.createElement('style');s.id='custom-theme-style';var r='';var vr=th[i].variables;for(var k in vr){{if(vr.hasOwnProperty(k))r+=k+':'+vr[k]+';'}}s.textContent='[data-theme="_custom"]{{'+r+'}}';document.head.appendChild(s);break}}}}}}}}catch(e){{document.documentElement.setAttribute('data-theme','mocha')}}}}}})()</script>
+<link rel="stylesheet" href="{css_url}">
 <script>
-  window.DABARAT_CONFIG = {{ defaultAuthor: {json.dumps(default_author)}, justify: {json.dumps(bool(server_justify))}, port: {json.dumps(int(port))} }};
+  window.DABARAT_CONFIG = {{ defaultAuthor: {default_author}, justify: {server_justify}, port: {port} }};
 </script>
 </head>
 <body>
@@ -259,11 +378,7 @@ def get_html(title="dabarat", default_author="Tom", server_theme="", server_just
     <span class="updated"><span class="dot"></span><span id="last-updated">connecting...</span></span>
   </div>
 
-  <script>
-{js}
-  </script>
-  <script>
-{palette_js}
-  </script>
+  <script src="{js_url}"></script>
+  <script src="{palette_url}"></script>
 </body>
 </html>"""
@@ -0,0 +1,297 @@
+"""Offline copies of the page's CDN dependencies (opt-in, stdlib only).
+
+`dabarat --vendor-fetch` downloads everything the page shell loads from
+CDNs — the marked/highlight.js/twemoji/Vibrant scripts, the Phosphor and
+Google Fonts stylesheets with their font files, and the Motion One and
+Tiptap ES module graphs — into VENDOR_DIR and writes a manifest. While a
+manifest exists, localize() points those tags at /vendor/<build>/... on
+the dabarat server, so first paint needs no network. The directory is
+portable: populate it once on a connected machine, copy it to an
+air-gapped one (or point DABARAT_VENDOR_DIR at a shared copy).
+
+Stylesheet url() references and module import specifiers are rewritten
+to relative paths inside the mirror, so a whole graph resolves under one
+/vendor/<build>/ prefix. Anything that could not be fetched keeps its
+absolute CDN URL. The build id hashes every file, so a re-fetch (marked
+and twemoji are unpinned upstream) moves every URL and the files can be
+cached as immutable. Each build lives in its own files/<build>/ and the
+previous one is kept until the next fetch, so a page loaded before a
+re-fetch can still pull its lazy module chunks.
+"""
+
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import urllib.request
+from urllib.parse import urljoin, urlsplit
+
+VENDOR_DIR = os.path.expanduser(
+    os.environ.get("DABARAT_VENDOR_DIR") or "~/.dabarat/vendor")
+MANIFEST_VERSION = 2  # 2: one files/<build>/ directory per build
+MAX_FILES = 2000  # runaway guard for the module-graph crawl
+FETCH_TIMEOUT_S = 30
+# Google Fonts and esm.sh tailor responses to the browser (woff2 subsets,
+# es2022 builds); ask as a current one would
+_USER_AGENT = ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+               "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+
+_SCRIPT_RE = re.compile(r'<script src="(https://[^"]+)"')
+_STYLESHEET_RE = re.compile(r'<link[^>]*\bhref="(https://[^"]+)"[^>]*rel="stylesheet"'
+                            r'|<link[^>]*rel="stylesheet"[^>]*\bhref="(https://[^"]+)"')
+_DYNAMIC_IMPORT_RE = re.compile(r'\bimport\("(https://[^"]+)"\)')
+_PRECONNECT_RE = re.compile(r'<link rel="preconnect"[^>]*>\n?')
+_CSS_URL_RE = re.compile(r'url\(\s*(["\']?)([^"\')]+)\1\s*\)')
+_IMPORT_RE = re.compile(r'(\bfrom\s*|\bimport\s*\(?\s*)(["\'])([^"\'\s]+)\2')
+_BUILD_RE = re.compile(r"[0-9a-f]{12}")
+_EXTENSIONS = {"module": (".mjs", ".js"), "script": (".js",), "stylesheet": (".css",)}
+
+_manifest = None  # ((st_mtime_ns, st_size, st_ino), manifest dict)
+
+CONTENT_TYPES = {
+    ".js": "text/javascript; charset=utf-8",
+    ".mjs": "text/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".woff2": "font/woff2",
+    ".woff": "font/woff",
+    ".ttf": "font/ttf",
+    ".otf": "font/otf",
+    ".eot": "application/vnd.ms-fontobject",
+    ".svg": "image/svg+xml",
+}
+
+
+def _manifest_path():
+    return os.path.join(VENDOR_DIR, "manifest.json")
+
+
+def _build_dir(build):
+    return os.path.join(VENDOR_DIR, "files", build)
+
+
+def manifest():
+    """The current manifest dict, or None when nothing is vendored.
+
+    Re-read only when the file's stat changes (fetch() replaces it)."""
+    global _manifest
+    try:
+        st = os.stat(_manifest_path())
+    except OSError:
+        return None
+    key = (st.st_mtime_ns, st.st_size, st.st_ino)
+    cached = _manifest
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    try:
+        with open(_manifest_path(), encoding="utf-8") as f:
+            data = json.load(f)
+        if (not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION
+                or not isinstance(data.get("assets"), dict)):
+            data = None
+    except (OSError, ValueError):
+        data = None
+    _manifest = (key, data)
+    return data
+
+
+def stamp():
+    """Changes whenever the manifest does (part of the shell cache key)."""
+    m = manifest()
+    return m["build"] if m else None
+
+
+def localize(shell):
+    """Point the shell's vendored CDN URLs at /vendor/<build>/...; the
+    shell is returned unchanged when nothing is vendored."""
+    m = manifest()
+    if not m:
+        return shell
+    prefix = f"/vendor/{m['build']}/"
+    for url, rel in m["assets"].items():
+        shell = shell.replace(f'"{url}"', f'"{prefix}{rel}"')
+    if not re.search(r'"https://fonts\.googleapis\.com/', shell):
+        # Fonts are local — a preconnect would only stall on DNS offline
+        shell = _PRECONNECT_RE.sub("", shell)
+    return shell
+
+
+def resolve(build, rel):
+    """Filesystem path of /vendor/<build>/<rel>, or None (unknown or
+    deleted build, traversal attempt, missing file).
+
+    Any build still on disk is served, not just the manifest's: a page
+    from before a re-fetch keeps loading its modules from its own build."""
+    if not _BUILD_RE.fullmatch(build):
+        return None
+    parts = rel.split("/")
+    if any(p in ("", ".", "..") for p in parts):
+        return None
+    root = os.path.realpath(_build_dir(build))
+    path = os.path.realpath(os.path.join(root, *parts))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def cdn_assets(shell):
+    """[(kind, url)] of the CDN resources a CDN-mode shell loads."""
+    assets = [("script", u) for u in _SCRIPT_RE.findall(shell)]
+    assets += [("stylesheet", a or b) for a, b in _STYLESHEET_RE.findall(shell)]
+    assets += [("module", u) for u in _DYNAMIC_IMPORT_RE.findall(shell)]
+    return assets
+
+
+def _local_path(url, kind):
+    """Mirror path for a URL: host/path, a digest for any query, and an
+    extension matching how the file is loaded (module scripts need a
+    JavaScript MIME type, which the server derives from the extension)."""
+    parts = urlsplit(url)
+    segments = [s for s in parts.path.split("/") if s not in ("", ".", "..")] or ["index"]
+    if parts.path.endswith("/"):
+        segments.append("index")
+    stem, ext = posixpath.splitext(segments[-1])
+    if parts.query:
+        stem += "_" + hashlib.sha256(parts.query.encode()).hexdigest()[:8]
+    wanted = _EXTENSIONS.get(kind)
+    if wanted and ext not in wanted:
+        stem, ext = stem + ext, wanted[0]
+    segments[-1] = stem + ext
+    return "/".join([parts.netloc] + segments)
+
+
+def _relative(target, source):
+    rel = posixpath.relpath(target, posixpath.dirname(source))
+    return rel if rel.startswith("../") else "./" + rel
+
+
+def _get(url):
+    req = urllib.request.Request(url, headers={"User-Agent": _USER_AGENT})
+    with urllib.request.urlopen(req, timeout=FETCH_TIMEOUT_S) as resp:
+        return resp.geturl(), resp.read()
+
+
+def fetch(shell, progress=None):
+    """Mirror every CDN asset of `shell` (see cdn_assets) into VENDOR_DIR.
+
+    Files are staged in a temp dir, moved to files/<build>/ and only then
+    named by the manifest, so a running server never sees a half-written
+    mirror and a build id never serves other bytes. Builds other than the
+    new one and the one it replaces are deleted. progress(url) is called before each download. Returns a report:
+    {"build", "assets", "files", "bytes", "failed": [(url, error)]}.
+    """
+    os.makedirs(VENDOR_DIR, mode=0o700, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=VENDOR_DIR, prefix=".files-")
+    local = {}     # url → mirror path, once fetched
+    failed = []
+    dead = set()   # urls already failed — one attempt each
+    total = 0
+
+    def visit(kind, url):
+        nonlocal total
+        if url in local:
+            return local[url]
+        if url in dead:
+            return None
+        if len(local) >= MAX_FILES:
+            dead.add(url)
+            failed.append((url, "file limit reached"))
+            return None
+        if progress:
+            progress(url)
+        try:
+            final_url, data = _get(url)
+        except Exception as e:
+            dead.add(url)
+            failed.append((url, str(e)))
+            return None
+        path = _local_path(url, kind)
+        local[url] = path  # before recursing: import cycles are legal
+        if kind == "stylesheet":
+            data = rewrite(_CSS_URL_RE, data, final_url, path, "file")
+        elif kind == "module":
+            data = rewrite(_IMPORT_RE, data, final_url, path, "module")
+        dest = os.path.join(staging, *path.split("/"))
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(dest, "wb") as f:
+            f.write(data)
+        total += len(data)
+        return path
+
+    def rewrite(pattern, data, base, path, kind):
+        text = data.decode("utf-8", "replace")
+
+        def sub(m):
+            if pattern is _CSS_URL_RE:
+                quote, ref = m.group(1), m.group(2).strip()
+                head = "url(" + quote
+                tail = quote + ")"
+            else:
+                head, quote, ref = m.group(1) + m.group(2), m.group(2), m.group(3)
+                tail = quote
+                if not ref.startswith(("/", "./", "../", "https://", "http://")):
+                    return m.group(0)  # bare specifier or not a path at all
+            if ref.startswith(("data:", "#")):
+                return m.group(0)
+            target_url = urljoin(base, ref)
+            if not target_url.startswith(("https://", "http://")):
+                return m.group(0)
+            target = visit(kind, target_url)
+            # Unfetchable: keep working by pointing back at the CDN
+            new = _relative(target, path) if target else target_url
+            return head + new + tail
+
+        return pattern.sub(sub, text).encode("utf-8")
+
+    assets = {}
+    try:
+        for kind, url in cdn_assets(shell):
+            path = visit(kind, url)
+            if path:
+                assets[url] = path
+        if not assets:
+            # Offline or blocked: keep whatever mirror is already in place
+            return {"build": None, "assets": 0, "files": 0, "bytes": 0,
+                    "failed": failed}
+        digest = hashlib.sha256()
+        for path in sorted(local.values()):
+            with open(os.path.join(staging, *path.split("/")), "rb") as f:
+                digest.update(path.encode() + b"\0" + hashlib.sha256(f.read()).digest())
+        build = digest.hexdigest()[:12]
+
+        previous = stamp()
+        os.makedirs(os.path.join(VENDOR_DIR, "files"), exist_ok=True)
+        if not os.path.isdir(_build_dir(build)):
+            os.rename(staging, _build_dir(build))
+            staging = None
+        # else: same content as a build already on disk — keep that one
+        fd, tmp = tempfile.mkstemp(dir=VENDOR_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "build": build,
+                       "assets": assets}, f, indent=1)
+        os.replace(tmp, _manifest_path())
+        _prune_builds({build, previous})
+    finally:
+        if staging:
+            shutil.rmtree(staging, ignore_errors=True)
+    return {"build": build, "assets": len(assets), "files": len(local),
+            "bytes": total, "failed": failed}
+
+
+def _prune_builds(keep):
+    """Delete every files/ entry not named in `keep` (older builds, and
+    the flat layout of manifest version 1)."""
+    files = os.path.join(VENDOR_DIR, "files")
+    for name in os.listdir(files):
+        if name in keep:
+            continue
+        path = os.path.join(files, name)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
@@ -0,0 +1,292 @@
+"""File watcher — one background thread for every open tab (stdlib only).
+
+Tracks a change key (st_mtime_ns:size, the same format _refresh_tab and
+the client use) for each watched path. On Linux the thread blocks on
+inotify (via ctypes) watching the paths' parent directories — a file
+watch would go deaf the first time an editor atomically replaces the
+file, a directory watch sees the rename land. Elsewhere, or when inotify
+cannot be set up, it falls back to batched os.stat sweeps.
+
+Either way a full stat sweep runs every SAFETY_SWEEP_S as a backstop:
+inotify reports nothing for writes made by another host on a network
+mount, and a queue overflow or watch-limit failure must not leave a file
+silently stale forever.
+
+Listeners are called on the watcher thread with the set of paths whose
+key actually changed; they must be quick and must not raise.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+STAT_INTERVAL_S = 0.5     # stat-sweep period (fallback backend)
+SAFETY_SWEEP_S = 5.0      # full re-stat period even with inotify
+_DEBOUNCE_S = 0.05        # coalesce a burst of writes into one notification
+
+# <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_DIR_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM
+             | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF
+             | _IN_MOVE_SELF | _IN_ONLYDIR)
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len — name follows
+
+
+def stat_state(path):
+    """Return (change_key, file_missing, stat_error) from one os.stat."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return "", True, None
+    except Exception as e:
+        return "", False, e.__class__.__name__
+    return f"{st.st_mtime_ns}:{st.st_size}", False, None
+
+
+def _load_inotify():
+    """Return libc with the inotify calls bound, or None off Linux."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                           use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                           ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class FileWatcher:
+    """Watch a set of paths from one daemon thread.
+
+    `set_paths` replaces the watched set (new paths are stat'ed
+    synchronously, so `state` is valid as soon as it returns). `state`
+    returns None for unwatched paths and whenever the thread is not
+    running — callers then fall back to their own disk check.
+    """
+
+    def __init__(self, interval=STAT_INTERVAL_S, use_inotify=True):
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._states = {}        # path → (change_key, missing, error)
+        self._dirs = {}          # dir → set of watched basenames
+        self._wd_dir = {}        # inotify wd → dir
+        self._dir_wd = {}        # dir → inotify wd
+        self._listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._libc = _load_inotify() if use_inotify else None
+        self._fd = None
+        self._warned = False
+
+    @property
+    def backend(self):
+        return "inotify" if self._fd is not None else "stat"
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def add_listener(self, fn):
+        with self._lock:
+            self._listeners.append(fn)
+
+    def start(self):
+        """Start the watcher thread (idempotent)."""
+        with self._lock:
+            if self.running:
+                return
+            if self._libc is not None and self._fd is None:
+                fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+                if fd >= 0:
+                    self._fd = fd
+                    for d in self._dirs:
+                        self._add_watch(d)
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="dabarat-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=2)
+        with self._lock:
+            self._thread = None
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+                self._wd_dir.clear()
+                self._dir_wd.clear()
+
+    def set_paths(self, paths):
+        """Replace the watched set."""
+        wanted = {os.path.abspath(p) for p in paths}
+        with self._lock:
+            current = set(self._states)
+            added, dropped = wanted - current, current - wanted
+        fresh = {p: stat_state(p) for p in added}
+        with self._lock:
+            for p in dropped:
+                self._states.pop(p, None)
+                d, name = os.path.split(p)
+                names = self._dirs.get(d)
+                if names is not None:
+                    names.discard(name)
+                    if not names:
+                        del self._dirs[d]
+                        self._rm_watch(d)
+            for p, state in fresh.items():
+                self._states[p] = state
+                d, name = os.path.split(p)
+                if d not in self._dirs:
+                    self._dirs[d] = set()
+                    self._add_watch(d)
+                self._dirs[d].add(name)
+
+    def state(self, path):
+        """(change_key, file_missing, stat_error) as last observed, or None."""
+        if not self.running:
+            return None
+        with self._lock:
+            return self._states.get(os.path.abspath(path))
+
+    # ── Internals ────────────────────────────────────────────────────────
+
+    def _add_watch(self, d):
+        """Called with _lock held."""
+        if self._fd is None or d in self._dir_wd:
+            return
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(d), _DIR_MASK)
+        if wd >= 0:
+            self._wd_dir[wd] = d
+            self._dir_wd[d] = wd
+        # else (ENOSPC watch limit, EACCES, vanished dir): the directory
+        # is simply swept by stat every interval instead
+
+    def _rm_watch(self, d):
+        """Called with _lock held."""
+        wd = self._dir_wd.pop(d, None)
+        if wd is not None:
+            self._wd_dir.pop(wd, None)
+            if self._fd is not None:
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _read_events(self):
+        """Drain pending inotify events → set of touched paths, or None
+        when the kernel queue overflowed (everything must be re-stat'ed)."""
+        touched = set()
+        overflow = False
+        while True:
+            try:
+                buf = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            except OSError:
+                return None
+            pos = 0
+            while pos + _EVENT.size <= len(buf):
+                wd, mask, _cookie, length = _EVENT.unpack_from(buf, pos)
+                pos += _EVENT.size
+                name = buf[pos:pos + length].rstrip(b"\0")
+                pos += length
+                if mask & _IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                with self._lock:
+                    d = self._wd_dir.get(wd)
+                    if mask & _IN_IGNORED and d is not None:
+                        # Directory removed or unmounted — its files now
+                        # fall back to stat sweeps until it reappears
+                        del self._wd_dir[wd]
+                        self._dir_wd.pop(d, None)
+                if d is None:
+                    continue
+                if name:
+                    touched.add(os.path.join(d, os.fsdecode(name)))
+                else:
+                    # Event on the directory itself — re-stat all of it
+                    with self._lock:
+                        touched.update(os.path.join(d, n)
+                                       for n in self._dirs.get(d, ()))
+        return None if overflow else touched
+
+    def _run(self):
+        last_full = time.monotonic()
+        while not self._stop.is_set():
+            candidates = set()
+            if self._fd is not None:
+                try:
+                    ready, _, _ = select.select([self._fd], [], [],
+                                                self._interval)
+                except (OSError, ValueError):
+                    ready = []
+                    self._stop.wait(self._interval)
+                if ready:
+                    self._stop.wait(_DEBOUNCE_S)
+                    touched = self._read_events()
+                    if touched is None:
+                        last_full = float("-inf")  # overflow → full sweep now
+                    else:
+                        candidates |= touched
+                with self._lock:
+                    # Directories without a live watch are swept every tick
+                    for d, names in self._dirs.items():
+                        if d not in self._dir_wd:
+                            candidates.update(os.path.join(d, n) for n in names)
+            else:
+                if self._stop.wait(self._interval):
+                    break
+                last_full = float("-inf")  # stat backend: every tick is a full sweep
+            now = time.monotonic()
+            if now - last_full >= SAFETY_SWEEP_S:
+                last_full = now
+                with self._lock:
+                    candidates = set(self._states)
+            if candidates:
+                self._restat(candidates)
+
+    def _restat(self, candidates):
+        with self._lock:
+            candidates = [p for p in candidates if p in self._states]
+        fresh = [(p, stat_state(p)) for p in candidates]
+        changed = set()
+        with self._lock:
+            for p, state in fresh:
+                # The path may have been dropped while we were stat'ing
+                if p in self._states and self._states[p] != state:
+                    self._states[p] = state
+                    changed.add(p)
+            listeners = list(self._listeners)
+        if not changed:
+            return
+        for fn in listeners:
+            try:
+                fn(changed)
+            except Exception as e:
+                if not self._warned:
+                    self._warned = True
+                    print(f"Warning: file-watcher listener failed ({e!r})",
+                          file=sys.stderr)
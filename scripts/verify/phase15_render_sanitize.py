@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Phase 15 verification — server-side render sanitizer (V1-V6).
+
+Regression cases for render.sanitize(), the raw-HTML filter behind
+/api/render and the serverRender path: foreign-content <style> (svg and
+math parse its body as markup), event handlers, script URLs with
+control characters, SVG animation writing attributes, and raw-text
+elements hiding markup in attribute values. Every output is re-parsed
+and must contain no dropped element, on* attribute or script URL.
+
+Stdlib only. The render() cases run when markdown-it-py is installed
+and are skipped (not failed) otherwise — sanitize() itself is stdlib.
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+from html.parser import HTMLParser
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from dabarat import render
+
+
+PASS = 0
+FAIL = 0
+
+PAYLOADS = [
+    '<div><svg><style><img src=x onerror=alert(1)></style></svg></div>',
+    '<math><style><img src=x onerror=alert(1)></style></math>',
+    '<svg><p><style><img src=x onerror=alert(1)></style></p></svg>',
+    '<style/><img src=x onerror=alert(1)>',
+    '<script>alert(1)</script><img src=x onerror="alert(1)">',
+    '<a href="java\tscript:alert(1)">x</a>',
+    '<a href=" &#x09;javascript:alert(1)">x</a>',
+    '<svg><a xlink:href="javascript:alert(1)"><text>x</text></a></svg>',
+    '<svg><set attributeName="href" to="javascript:alert(1)"/></svg>',
+    '<svg><animate onbegin=alert(1) attributeName=x dur=1s>',
+    '<iframe srcdoc="<script>alert(1)</script>"></iframe>',
+    '<noembed><img title="</noembed><img src=x onerror=alert(1)>"></noembed>',
+    '<img src="data:image/svg+xml,<svg onload=alert(1)>">',
+    '<form><button formaction="javascript:alert(1)">x</button></form>',
+]
+
+_FORBIDDEN_TAGS = render._DROP
+_SCRIPT_URL_RE = re.compile(r'^\s*(javascript|vbscript|data:(?!image/(?!svg)))', re.I)
+
+
+def report(ok: bool, name: str, detail: str = "") -> None:
+    global PASS, FAIL
+    if ok:
+        PASS += 1
+        print(f"  ✓ {name}" + (f" — {detail}" if detail else ""))
+    else:
+        FAIL += 1
+        print(f"  ✗ {name}" + (f" — {detail}" if detail else ""))
+
+
+class _Audit(HTMLParser):
+    """Collect anything active that survived sanitizing."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.problems = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _FORBIDDEN_TAGS:
+            self.problems.append(f"<{tag}>")
+        for name, value in attrs:
+            if name.startswith("on") or name == "srcdoc":
+                self.problems.append(f"{tag}[{name}]")
+            elif value and _SCRIPT_URL_RE.match(re.sub(r'[\x00-\x20]', "", value)):
+                self.problems.append(f"{tag}[{name}={value[:24]}]")
+
+    handle_startendtag = handle_starttag
+
+
+def audit(fragment: str) -> list:
+    parser = _Audit()
+    parser.feed(fragment)
+    parser.close()
+    return parser.problems
+
+
+def main() -> int:
+    print("Phase 15 — render sanitizer V1-V6")
+
+    # V1: svg/math <style> never reaches the output (the reported mXSS)
+    outs = [render.sanitize(p) for p in PAYLOADS[:4]]
+    report(all("<style" not in o.lower() and not audit(o) for o in outs),
+           "V1 <style> dropped inside svg/math and at top level",
+           " | ".join(outs[:2]))
+
+    # V2: every payload re-parses clean — no dropped tag, handler or script URL
+    bad = {p: audit(render.sanitize(p)) for p in PAYLOADS}
+    bad = {p: v for p, v in bad.items() if v}
+    report(not bad, "V2 sanitized payloads re-parse without active content",
+           f"{len(PAYLOADS)} payloads" if not bad else repr(bad))
+
+    # V3: markup hidden in attribute values stays escaped
+    out = render.sanitize(PAYLOADS[11])
+    report("&lt;img" in out and "<img src" not in out,
+           "V3 attribute values escape '<' (raw-text element breakout)", out)
+
+    # V4: ordinary raw HTML is kept
+    keep = '<details><summary>More</summary><img src="a.png" alt="a"></details>'
+    out = render.sanitize(keep)
+    report(out == keep, "V4 benign raw HTML passes through unchanged", out)
+
+    if not render.AVAILABLE:
+        print("  - V5/V6 skipped: markdown-it-py not installed")
+    else:
+        # V5: the same payloads through the full render() path
+        bad = {}
+        for p in PAYLOADS:
+            for md in (p, f"text {p} text", f"para\n\n{p}\n\nafter"):
+                problems = audit(render.render(md)["html"])
+                if problems:
+                    bad[md] = problems
+        report(not bad, "V5 render() output re-parses without active content",
+               "block + inline placements" if not bad else repr(bad)[:400])
+
+        # V6: markdown links with script URLs are not linked
+        out = render.render("[x](javascript:alert(1)) ![y](vbscript:msgbox)")["html"]
+        report(not audit(out) and "href=\"javascript" not in out,
+               "V6 markdown script-URL links are not emitted", out.strip())
+
+    print(f"PASS={PASS} FAIL={FAIL}")
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
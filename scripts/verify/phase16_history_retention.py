@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Phase 16 verification — history retention pruning (V1-V8).
+
+prune() is the only code that deletes user history, and collecting a
+blob rebases the deltas that patch it. This phase builds backdated
+timelines (hourly and daily buckets, pinned and labelled versions, a
+blob shared with another file, delta chains across the doomed versions)
+and checks what survives, that every survivor still decodes to its
+exact bytes with the in-memory blob cache cleared, and that the files
+row counters match the versions table afterwards.
+
+Stdlib only. DB_PATH / HISTORY_DIR are patched into a temp dir so the
+real ~/.dabarat state is never touched.
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import dabarat.history as history
+
+
+PASS = 0
+FAIL = 0
+
+HOUR = 3600 * 1_000_000
+DAY = 24 * HOUR
+MINUTE = 60 * 1_000_000
+
+
+def report(ok: bool, name: str, detail: str = "") -> None:
+    global PASS, FAIL
+    if ok:
+        PASS += 1
+        print(f"  ✓ {name}" + (f" — {detail}" if detail else ""))
+    else:
+        FAIL += 1
+        print(f"  ✗ {name}" + (f" — {detail}" if detail else ""))
+
+
+def make_text(rng: random.Random, n: int) -> list:
+    words = ["alpha", "bravo", "delta", "margin", "ledger", "quartz", "violet",
+             "ember", "harbor", "lantern", "meadow", "summit", "thistle", "copper"]
+    return [" ".join(rng.choice(words) for _ in range(12)) + "\n" for _ in range(n)]
+
+
+def insert(path: str, raw: bytes, source: str, at_us: int) -> int:
+    with history._db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        file_id = history._file_id(conn, path, create=True)
+        return history._insert_version(conn, file_id, path, raw, source,
+                                       created_at_us=at_us)
+
+
+def clear_raw_cache() -> None:
+    with history._raw_cache_lock:
+        history._raw_cache.clear()
+        history._raw_cache_size = 0
+
+
+def main() -> int:
+    print("Phase 16 — history retention V1-V8")
+    with tempfile.TemporaryDirectory(prefix="dabarat-p16-") as work_name:
+        work = Path(work_name)
+        history.DB_PATH = str(work / "versions.db")
+        history.HISTORY_DIR = str(work / "history")
+        history._import_checked = True
+        history.PRUNE_BATCH = 3  # exercise the per-transaction batching
+
+        doc = str(work / "doc.md")
+        other = str(work / "other.md")
+        stale = str(work / "stale.md")
+        rng = random.Random(16)
+        lines = make_text(rng, 200)  # ~17KB: well past DELTA_MIN_BYTES
+
+        now = history._now_us()
+        day0 = (now - 40 * DAY) // DAY * DAY       # daily buckets
+        hour0 = (now - 5 * DAY) // HOUR * HOUR     # hourly buckets
+        # (name, created_at_us, source) oldest first; each is a small edit
+        # of its predecessor, so the chain is mostly deltas
+        timeline = [
+            ("d1", day0 + 1 * HOUR, "external"),
+            ("d2", day0 + 2 * HOUR, "external"),   # pinned below
+            ("d3", day0 + 3 * HOUR, "external"),
+            ("d4", day0 + 5 * HOUR, "external"),   # newest of its day
+            ("e1", day0 + DAY + 1 * HOUR, "save"),  # not a thinned source
+            ("e2", day0 + DAY + 4 * HOUR, "external"),
+            ("h1", hour0 + 1 * MINUTE, "external"),
+            ("h2", hour0 + 10 * MINUTE, "external"),  # labelled below
+            ("h3", hour0 + 20 * MINUTE, "external"),
+            ("h4", hour0 + 30 * MINUTE, "external"),  # newest of its hour
+            ("h5", hour0 + 3 * HOUR, "external"),
+        ] + [(f"r{i}", now - (20 - i) * HOUR, "external") for i in range(12)]
+        expected_doomed = {"d1", "d3", "h1", "h3"}
+
+        ids, contents = {}, {}
+        for k, (name, at_us, source) in enumerate(timeline):
+            lines[(k * 37) % len(lines)] = f"edit {name} {rng.random()}\n"
+            raw = "".join(lines).encode("utf-8")
+            ids[name] = insert(doc, raw, source, at_us)
+            contents[name] = raw
+        history.set_pinned(doc, str(ids["d2"]), True)
+        history.set_label(doc, str(ids["h2"]), "milestone")
+        # another file holds the same bytes as a doomed version
+        insert(other, contents["h3"], "save", now - 2 * HOUR)
+        # a file whose versions are all old: only its newest may remain
+        stale_ids = [insert(stale, f"stale {i}\n".encode() * 50, "external",
+                            day0 + i * MINUTE) for i in range(4)]
+
+        with history._db() as conn:
+            deltas = conn.execute(
+                "SELECT COUNT(*) FROM blobs WHERE codec = 'delta'").fetchone()[0]
+        report(deltas >= len(timeline) - 2,
+               "V1 fixture chain is delta-encoded", f"{deltas} delta blobs")
+
+        planned = history.prune(dry_run=True)
+        result = history.prune()
+        report(planned["versions"] == result["versions"] == len(expected_doomed) + 3,
+               "V2 dry run predicts the versions a real run drops",
+               f"dry={planned['versions']} real={result['versions']}")
+
+        survivors = {v["hash"] for v in history.list_versions(doc, limit=1000)}
+        kept = {name for name, vid in ids.items() if str(vid) in survivors}
+        report(kept == set(ids) - expected_doomed,
+               "V3 bucket thinning drops exactly the older same-bucket externals",
+               f"dropped {sorted(set(ids) - kept)}")
+
+        report({"d2", "h2", "e1", "d4", "h4", "r11"} <= kept,
+               "V4 pinned, labelled, non-external and bucket-newest survive")
+
+        stale_left = [v["hash"] for v in history.list_versions(stale)]
+        report(stale_left == [str(stale_ids[-1])],
+               "V5 newest version survives even when older than every window",
+               f"{stale_left}")
+
+        clear_raw_cache()
+        bad = [name for name in kept
+               if history.get_version_content(doc, str(ids[name])).encode("utf-8")
+               != contents[name]]
+        clear_raw_cache()
+        shared = history.list_versions(other)[0]["hash"]
+        shared_ok = (history.get_version_content(other, shared).encode("utf-8")
+                     == contents["h3"])
+        report(not bad and shared_ok,
+               "V6 every survivor decodes byte-for-byte after its bases were collected",
+               f"{len(kept)} versions + shared blob" if not bad else f"bad={bad}")
+
+        with history._db() as conn:
+            dangling = conn.execute(
+                "SELECT COUNT(*) FROM blobs b WHERE b.base_hash IS NOT NULL"
+                " AND NOT EXISTS (SELECT 1 FROM blobs p WHERE p.hash = b.base_hash)"
+            ).fetchone()[0]
+            orphans = conn.execute(
+                "SELECT COUNT(*) FROM blobs b WHERE NOT EXISTS"
+                " (SELECT 1 FROM versions v WHERE v.blob_hash = b.hash)"
+            ).fetchone()[0]
+            too_deep = []
+            for blob_hash, depth in conn.execute("SELECT hash, depth FROM blobs"):
+                chain, h = 0, blob_hash
+                while True:
+                    base = conn.execute("SELECT base_hash FROM blobs WHERE hash = ?",
+                                        (h,)).fetchone()
+                    if base is None or base[0] is None:
+                        break
+                    chain, h = chain + 1, base[0]
+                if chain > depth or depth > history.KEYFRAME_DEPTH:
+                    too_deep.append((chain, depth))
+        report(dangling == 0 and orphans == 0 and not too_deep,
+               "V7 no dangling bases, no unreferenced blobs, chains within depth",
+               f"dangling={dangling} orphans={orphans} deep={too_deep}")
+
+        rows = []
+        with history._db() as conn:
+            for file_id, count, head in conn.execute(
+                    "SELECT id, version_count, head_version_id FROM files"):
+                real_count, real_head = conn.execute(
+                    "SELECT COUNT(*), (SELECT id FROM versions WHERE file_id = ?"
+                    "  ORDER BY created_at_us DESC, id DESC LIMIT 1)"
+                    " FROM versions WHERE file_id = ?", (file_id, file_id)).fetchone()
+                rows.append((count == real_count and head == real_head,
+                             count, real_count, head, real_head))
+        count, head = history.version_summary(doc)
+        report(all(r[0] for r in rows) and count == len(kept)
+               and head == str(ids["r11"]),
+               "V8 version_count / head_version_id match the versions table",
+               f"doc count={count} head={head}")
+
+    print(f"PASS={PASS} FAIL={FAIL}")
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Phase 17 verification — delta blob codec (V1-V7).
+
+Round-trips delta.encode/apply over edit shapes that stress the
+line-granular matcher (CRLF, no trailing newline, moved and repeated
+lines, binary bytes), checks that a delta payload is refused by a plain
+zlib read — what a pre-delta dabarat sharing versions.db would do — and
+that the store keeps chains within KEYFRAME_DEPTH while every version
+still decodes exactly. Also migrates a schema-v3 store whose deltas
+predate the header.
+
+Stdlib only. DB_PATH / HISTORY_DIR are patched into a temp dir so the
+real ~/.dabarat state is never touched.
+"""
+
+from __future__ import annotations
+
+import random
+import sqlite3
+import sys
+import tempfile
+import zlib
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import dabarat.delta as delta
+import dabarat.history as history
+
+
+PASS = 0
+FAIL = 0
+
+
+def report(ok: bool, name: str, detail: str = "") -> None:
+    global PASS, FAIL
+    if ok:
+        PASS += 1
+        print(f"  ✓ {name}" + (f" — {detail}" if detail else ""))
+    else:
+        FAIL += 1
+        print(f"  ✗ {name}" + (f" — {detail}" if detail else ""))
+
+
+def clear_raw_cache() -> None:
+    with history._raw_cache_lock:
+        history._raw_cache.clear()
+        history._raw_cache_size = 0
+
+
+def doc_lines(rng: random.Random, n: int) -> list:
+    return [f"line {i} " + " ".join(str(rng.randrange(10**6)) for _ in range(8)) + "\n"
+            for i in range(n)]
+
+
+def edit_pairs(rng: random.Random) -> list:
+    base = "".join(doc_lines(rng, 300)).encode()
+    lines = base.splitlines(keepends=True)
+    moved = lines[150:] + lines[:150]
+    pairs = [
+        ("identical", base, base),
+        ("empty base", b"", base),
+        ("empty target", base, b""),
+        ("one line changed", base, b"".join(lines[:10] + [b"changed\n"] + lines[11:])),
+        ("insert + delete", base, b"".join(lines[:50] + [b"new\n"] * 5 + lines[80:])),
+        ("halves swapped", base, b"".join(moved)),
+        ("repeated lines", b"same\n" * 400, b"same\n" * 200 + b"diff\n" + b"same\n" * 200),
+        ("crlf", base.replace(b"\n", b"\r\n"), base.replace(b"\n", b"\r\n")[:-40] + b"tail\r\n"),
+        ("no final newline", base.rstrip(b"\n"), base.rstrip(b"\n") + b" more"),
+        ("binary", bytes(rng.randrange(256) for _ in range(5000)),
+         bytes(rng.randrange(256) for _ in range(5000))),
+    ]
+    for k in range(20):  # random multi-line edits
+        t = list(lines)
+        for _ in range(rng.randrange(1, 12)):
+            i = rng.randrange(len(t))
+            op = rng.randrange(3)
+            if op == 0:
+                t[i] = f"edited {k} {rng.random()}\n".encode()
+            elif op == 1:
+                t.insert(i, f"inserted {k}\n".encode())
+            else:
+                del t[i]
+        pairs.append((f"random {k}", base, b"".join(t)))
+    return pairs
+
+
+def insert_version(path: str, raw: bytes) -> int:
+    with history._db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        file_id = history._file_id(conn, path, create=True)
+        return history._insert_version(conn, file_id, path, raw, "save")
+
+
+def main() -> int:
+    print("Phase 17 — delta codec V1-V7")
+    rng = random.Random(17)
+
+    # V1: encode/apply round-trips every edit shape
+    bad = [name for name, base, target in edit_pairs(rng)
+           if delta.apply(base, delta.encode(base, target)) != target]
+    report(not bad, "V1 delta round-trips byte-for-byte",
+           "30 edit shapes" if not bad else f"bad={bad}")
+
+    # V2: a payload is refused by plain zlib (how pre-delta builds read blobs)
+    base = "".join(doc_lines(rng, 200)).encode()
+    patch = delta.encode(base, base.replace(b"line 7 ", b"line seven "))
+    try:
+        zlib.decompress(patch)
+        refused = False
+    except zlib.error:
+        refused = True
+    report(patch.startswith(delta.MAGIC) and refused,
+           "V2 delta payload fails a plain zlib read", f"header {patch[:4]!r}")
+
+    # V3: apply() refuses headerless or truncated payloads instead of guessing
+    errors = 0
+    for payload in (patch[len(delta.MAGIC):], patch[:len(delta.MAGIC) + 3]):
+        try:
+            delta.apply(base, payload)
+        except (ValueError, zlib.error):
+            errors += 1
+    report(errors == 2, "V3 apply() rejects malformed payloads", f"{errors}/2 raised")
+
+    with tempfile.TemporaryDirectory(prefix="dabarat-p17-") as work_name:
+        work = Path(work_name)
+        history.DB_PATH = str(work / "versions.db")
+        history.HISTORY_DIR = str(work / "history")
+        history._import_checked = True
+
+        doc = str(work / "doc.md")
+        small = str(work / "small.md")
+        lines = doc_lines(rng, 200)  # well past DELTA_MIN_BYTES
+        contents = {}
+        count = 3 * (history.KEYFRAME_DEPTH + 1) + 2
+        for k in range(count):
+            lines[rng.randrange(len(lines))] = f"rev {k} {rng.random()}\n"
+            raw = "".join(lines).encode()
+            contents[insert_version(doc, raw)] = raw
+        for k in range(5):
+            insert_version(small, f"small note rev {k}\n".encode())
+
+        with history._db() as conn:
+            rows = conn.execute(
+                "SELECT b.codec, b.depth, b.base_hash FROM versions v"
+                " JOIN blobs b ON b.hash = v.blob_hash"
+                " WHERE v.file_id = (SELECT id FROM files WHERE current_path = ?)"
+                " ORDER BY v.id", (doc,)).fetchall()
+            small_codecs = {r[0] for r in conn.execute(
+                "SELECT b.codec FROM versions v JOIN blobs b ON b.hash = v.blob_hash"
+                " WHERE v.file_id = (SELECT id FROM files WHERE current_path = ?)",
+                (small,))}
+        depths = [r[1] for r in rows]
+        keyframes = [i for i, r in enumerate(rows) if r[0] != "delta"]
+        expected = list(range(0, count, history.KEYFRAME_DEPTH + 1))
+        report(max(depths) == history.KEYFRAME_DEPTH and keyframes == expected
+               and all((r[0] == "delta") == (r[2] is not None) for r in rows),
+               "V4 chains stop at KEYFRAME_DEPTH, then a keyframe starts anew",
+               f"keyframes at {keyframes}, max depth {max(depths)}")
+
+        report(small_codecs and "delta" not in small_codecs,
+               "V5 blobs under DELTA_MIN_BYTES stay keyframes", f"{sorted(small_codecs)}")
+
+        clear_raw_cache()
+        bad = [vid for vid, raw in contents.items()
+               if history.get_version_content(doc, str(vid)).encode() != raw]
+        report(not bad, "V6 every version decodes through its chain (cache cleared)",
+               f"{len(contents)} versions" if not bad else f"bad={bad}")
+
+        # V7: a v3 store (headerless deltas) is migrated in place
+        old = work / "v3.db"
+        src, conn = sqlite3.connect(history.DB_PATH), sqlite3.connect(old)
+        src.backup(conn)  # the live store is in WAL mode: not a plain file copy
+        src.close()
+        for blob_hash, content in conn.execute(
+                "SELECT hash, compressed_content FROM blobs WHERE codec = 'delta'"
+        ).fetchall():
+            conn.execute("UPDATE blobs SET compressed_content = ? WHERE hash = ?",
+                         (content[len(delta.MAGIC):], blob_hash))
+        conn.execute("PRAGMA user_version = 3")
+        conn.commit()
+        conn.close()
+        history.DB_PATH = str(old)
+        clear_raw_cache()
+        bad = [vid for vid, raw in contents.items()
+               if history.get_version_content(doc, str(vid)).encode() != raw]
+        conn = sqlite3.connect(old)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        headerless = conn.execute(
+            "SELECT COUNT(*) FROM blobs WHERE codec = 'delta'"
+            " AND substr(compressed_content, 1, 4) != ?", (delta.MAGIC,)).fetchone()[0]
+        conn.close()
+        report(not bad and version == history.SCHEMA_VERSION and headerless == 0,
+               "V7 schema v3 deltas gain the header on migration",
+               f"user_version={version}, headerless={headerless}")
+
+    print(f"PASS={PASS} FAIL={FAIL}")
+    return 0 if FAIL == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())